@@ -1,5 +1,9 @@
 import smtplib
 import os # For environment variables
+import time
+import atexit
+import threading
+from contextlib import contextmanager
 from email.mime.text import MIMEText
 
 # --- Email Configuration (MUST BE COMPLETED AND HANDLED SECURELY) ---
@@ -9,6 +13,9 @@ SMTP_SENDER_EMAIL = os.environ.get('PROCUREMENT_SMTP_SENDER_EMAIL', 'orders@nbne
 # IMPORTANT: Use environment variables or a secure method for the password
 SMTP_SENDER_PASSWORD = os.environ.get('PROCUREMENT_SMTP_PASSWORD', '!49Monkswood')
 SMTP_USE_TLS = os.environ.get('PROCUREMENT_SMTP_USE_TLS', 'True').lower() == 'true' # Use TLS by default
+SMTP_TIMEOUT = 10 # Seconds
+SMTP_POOL_SIZE = int(os.environ.get('PROCUREMENT_SMTP_POOL_SIZE', 4)) # Max simultaneous connections
+SMTP_NOOP_AFTER = 5 # Seconds idle before a pooled connection is NOOP-checked before reuse
 
 # --- Company Configuration (from previous version) ---
 YOUR_COMPANY_NAME = "NBNE" # Customize this
@@ -63,14 +70,130 @@ If you have any questions, please don\'t hesitate to contact us.
 """
     return subject, body
 
-def send_po_email(recipient_email, subject, body_text):
+# --- SMTP Connection Pool ---
+def _open_smtp_connection():
+    """Connects and logs in: SSL on port 465, STARTTLS when SMTP_USE_TLS, plain SMTP otherwise."""
+    print(f"Connecting to {SMTP_SERVER}:{SMTP_PORT}...")
+    if SMTP_PORT == 465: # Explicitly handle port 465 for SSL
+        print("Using SMTP_SSL for port 465.")
+        server = smtplib.SMTP_SSL(SMTP_SERVER, SMTP_PORT, timeout=SMTP_TIMEOUT)
+    elif SMTP_USE_TLS: # Handle STARTTLS for other ports like 587
+        print("Using SMTP with STARTTLS.")
+        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT, timeout=SMTP_TIMEOUT)
+    else: # Fallback for other non-TLS, non-465 scenarios
+        print("Using basic SMTP (no explicit TLS/SSL).")
+        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT, timeout=SMTP_TIMEOUT)
+    try:
+        if SMTP_PORT != 465 and SMTP_USE_TLS: server.starttls()
+        print(f"Attempting login with {SMTP_SENDER_EMAIL}...")
+        server.login(SMTP_SENDER_EMAIL, SMTP_SENDER_PASSWORD)
+    except Exception:
+        _close_quietly(server); raise
+    return server
+
+def _close_quietly(server):
+    try: server.quit()
+    except Exception:
+        try: server.close()
+        except Exception: pass
+
+class SMTPPool:
+    """
+    Small pool of logged-in SMTP connections shared by all sends of a dispatch run, so the TLS
+    handshake and login happen once per connection rather than once per PO. Connections that sat
+    idle are NOOP-checked before reuse and replaced if the server has dropped them.
+    """
+    def __init__(self, max_size=SMTP_POOL_SIZE, connect=_open_smtp_connection):
+        self.connect = connect
+        self._idle = [] # (connection, time it was returned)
+        self._lock = threading.Lock(); self._slots = threading.BoundedSemaphore(max_size)
+
+    @staticmethod
+    def _is_alive(server):
+        try: return server.noop()[0] == 250
+        except (smtplib.SMTPException, OSError): return False
+
+    def _checkout(self):
+        while True:
+            with self._lock:
+                if not self._idle: break
+                server, returned_at = self._idle.pop()
+            if time.monotonic() - returned_at < SMTP_NOOP_AFTER or self._is_alive(server): return server
+            print("Pooled SMTP connection is stale; reconnecting.")
+            _close_quietly(server)
+        return self.connect()
+
+    @contextmanager
+    def connection(self):
+        """Yields a live, logged-in connection. It goes back to the pool unless the block raised."""
+        with self._slots:
+            server = self._checkout(); ok = False
+            try:
+                yield server; ok = True
+            finally:
+                if ok:
+                    with self._lock: self._idle.append((server, time.monotonic()))
+                else: _close_quietly(server)
+
+    def sendmail(self, sender, recipient, message):
+        """sendmail on a pooled connection, retried once on a fresh one if the server dropped it."""
+        for attempt in range(2):
+            try:
+                with self.connection() as server: return server.sendmail(sender, recipient, message)
+            except (smtplib.SMTPServerDisconnected, ConnectionError) as e:
+                if attempt: raise
+                print(f"SMTP connection lost ({e}); reconnecting...")
+
+    def close(self):
+        """Logs out of every idle connection."""
+        with self._lock: idle, self._idle = self._idle, []
+        for server, _ in idle: _close_quietly(server)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_smtp_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None: _pool = SMTPPool()
+        return _pool
+
+def close_smtp_pool():
+    """Ends the pooled SMTP sessions (call when a dispatch run is over)."""
+    global _pool
+    with _pool_lock: pool, _pool = _pool, None
+    if pool is not None: pool.close()
+
+atexit.register(close_smtp_pool)
+
+def smtp_configured():
+    return not (not SMTP_SENDER_EMAIL or SMTP_SENDER_EMAIL == 'your_email@example.com' or
+                not SMTP_SENDER_PASSWORD or SMTP_SENDER_PASSWORD == 'YOUR_APP_PASSWORD_OR_REGULAR_PASSWORD' or
+                not SMTP_SERVER or SMTP_SERVER == 'your_smtp_server.com')
+
+def deliver_email(recipient_email, subject, body_text, pool=None):
+    """
+    Sends one email over a pooled connection without catching anything.
+
+    Raises:
+        smtplib.SMTPException / OSError: As raised by the server or socket, so callers such as
+            the outbox can tell transient failures from permanent ones.
+    """
+    msg = MIMEText(body_text)
+    msg['Subject'] = subject
+    msg['From'] = SMTP_SENDER_EMAIL
+    msg['To'] = recipient_email
+    (pool or get_smtp_pool()).sendmail(SMTP_SENDER_EMAIL, recipient_email, msg.as_string())
+
+def send_po_email(recipient_email, subject, body_text, pool=None):
     """
-    Sends an email using SMTP.
+    Sends an email using SMTP, over a pooled connection (see SMTPPool).
 
     Args:
         recipient_email (str): The email address of the recipient.
         subject (str): The subject of the email.
         body_text (str): The plain text body of the email.
+        pool (SMTPPool): Pool to send through; defaults to the shared pool.
 
     Returns:
         bool: True if email was sent successfully, False otherwise.
@@ -79,35 +202,14 @@ def send_po_email(recipient_email, subject, body_text):
         print("Error sending email: Missing recipient, subject, or body.")
         return False
     
-    if not SMTP_SENDER_EMAIL or SMTP_SENDER_EMAIL == 'your_email@example.com' or \
-       not SMTP_SENDER_PASSWORD or SMTP_SENDER_PASSWORD == 'YOUR_APP_PASSWORD_OR_REGULAR_PASSWORD' or \
-       not SMTP_SERVER or SMTP_SERVER == 'your_smtp_server.com':
+    if not smtp_configured():
         print("Error: SMTP server, sender email, or password not configured.")
         print("Please set PROCUREMENT_SMTP_SERVER, PROCUREMENT_SMTP_PORT, PROCUREMENT_SMTP_SENDER_EMAIL, and PROCUREMENT_SMTP_PASSWORD environment variables.")
         return False
 
-    msg = MIMEText(body_text)
-    msg['Subject'] = subject
-    msg['From'] = SMTP_SENDER_EMAIL
-    msg['To'] = recipient_email
-
     try:
         print(f"Attempting to send email to {recipient_email} via {SMTP_SERVER}:{SMTP_PORT}...")
-        if SMTP_PORT == 465: # Explicitly handle port 465 for SSL
-            print("Using SMTP_SSL for port 465.")
-            server = smtplib.SMTP_SSL(SMTP_SERVER, SMTP_PORT, timeout=10) # Added timeout
-        elif SMTP_USE_TLS: # Handle STARTTLS for other ports like 587
-            print("Using SMTP with STARTTLS.")
-            server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT, timeout=10) # Added timeout
-            server.starttls()
-        else: # Fallback for other non-TLS, non-465 scenarios
-            print("Using basic SMTP (no explicit TLS/SSL).")
-            server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT, timeout=10) # Added timeout
-        
-        print(f"Attempting login with {SMTP_SENDER_EMAIL}...")
-        server.login(SMTP_SENDER_EMAIL, SMTP_SENDER_PASSWORD)
-        server.sendmail(SMTP_SENDER_EMAIL, recipient_email, msg.as_string())
-        server.quit()
+        deliver_email(recipient_email, subject, body_text, pool)
         print(f"Email successfully sent to {recipient_email}")
         return True
     except smtplib.SMTPAuthenticationError as e:
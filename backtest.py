@@ -0,0 +1,152 @@
+import sys
+import numpy as np
+import pandas as pd
+
+from data_access import load_table
+from stock_ledger import levels_from_movements
+from reorder import find_reorder_candidates
+from order_quantity import apply_rule_order_quantities, ORDER_QUANTITY_SOURCE
+from instrumentation import stage, profile_run
+
+# Backtest of main.py's reorder rule over the stock ledger's history: what it would have ordered,
+# what that would have cost and where stock would have run out or piled up. The replay starts from
+# the ledger's stock levels BACKTEST_DAYS before its last movement and applies every movement in
+# that window except order receipts (usage, adjustments, opening balances). Receipts are replaced by
+# the rule's own orders: at the end of a day, a material whose stock plus the quantity on order is
+# below its ReorderPoint orders StandardOrderQuantity at CurrentPrice, received LeadTimeDays later
+# (main.py counts order_history lines still 'Ordered' towards stock the same way). As in main.py, a
+# PO to a supplier it cannot reach (OrderMethod email without an address, or an unknown method) is
+# logged as failed: it never arrives and does not count as on order, so it is retried every day.
+# Demand that stock cannot cover is lost. Stock above ReorderPoint + StandardOrderQuantity counts as
+# overstock. All materials advance together, one day per step.
+#   python backtest.py [days] [output.csv]
+BACKTEST_DAYS = 365
+BACKTEST_OUTPUT_FILE = "backtest_results.csv"
+DEFAULT_LEAD_TIME_DAYS = 7 # For materials without LeadTimeDays
+RECEIPT_REASON_PREFIX = "Order Received"
+RESULT_COLUMNS = ['Orders', 'FailedOrders', 'Spend', 'StockoutDays', 'UnmetQuantity', 'OverstockDays', 'AverageOverstock', 'AverageStock', 'EndStock']
+
+def reachable_suppliers(suppliers_df):
+    """SupplierIDs whose POs main.place_supplier_order actually places: online, phone, or email with an address."""
+    method = suppliers_df['OrderMethod'].astype(str).str.lower().str.strip(); email = suppliers_df['Email'].astype(str).str.strip()
+    reachable = method.isin(['online', 'phone']) | ((method == 'email') & (email != ''))
+    return set(suppliers_df.loc[reachable, 'SupplierID'].astype(str))
+
+def policy(materials_df, suppliers_df):
+    """
+    The reorder rule per material as main.py applies it (reorder.find_reorder_candidates): ReorderPoint
+    (NaN = never reorders), order quantity and unit price, whether it can be ordered at all and
+    whether its preferred supplier is reachable (reachable_suppliers).
+
+    Returns:
+        DataFrame: 'ReorderPoint', 'OrderQuantity', 'UnitPrice', 'LeadTimeDays', 'Orderable', 'Reachable', on materials_df's index.
+    """
+    probe = materials_df.assign(CurrentStock=-np.inf) # Every material "below" its ReorderPoint, to read its order line
+    lines = find_reorder_candidates(probe)[0]
+    orderable = set(lines['MaterialID']); reachable = set(lines.loc[lines['SupplierID'].isin(reachable_suppliers(suppliers_df)), 'MaterialID'])
+    numbers = lambda col, default: pd.to_numeric(materials_df[col], errors='coerce').astype('float64').fillna(default)
+    lead_time = np.maximum(numbers('LeadTimeDays', DEFAULT_LEAD_TIME_DAYS).round(), 1).astype(np.int64)
+    return pd.DataFrame({'ReorderPoint': numbers('ReorderPoint', np.nan), 'OrderQuantity': numbers('StandardOrderQuantity', 0.0),
+                         'UnitPrice': numbers('CurrentPrice', 0.0), 'LeadTimeDays': lead_time,
+                         'Orderable': materials_df['MaterialID'].astype(str).isin(orderable),
+                         'Reachable': materials_df['MaterialID'].astype(str).isin(reachable)}, index=materials_df.index)
+
+def _per_distinct(values, func):
+    """func applied to the distinct values only (the ledger's ID columns are categorical), spread back to the rows."""
+    codes, uniques = pd.factorize(values)
+    return np.append(np.asarray(func(pd.Index(uniques).astype(str))), func(pd.Index([''])))[np.where(codes < 0, len(uniques), codes)]
+
+def daily_events(movements, material_ids, start, days):
+    """
+    Non-receipt movements of the window, as (day index, material position, change) sorted by day.
+
+    Returns:
+        tuple: (day bounds: events of day d are [bounds[d], bounds[d + 1]), material positions, changes)
+    """
+    receipt = _per_distinct(movements['Reason'], lambda reasons: reasons.str.startswith(RECEIPT_REASON_PREFIX)) | \
+              _per_distinct(movements['RelatedOrderID'], lambda orders: orders != '')
+    day = ((movements['Timestamp'] - start) // pd.Timedelta(days=1))
+    position = _per_distinct(movements['MaterialID'], pd.Index(material_ids).get_indexer)
+    keep = ~receipt & day.between(0, days - 1).to_numpy() & (position >= 0)
+    day = day.to_numpy()[keep].astype(np.int64); position = position[keep]; change = movements['ChangeInQuantity'].fillna(0).to_numpy(dtype='float64')[keep]
+    order = np.argsort(day, kind='stable')
+    return np.searchsorted(day[order], np.arange(days + 1)), position[order], change[order]
+
+def replay(opening_stock, rules, bounds, positions, changes, days):
+    """
+    Runs the reorder rule over `days` days for all materials at once.
+
+    Returns:
+        DataFrame: RESULT_COLUMNS per material (rules' index).
+    """
+    n = len(rules); rop = rules['ReorderPoint'].to_numpy(); quantity = rules['OrderQuantity'].to_numpy()
+    lead = rules['LeadTimeDays'].to_numpy(); can_order = rules['Orderable'].to_numpy() & (quantity > 0); reachable = rules['Reachable'].to_numpy()
+    ceiling = rop + quantity # Above this, stock is overstock (NaN without a ReorderPoint: never)
+    slots = int(lead.max()) + 1 if n else 1
+    stock = np.maximum(opening_stock.astype('float64'), 0); pipeline = np.zeros((slots, n)); on_order = np.zeros(n)
+    orders = np.zeros(n); failed = np.zeros(n); stockout_days = np.zeros(n); unmet = np.zeros(n); overstock_days = np.zeros(n); overstock = np.zeros(n); stock_sum = np.zeros(n)
+    columns = np.arange(n)
+    for day in range(days):
+        arriving = pipeline[day % slots]
+        stock += arriving; on_order -= arriving; arriving[:] = 0
+        lo, hi = bounds[day], bounds[day + 1]
+        stock += np.bincount(positions[lo:hi], weights=np.maximum(changes[lo:hi], 0), minlength=n)
+        demand = np.bincount(positions[lo:hi], weights=np.maximum(-changes[lo:hi], 0), minlength=n)
+        shortfall = np.maximum(demand - stock, 0)
+        stockout_days += shortfall > 0; unmet += shortfall; stock = np.maximum(stock - demand, 0)
+        excess = np.fmax(stock - ceiling, 0); overstock_days += excess > 0; overstock += excess
+        attempted = can_order & (stock + on_order < rop) # False for a NaN ReorderPoint
+        placed = attempted & reachable; failed += attempted & ~reachable # Failed POs are logged but never arrive
+        orders += placed; on_order += np.where(placed, quantity, 0)
+        pipeline[(day + lead[placed]) % slots, columns[placed]] += quantity[placed]
+        stock_sum += stock
+    spend = orders * quantity * rules['UnitPrice'].to_numpy()
+    return pd.DataFrame({'Orders': orders.astype(np.int64), 'FailedOrders': failed.astype(np.int64), 'Spend': spend.round(2),
+                         'StockoutDays': stockout_days.astype(np.int64),
+                         'UnmetQuantity': unmet.round(2), 'OverstockDays': overstock_days.astype(np.int64),
+                         'AverageOverstock': (overstock / max(days, 1)).round(2), 'AverageStock': (stock_sum / max(days, 1)).round(2),
+                         'EndStock': stock.round(2)}, index=rules.index)
+
+def main(argv=None):
+    argv = [arg for arg in (sys.argv[1:] if argv is None else argv) if not arg.startswith('--profile')]
+    days = int(argv[0]) if argv else BACKTEST_DAYS
+    output = argv[1] if len(argv) > 1 else BACKTEST_OUTPUT_FILE
+    print("--- Starting Reorder Policy Backtest ---")
+    with stage('load'):
+        materials_df = load_table('materials'); suppliers_df = load_table('suppliers'); movements = load_table('stock_movements'); history = load_table('order_history')
+    if materials_df.empty: print("Error: No materials to backtest."); return
+    if movements.empty: print("Error: The stock ledger is empty. Nothing to replay."); return
+    if ORDER_QUANTITY_SOURCE == 'eoq': materials_df = apply_rule_order_quantities(materials_df) # As main.py orders
+
+    end = movements['Timestamp'].max().normalize(); start = end - pd.Timedelta(days=days - 1)
+    print(f"Replaying {start:%Y-%m-%d} to {end:%Y-%m-%d} ({days} days) for {len(materials_df)} material(s).")
+    with stage('filter'):
+        material_ids = materials_df['MaterialID'].astype(str).to_numpy()
+        levels = levels_from_movements(movements[movements['Timestamp'] < start]) # As stock_ledger.stock_as_of, from the rows already loaded
+        has_history = pd.Index(material_ids).isin(pd.Index(movements['MaterialID'].unique()).astype(str))
+        master_stock = pd.to_numeric(materials_df['CurrentStock'], errors='coerce').fillna(0).to_numpy()
+        # Ledger level at the start; 0 for materials whose history starts later, the master value for those without any
+        opening = pd.Series(material_ids).map(levels).to_numpy(dtype='float64')
+        opening = np.where(np.isnan(opening), np.where(has_history, 0.0, master_stock), opening)
+        rules = policy(materials_df, suppliers_df)
+        bounds, positions, changes = daily_events(movements, material_ids, start, days)
+    with stage('simulate'): results = replay(opening, rules, bounds, positions, changes, days)
+    results.insert(0, 'MaterialName', materials_df['MaterialName'].to_numpy()); results.insert(0, 'MaterialID', material_ids)
+
+    in_window = history[(history['Timestamp'] >= start) & (history['Timestamp'] < end + pd.Timedelta(days=1))]
+    print(f"\nSimulated orders: {int(results['Orders'].sum())} (actual: {len(in_window)} order lines)")
+    if results['FailedOrders'].any():
+        print(f"Failed orders (supplier unreachable): {int(results['FailedOrders'].sum())} for {int((results['FailedOrders'] > 0).sum())} material(s)")
+    print(f"Simulated spend: {results['Spend'].sum():,.2f} (actual: {in_window['TotalPricePaid'].sum():,.2f})")
+    print(f"Stockouts: {int((results['StockoutDays'] > 0).sum())} material(s), {int(results['StockoutDays'].sum())} material-days, "
+          f"{results['UnmetQuantity'].sum():,.2f} units of demand unmet")
+    print(f"Overstock: {int((results['OverstockDays'] > 0).sum())} material(s), {int(results['OverstockDays'].sum())} material-days, "
+          f"{results['AverageOverstock'].sum():,.2f} units above ReorderPoint + StandardOrderQuantity on an average day")
+    try:
+        with stage('write'): results.to_csv(output, index=False)
+        print(f"\nPer-material results written to '{output}'.")
+    except Exception as e:
+        print(f"Error saving '{output}': {e}")
+
+if __name__ == "__main__":
+    with profile_run('backtest'): main()
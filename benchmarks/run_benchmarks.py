@@ -0,0 +1,171 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+import contextlib
+from datetime import datetime
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from smtp_stub import SMTPStub
+from synthetic_data import generate
+
+# Headless benchmark suite. For each scale a synthetic data set is generated once; every timed
+# run then gets a fresh copy of it as its working directory (the scripts use relative file names),
+# with the in-process table cache dropped, so runs are independent and start cold. Emails go to a
+# local SMTP stand-in. Results are written as JSON; --compare prints the change against an older
+# results file, e.g. one from the previous release.
+#
+#   python benchmarks/run_benchmarks.py --scales 1000,10000,100000 --repeat 3
+#   python benchmarks/run_benchmarks.py --compare benchmarks/results/bench-<old>.json
+DEFAULT_SCALES = [1000, 10000, 100000] # Up to 1,000,000 rows per bulk table
+RESULTS_DIR = os.path.join(REPO_ROOT, "benchmarks", "results")
+RECEIPTS_PER_RUN = 20 # Check-in receipts processed by the 'process_receipt' target
+LEDGER_APPEND_SHARE = 0.01 # Share of purchase ledger rows appended before the 'logic_incremental' target
+
+def _configure_environment(smtp_port):
+    """Must run before the procurement modules are imported: they read these at import time."""
+    os.environ.update({'PROCUREMENT_SMTP_SERVER': '127.0.0.1', 'PROCUREMENT_SMTP_PORT': str(smtp_port),
+                       'PROCUREMENT_SMTP_USE_TLS': 'false', 'PROCUREMENT_OUTBOX_RATE_PER_MINUTE': '0'})
+
+def _targets():
+    """name -> setup function returning the callable to time (setup itself is not timed)."""
+    import main, logic, create_inventory_file
+    from data_access import load_table, upsert_rows
+    from stock_ledger import apply_ledger_stock, record_receipt
+    from reorder import plan_reorders, proposed_orders_frame
+    from open_orders import OpenOrdersIndex
+    from storage import ORDER_HISTORY_HEADERS
+    from purchase_data import DATA_FILE
+
+    def prepare_orders(): # Data path behind ProcurementAppGUI.prepare_orders_action
+        plan = plan_reorders(apply_ledger_stock(load_table('materials')), load_table('suppliers'), load_table('order_history'))
+        return proposed_orders_frame(plan)
+
+    def checkin_load(): # Order check-in window: history, ledger stock and the open-orders index
+        index = OpenOrdersIndex(load_table('order_history', create_if_missing=True))
+        apply_ledger_stock(load_table('materials'))
+        return index.pending_keys()
+
+    def receipts_setup(): # Data path behind OrderCheckInGUI.process_receipt, RECEIPTS_PER_RUN times
+        history = load_table('order_history'); index = OpenOrdersIndex(history)
+        keys = index.pending_keys()[:RECEIPTS_PER_RUN]
+        def run():
+            for key in keys:
+                line = history.loc[index.row_label(key)]
+                record_receipt(str(line['MaterialID']), str(line['MaterialName']), float(line['QuantityOrdered']), str(line['OrderID']))
+                updated = line[ORDER_HISTORY_HEADERS].to_dict(); updated['Status'] = "Received"
+                upsert_rows('order_history', [updated]); index.set_status(key, "Received")
+        return run
+
+    def logic_cached_setup(): # Second full run: purchase ledger served from the columnar cache
+        logic.main(full=True); return lambda: logic.main(full=True)
+
+    def logic_incremental_setup(): # Run after LEDGER_APPEND_SHARE more rows were appended to the ledger
+        logic.main()
+        with open(DATA_FILE, 'rb') as f: lines = f.read().splitlines(keepends=True)
+        with open(DATA_FILE, 'ab') as f: f.writelines(lines[-max(1, int((len(lines) - 1) * LEDGER_APPEND_SHARE)):])
+        return logic.main
+
+    return {'main': lambda: main.main, 'logic': lambda: logic.main, 'logic_cached': logic_cached_setup, 'logic_incremental': logic_incremental_setup,
+            'create_inventory': lambda: create_inventory_file.main, 'prepare_orders': lambda: prepare_orders,
+            'checkin_load': lambda: checkin_load, 'process_receipt': receipts_setup}
+
+def _reset_state():
+    import storage, data_access
+    data_access.invalidate(); storage._storage_instance = None # The SQLite backend holds a connection to the old directory
+
+def _fresh_workdir(pristine, work):
+    if os.path.exists(work): shutil.rmtree(work)
+    shutil.copytree(pristine, work); os.chdir(work); _reset_state()
+
+def _summary(values):
+    return {'min': min(values), 'median': statistics.median(values), 'max': max(values)} if values else None
+
+def run_suite(scales, repeat, target_names, seed=0, keep_data=None, progress=print):
+    smtp = SMTPStub().start(); _configure_environment(smtp.port)
+    targets = _targets(); results = []
+    root = keep_data or tempfile.mkdtemp(prefix="procurement-bench-"); start_dir = os.getcwd()
+    try:
+        for scale in scales:
+            pristine = os.path.join(root, f"data-{scale}"); work = os.path.join(root, f"work-{scale}")
+            progress(f"Generating {scale:,} rows..."); tables = generate(pristine, scale, seed)
+            if os.environ.get('PROCUREMENT_STORAGE_BACKEND', 'csv').lower() == 'sqlite':
+                from storage import migrate_csv_to_sqlite
+                os.chdir(pristine); _reset_state()
+                with contextlib.redirect_stdout(open(os.devnull, 'w')): migrate_csv_to_sqlite(overwrite=True)
+            for name in target_names:
+                runs = []; error = None
+                for _ in range(repeat):
+                    _fresh_workdir(pristine, work); smtp.reset_stats()
+                    try:
+                        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                            run = targets[name]()
+                            wall = time.perf_counter(); cpu = time.process_time()
+                            run()
+                            wall = time.perf_counter() - wall; cpu = time.process_time() - cpu
+                    except Exception as e: error = f"{type(e).__name__}: {e}"; break
+                    finally: os.chdir(start_dir)
+                    runs.append({'wall_s': wall, 'cpu_s': cpu, 'smtp': dict(smtp.stats)})
+                result = {'scale': scale, 'target': name, 'tables': tables, 'runs': runs,
+                          'wall_s': _summary([r['wall_s'] for r in runs]), 'cpu_s': _summary([r['cpu_s'] for r in runs])}
+                if error: result['error'] = error
+                results.append(result)
+                progress(f"  {name:<18} {'ERROR ' + error if error else format(result['wall_s']['median'], '9.3f') + ' s (median wall)'}")
+    finally:
+        os.chdir(start_dir); smtp.stop()
+        if not keep_data: shutil.rmtree(root, ignore_errors=True)
+    return results
+
+def _git_revision():
+    try: return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError): return None
+
+def _environment(repeat, seed):
+    import numpy, pandas
+    return {'created': datetime.now().isoformat(timespec='seconds'), 'git_revision': _git_revision(),
+            'python': platform.python_version(), 'pandas': pandas.__version__, 'numpy': numpy.__version__,
+            'platform': platform.platform(), 'cpu_count': os.cpu_count(), 'repeat': repeat, 'seed': seed,
+            'storage_backend': os.environ.get('PROCUREMENT_STORAGE_BACKEND', 'csv')}
+
+def compare(current, baseline):
+    """Prints median wall time per (scale, target) against a baseline results file."""
+    old = {(r['scale'], r['target']): r for r in baseline['results'] if r.get('wall_s')}
+    print(f"\n{'scale':>9} {'target':<18} {'baseline s':>11} {'current s':>11} {'ratio':>7}")
+    for r in current['results']:
+        before = old.get((r['scale'], r['target']))
+        if not (before and r.get('wall_s')): continue
+        b = before['wall_s']['median']; c = r['wall_s']['median']
+        print(f"{r['scale']:>9,} {r['target']:<18} {b:>11.3f} {c:>11.3f} {c / b if b else float('nan'):>6.2f}x")
+
+if __name__ == "__main__":
+    all_targets = ['main', 'logic', 'logic_cached', 'logic_incremental', 'create_inventory', 'prepare_orders', 'checkin_load', 'process_receipt']
+    parser = argparse.ArgumentParser(description="Benchmark the procurement scripts on synthetic data.")
+    parser.add_argument('--scales', default=",".join(map(str, DEFAULT_SCALES)), help="Comma-separated row counts (1000 to 1000000)")
+    parser.add_argument('--targets', default=",".join(all_targets), help=f"Comma-separated subset of: {', '.join(all_targets)}")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Results JSON (default: benchmarks/results/bench-<timestamp>.json)")
+    parser.add_argument('--compare', help="Earlier results JSON to compare against")
+    parser.add_argument('--keep-data', help="Generate into this directory and keep it")
+    args = parser.parse_args()
+
+    target_names = [t.strip() for t in args.targets.split(",") if t.strip()]
+    unknown = sorted(set(target_names) - set(all_targets))
+    if unknown: parser.error(f"Unknown target(s): {', '.join(unknown)}")
+    report = {'environment': _environment(args.repeat, args.seed),
+              'results': run_suite([int(s) for s in args.scales.split(",")], args.repeat, target_names, args.seed,
+                                   os.path.abspath(args.keep_data) if args.keep_data else None)}
+    output = args.output or os.path.join(RESULTS_DIR, f"bench-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f: json.dump(report, f, indent=2)
+    print(f"Results written to '{output}'.")
+    if args.compare:
+        with open(args.compare) as f: compare(report, json.load(f))
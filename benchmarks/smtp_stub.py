@@ -0,0 +1,50 @@
+import threading
+import socketserver
+
+# Local SMTP stand-in for benchmarks: accepts EHLO/AUTH/MAIL/RCPT/DATA on 127.0.0.1 without TLS,
+# discards the messages and counts connections, logins and messages. Not a mail server.
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def _reply(self, line):
+        self.wfile.write((line + "\r\n").encode()); self.wfile.flush()
+
+    def handle(self):
+        stats = self.server.stats
+        with self.server.lock: stats['connections'] += 1
+        self._reply("220 benchmark SMTP stand-in")
+        while True:
+            line = self.rfile.readline()
+            if not line: return
+            command = line.decode(errors='replace').strip().split(' ', 1)[0].upper()
+            if command in ('EHLO', 'HELO'): self.wfile.write(b"250-localhost\r\n250 AUTH PLAIN LOGIN\r\n"); self.wfile.flush()
+            elif command == 'AUTH':
+                with self.server.lock: stats['logins'] += 1
+                self._reply("235 Authentication successful")
+            elif command == 'DATA':
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                for data_line in self.rfile:
+                    if data_line.rstrip(b"\r\n") == b".": break
+                with self.server.lock: stats['messages'] += 1
+                self._reply("250 OK")
+            elif command == 'QUIT': self._reply("221 Bye"); return
+            else: self._reply("250 OK")
+
+class SMTPStub(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True; daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0):
+        super().__init__((host, port), _SMTPHandler)
+        self.lock = threading.Lock(); self.stats = {'connections': 0, 'logins': 0, 'messages': 0}
+
+    @property
+    def port(self): return self.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def reset_stats(self):
+        with self.lock: self.stats = {'connections': 0, 'logins': 0, 'messages': 0}
+
+    def stop(self):
+        self.shutdown(); self.server_close()
@@ -0,0 +1,136 @@
+import os
+import sys
+import argparse
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) # Repo root
+
+from storage import (MATERIALS_FILE, SUPPLIERS_FILE, ORDER_HISTORY_FILE, STOCK_MOVEMENTS_FILE, MATERIALS_HEADERS,
+                     SUPPLIERS_HEADERS, ORDER_HISTORY_HEADERS, STOCK_MOVEMENTS_HEADERS, TIMESTAMP_FORMAT)
+from purchase_data import DATA_FILE
+from overhead import OVERHEAD_CATEGORIES
+
+# Synthetic procurement data at a chosen scale, written under the file names the scripts expect.
+# `rows` sizes the three bulk tables (order history, stock movements, purchase ledger); materials
+# and suppliers scale with it. Generation is vectorised and deterministic for a given seed.
+PURCHASE_HEADERS = ['Date', 'Week', 'Supplier', 'Description', 'Material Type', 'Quantity', 'Cost Ex VAT', 'Unit Cost']
+MATERIAL_TYPES = np.array(['Dibond', 'Acrylic', 'Vinyl', 'Foamex', 'Aluminium', 'Ink', 'Fixings', 'Laminate'])
+SIZES = np.array(['8x4', '10x5', '1220x610', '600x400', '50m roll', 'A4', 'A3', '3mm'])
+UNITS = np.array(['sheet', 'sheets', 'pack', 'packs', 'units', 'roll', 'box', 'each'])
+OVERHEAD_DESCRIPTIONS = np.array(['Delivery charge', 'Courier fee', 'Monthly rent', 'Software subscription', 'Bank charges'])
+ORDER_METHODS = np.array(['email', 'online', 'phone', ''])
+LINES_PER_ORDER = 5
+HISTORY_DAYS = 365
+
+def table_sizes(rows):
+    return {'materials': max(20, rows // 10), 'suppliers': max(5, rows // 1000),
+            'order_history': rows, 'stock_movements': rows, 'purchases': rows}
+
+def _ids(prefix, values, width):
+    return prefix + pd.Series(values).astype(str).str.zfill(width)
+
+def _timestamps(rng, n, start, days, fmt=TIMESTAMP_FORMAT, sort=True):
+    offsets = rng.integers(0, days * 86400, n)
+    if sort: offsets.sort()
+    return (start + pd.to_timedelta(offsets, unit='s')).strftime(fmt)
+
+def _suppliers(rng, n):
+    ids = _ids("S", np.arange(n), 4)
+    return pd.DataFrame({'SupplierID': ids, 'SupplierName': "Supplier " + ids.str[1:], 'ContactPerson': '',
+                         'Email': "orders@" + ids.str.lower() + ".example", 'Phone': "0191 " + ids.str[1:],
+                         'Website': "https://" + ids.str.lower() + ".example",
+                         'OrderMethod': rng.choice(ORDER_METHODS, n, p=[0.5, 0.3, 0.15, 0.05])}, columns=SUPPLIERS_HEADERS)
+
+def _materials(rng, n, suppliers):
+    rop = rng.integers(5, 200, n).astype(float)
+    supplier_ids = suppliers['SupplierID'].to_numpy()[rng.integers(len(suppliers), size=n)]
+    supplier_ids[rng.random(n) < 0.02] = '' # A few materials without a preferred supplier
+    ids = _ids("M", np.arange(n), 7)
+    return pd.DataFrame({
+        'MaterialID': ids, 'MaterialName': MATERIAL_TYPES[rng.integers(len(MATERIAL_TYPES), size=n)] + " " + SIZES[rng.integers(len(SIZES), size=n)] + " #" + ids.str[1:],
+        'Category': 'Raw Material', 'UnitOfMeasure': UNITS[rng.integers(len(UNITS), size=n)],
+        'CurrentStock': np.round(rop * rng.uniform(0.3, 2.5, n)), # About a third below their reorder point
+        'ReorderPoint': rop, 'StandardOrderQuantity': rng.integers(10, 500, n).astype(float), 'PreferredSupplierID': supplier_ids,
+        'ProductPageURL': np.where(rng.random(n) < 0.5, "https://shop.example/p/" + ids, ''),
+        'LeadTimeDays': rng.integers(2, 30, n), 'SafetyStockQuantity': np.round(rop * 0.3), 'Notes': '',
+        'CurrentPrice': np.round(rng.uniform(0.5, 250, n), 2)}, columns=MATERIALS_HEADERS)
+
+def _order_history(rng, n, materials, suppliers, start):
+    order = np.arange(n) // LINES_PER_ORDER; position = np.arange(n) % LINES_PER_ORDER
+    material = (order * 7919 + position) % len(materials) # Distinct materials within an order
+    supplier_ids = materials['PreferredSupplierID'].to_numpy()[material]
+    supplier_ids = np.where(supplier_ids == '', suppliers['SupplierID'].iloc[0], supplier_ids)
+    supplier_rows = suppliers.set_index('SupplierID').loc[supplier_ids]
+    order_times = _timestamps(rng, order[-1] + 1 if n else 0, start, HISTORY_DAYS)
+    quantity = materials['StandardOrderQuantity'].to_numpy()[material]; price = materials['CurrentPrice'].to_numpy()[material]
+    method = supplier_rows['OrderMethod'].to_numpy()
+    return pd.DataFrame({
+        'OrderID': _ids("PO-B", order, 8), 'Timestamp': np.asarray(order_times)[order],
+        'MaterialID': materials['MaterialID'].to_numpy()[material], 'MaterialName': materials['MaterialName'].to_numpy()[material],
+        'QuantityOrdered': quantity, 'UnitPricePaid': price, 'TotalPricePaid': np.round(quantity * price, 2),
+        'SupplierID': supplier_ids, 'SupplierName': supplier_rows['SupplierName'].to_numpy(),
+        'OrderMethod': np.select([method == 'email', method == 'online', method == 'phone'], ['email_sent', 'online_prompted', 'phone_prompted'], 'manual_review_method_unknown'),
+        'Status': rng.choice(['Received', 'Ordered', 'Partially Received'], n, p=[0.85, 0.1, 0.05]), 'Notes': ''}, columns=ORDER_HISTORY_HEADERS)
+
+def _stock_movements(rng, n, materials, start):
+    """Receipts and usage whose running levels end at each material's CurrentStock."""
+    material = rng.integers(len(materials), size=n)
+    receipt = rng.random(n) < 0.25
+    order_qty = materials['StandardOrderQuantity'].to_numpy()[material]
+    change = np.where(receipt, order_qty, -np.round(order_qty * rng.uniform(0.1, 0.55, n))) # Usage roughly balances receipts
+    running = pd.Series(change).groupby(material).cumsum().to_numpy()
+    total = np.bincount(material, weights=change, minlength=len(materials))
+    level = materials['CurrentStock'].to_numpy()[material] - total[material] + running
+    related = np.where(receipt, _ids("PO-B", rng.integers(0, max(n // LINES_PER_ORDER, 1), n), 8), '')
+    return pd.DataFrame({
+        'MovementID': _ids("SM-B", np.arange(n), 9), 'Timestamp': _timestamps(rng, n, start, HISTORY_DAYS),
+        'MaterialID': materials['MaterialID'].to_numpy()[material], 'MaterialName': materials['MaterialName'].to_numpy()[material],
+        'ChangeInQuantity': change, 'NewStockLevel': level,
+        'Reason': np.where(receipt, "Order Received PO: " + related, 'Usage'), 'RelatedOrderID': related}, columns=STOCK_MOVEMENTS_HEADERS)
+
+def _purchases(rng, n, suppliers, start):
+    n_items = max(50, n // 20)
+    item_base = MATERIAL_TYPES[rng.integers(len(MATERIAL_TYPES), size=n_items)] + " " + SIZES[rng.integers(len(SIZES), size=n_items)] + " - item " + pd.Series(np.arange(n_items)).astype(str)
+    item_supplier = suppliers['SupplierName'].to_numpy()[rng.integers(len(suppliers), size=n_items)]
+    item = rng.integers(n_items, size=n)
+    quantity = rng.integers(1, 50, n).astype(float)
+    in_description = rng.random(n) < 0.4 # Quantity only in the description text: exercises parse_quantity
+    description = np.where(in_description, item_base.to_numpy()[item] + " " + quantity.astype(int).astype(str) + " " + UNITS[rng.integers(len(UNITS), size=n)], item_base.to_numpy()[item])
+    material_type = MATERIAL_TYPES[rng.integers(len(MATERIAL_TYPES), size=n)]
+    overhead = rng.random(n) < 0.1
+    description = np.where(overhead, OVERHEAD_DESCRIPTIONS[rng.integers(len(OVERHEAD_DESCRIPTIONS), size=n)], description)
+    material_type = np.where(overhead & (rng.random(n) < 0.5), rng.choice(OVERHEAD_CATEGORIES, n), material_type)
+    unit_cost = np.round(rng.uniform(0.5, 250, n), 2)
+    dates = pd.to_datetime(_timestamps(rng, n, start, HISTORY_DAYS, fmt="%Y-%m-%d"))
+    return pd.DataFrame({
+        'Date': dates.strftime("%d/%m/%Y"), 'Week': dates.isocalendar().week.to_numpy(),
+        'Supplier': np.where(rng.random(n) < 0.8, item_supplier[item], suppliers['SupplierName'].to_numpy()[rng.integers(len(suppliers), size=n)]),
+        'Description': description, 'Material Type': material_type,
+        'Quantity': np.where(in_description | overhead, np.nan, quantity),
+        'Cost Ex VAT': np.round(unit_cost * quantity, 2), 'Unit Cost': unit_cost}, columns=PURCHASE_HEADERS)
+
+def generate(directory, rows, seed=0):
+    """
+    Writes materials, suppliers, order history, stock movements and the purchase ledger to directory.
+
+    Returns:
+        dict: Row count per table.
+    """
+    rng = np.random.default_rng(seed); sizes = table_sizes(rows)
+    start = pd.Timestamp.now().normalize() - pd.Timedelta(days=HISTORY_DAYS)
+    os.makedirs(directory, exist_ok=True)
+    suppliers = _suppliers(rng, sizes['suppliers'])
+    materials = _materials(rng, sizes['materials'], suppliers)
+    frames = {SUPPLIERS_FILE: suppliers, MATERIALS_FILE: materials,
+              ORDER_HISTORY_FILE: _order_history(rng, sizes['order_history'], materials, suppliers, start),
+              STOCK_MOVEMENTS_FILE: _stock_movements(rng, sizes['stock_movements'], materials, start),
+              DATA_FILE: _purchases(rng, sizes['purchases'], suppliers, start)}
+    for file_name, frame in frames.items(): frame.to_csv(os.path.join(directory, file_name), index=False)
+    return sizes
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic procurement data set.")
+    parser.add_argument('directory'); parser.add_argument('--rows', type=int, default=1000); parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    print(f"Generated {generate(args.directory, args.rows, args.seed)} in '{args.directory}'.")
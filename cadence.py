@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+
+# Order cadence per item: the gaps in days between consecutive orders of the same item, from one
+# stable date sort and a grouped diff over the whole ledger. Used by eda.py; importable from the
+# rule scripts (no plotting dependencies).
+CADENCE_QUANTILE = 0.9 # Upper gap quantile reported alongside the mean/median
+CADENCE_COLUMNS = ['Orders', 'Average Days Between Orders', 'Median Days Between Orders',
+                   f'P{round(CADENCE_QUANTILE * 100)} Days Between Orders', 'Cadence CV']
+
+def order_gaps(df, item_col, date_col):
+    """
+    Days since the same item's previous order, per order row (NaN for an item's first order).
+
+    Returns:
+        DataFrame: item_col, date_col and 'GapDays', sorted by date (ties keep ledger order).
+    """
+    orders = pd.DataFrame({item_col: df[item_col], date_col: pd.to_datetime(df[date_col], errors='coerce')})
+    orders = orders.dropna().sort_values(date_col, kind='stable')
+    orders['GapDays'] = orders.groupby(item_col, sort=False)[date_col].diff().dt.days
+    return orders
+
+def order_cadence(df, item_col, date_col):
+    """
+    Cadence statistics per item: order count and the mean, median, upper quantile and coefficient of
+    variation (std / mean) of the gaps between orders. Gap stats are NaN for items ordered once.
+
+    Returns:
+        DataFrame: Indexed by item (ledger order of first appearance), columns CADENCE_COLUMNS.
+    """
+    orders = order_gaps(df, item_col, date_col)
+    gaps = orders.groupby(item_col, sort=False)['GapDays']
+    stats = pd.DataFrame({'Orders': orders.groupby(item_col, sort=False).size(), 'mean': gaps.mean(), 'median': gaps.median(),
+                          'quantile': gaps.quantile(CADENCE_QUANTILE), 'std': gaps.std()})
+    stats['cv'] = stats['std'] / stats['mean'].replace(0, np.nan) # Same-day repeat orders only: undefined
+    stats = stats.drop(columns='std')
+    stats.columns = CADENCE_COLUMNS
+    stats.index.name = item_col
+    return stats.reindex(pd.unique(df[item_col].dropna())).dropna(subset=['Orders']).astype({'Orders': int})
@@ -0,0 +1,167 @@
+import threading
+import itertools
+import pandas as pd
+from storage import get_storage, empty_frame, format_records, apply_schema, TABLES
+
+# Shared data access for main.py and the GUIs. Parsed tables are cached in-process, keyed by
+# backend + source and validated against the source's (path, mtime, size) signature, so loading
+# an unchanged table is just a copy of the cached frame. Writes made through this module are
+# recorded against the cached frame (re-keyed to the source's new signature) and applied in one
+# batch on the next load: a run of appends becomes a single concat, so reload-after-save does not
+# re-parse the source and a job writing many times pays for one rebuild, not one per write.
+MAX_PENDING_WRITES = 1000 # Beyond this many unapplied writes the cached frame is dropped (re-read on the next load)
+
+_cache = {} # (backend, source) -> (signature, typed DataFrame, writes not yet applied to it)
+_cache_lock = threading.Lock()
+
+def _cache_key(storage, table): return (storage.name, storage.describe(table))
+
+def _cached_frame(storage, table, create_if_missing=False):
+    """Returns (frame, signature). The frame is the cache's own: callers must not modify it."""
+    key = _cache_key(storage, table)
+    signature = storage.signature(table)
+    with _cache_lock: entry = _cache.get(key)
+    if entry is not None and entry[0] == signature:
+        if not entry[2]: return entry[1], signature
+        frame = _apply_writes(table, entry[1], entry[2]) # Outside the lock: writers are not held up
+        with _cache_lock:
+            if _cache.get(key) is entry: # Not written again meanwhile
+                if frame is None: _cache.pop(key)
+                else: _cache[key] = (signature, frame, ())
+        if frame is not None: return frame, signature
+    df = storage.load(table, create_if_missing=create_if_missing)
+    if signature[1] is None: signature = storage.signature(table) # The load may have just created the file
+    with _cache_lock: _cache[key] = (signature, df, ())
+    return df, signature
+
+def load_table(table, create_if_missing=False, on_error=print, on_notice=None):
+    """
+    Returns the typed table, re-parsing the source only if it changed since the last load.
+
+    Args:
+        on_error (callable): Receives the message if loading fails (an empty frame is returned).
+        on_notice (callable): Receives a message when a missing CSV file is about to be initialised.
+    """
+    storage = get_storage(); source = storage.describe(table)
+    if create_if_missing and on_notice and storage.name == 'csv' and not storage.exists(table):
+        on_notice(f"'{source}' not found or empty. Initializing with headers.")
+    try:
+        frame, signature = _cached_frame(storage, table, create_if_missing)
+        df = frame.copy() # Callers may modify their frame freely
+        df.attrs['version'] = signature # Lets save_table detect writes made by others since this load
+        return df
+    except Exception as e:
+        if on_error: on_error(f"Error loading {source}: {e}")
+        return empty_frame(table)
+
+def invalidate(table=None):
+    """Drops cached frames (all tables when table is None)."""
+    storage = get_storage()
+    with _cache_lock:
+        if table is None: _cache.clear()
+        else: _cache.pop(_cache_key(storage, table), None)
+
+# --- Write-through ---
+def _align_categories(table, frames):
+    """Gives the categorical ID columns of all frames the same categories so they can be combined."""
+    for col, kind in TABLES[table]['types'].items():
+        if kind != 'id': continue
+        categories = pd.api.types.union_categoricals([f[col] for f in frames]).categories
+        for f in frames: f[col] = f[col].cat.set_categories(categories)
+
+def _concat(table, frame, rows):
+    if rows.empty: return frame
+    frame = frame.copy(); rows = rows.copy()
+    _align_categories(table, [frame, rows])
+    return pd.concat([frame, rows], ignore_index=True)
+
+def _key_index(table, df):
+    return pd.MultiIndex.from_frame(df[TABLES[table]['key']].astype(str))
+
+def _upsert_frame(table, frame, rows):
+    new_rows = rows.drop_duplicates(TABLES[table]['key'], keep='last')
+    current_keys = _key_index(table, frame)
+    if not current_keys.is_unique: return None # Duplicate keys in the source: let the next load re-read it
+    positions = current_keys.get_indexer(_key_index(table, new_rows)); existing = positions != -1
+    frame = frame.copy(); new_rows = new_rows.copy()
+    _align_categories(table, [frame, new_rows])
+    for j, col in enumerate(TABLES[table]['headers']): # Replace in place so row order matches the source
+        if existing.any(): frame.iloc[positions[existing], j] = new_rows[col].to_numpy()[existing]
+    return _concat(table, frame, new_rows[~existing])
+
+def _delete_frame(table, frame, keys):
+    key_tuples = [tuple(str(v) for v in (k if isinstance(k, (tuple, list)) else (k,))) for k in keys]
+    return frame[~_key_index(table, frame).isin(key_tuples)].reset_index(drop=True)
+
+def _typed_batch(table, batch):
+    """The rows of several writes as one typed frame (typed once, so their categories already agree)."""
+    return apply_schema(table, pd.concat([format_records(table, rows) for rows in batch], ignore_index=True))
+
+def _apply_writes(table, frame, writes):
+    """
+    Applies recorded writes ((kind, rows or keys), oldest first) to a cached frame. Consecutive
+    writes of one kind are applied together, so appends since the last load cost one concat.
+
+    Returns the updated frame, or None if it has to be re-read from the source instead.
+    """
+    for kind, group in itertools.groupby(writes, key=lambda write: write[0]):
+        batch = [payload for _, payload in group]
+        if kind == 'save': frame = apply_schema(table, format_records(table, batch[-1]))
+        elif kind == 'append': frame = _concat(table, frame, _typed_batch(table, batch))
+        elif kind == 'upsert': frame = _upsert_frame(table, frame, _typed_batch(table, batch))
+        else: frame = _delete_frame(table, frame, [key for keys in batch for key in keys])
+        if frame is None: return None
+    return frame
+
+def _write_through(table, write, kind, payload):
+    """Runs a storage write, then records it against the cached frame (applied on the next load).
+    The backend reports the version it wrote on top of; the write is only recorded if that is the
+    cached version (and kind is not None), otherwise the cached frame is dropped and re-read on the
+    next load.
+
+    Returns the new version if the write was recorded (so the next load_table returns exactly the
+    cached frame plus this change), else None."""
+    storage = get_storage(); key = _cache_key(storage, table); updated = None
+    before, after = write(storage)
+    with _cache_lock:
+        entry = _cache.pop(key, None)
+        if before is None: return None
+        if kind is not None and entry is not None and entry[0] == before and len(entry[2]) < MAX_PENDING_WRITES:
+            _cache[key] = (after, entry[1], entry[2] + ((kind, payload),)); updated = after
+        # Backends that share one signature across tables (SQLite): the other tables did not change
+        for other_key, (signature, frame, writes) in list(_cache.items()):
+            if other_key[0] == storage.name and signature == before: _cache[other_key] = (after, frame, writes)
+    return updated
+
+def save_table(table, df):
+    """
+    Full rewrite of a table.
+
+    Raises:
+        ConcurrentModificationError: If df came from load_table and the table was changed by
+            another writer since then (the version travels in df.attrs['version']).
+    """
+    expected_version = df.attrs.get('version')
+    return _write_through(table, lambda storage: storage.save(table, df, expected_version=expected_version), 'save', df.copy())
+
+def append_rows(table, rows):
+    rows = list(rows) if not isinstance(rows, pd.DataFrame) else rows.copy() # Kept until the next load applies it
+    if len(rows) == 0: return
+    return _write_through(table, lambda storage: storage.append(table, rows), 'append', rows)
+
+def upsert_rows(table, rows):
+    rows = list(rows) if not isinstance(rows, pd.DataFrame) else rows.copy()
+    if len(rows) == 0: return
+    return _write_through(table, lambda storage: storage.upsert(table, rows), 'upsert', rows)
+
+def update_rows(table, rows, on):
+    """Sets the columns of `rows` other than `on` on the existing rows matching them on `on` (no inserts).
+    The cached frame is dropped and re-read on the next load."""
+    rows = pd.DataFrame(rows)
+    if rows.empty: return
+    return _write_through(table, lambda storage: storage.update(table, rows, list(on)), None, None)
+
+def delete_rows(table, keys):
+    keys = list(keys)
+    if not keys: return
+    return _write_through(table, lambda storage: storage.delete(table, keys), 'delete', keys)
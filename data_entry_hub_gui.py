@@ -2,21 +2,17 @@ import sys
 import pandas as pd
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QTabWidget,
-    QTableWidget, QTableWidgetItem, QLineEdit, QPushButton, QLabel, QFormLayout,
+    QLineEdit, QPushButton, QLabel, QFormLayout,
     QMessageBox, QComboBox, QSpinBox, QTextEdit, QHeaderView, QDoubleSpinBox,
     QGroupBox
 )
 from PyQt6.QtCore import Qt, QUrl
 from PyQt6.QtGui import QDesktopServices
-import os
 
-MATERIALS_FILE = "materials_master.csv"
-SUPPLIERS_FILE = "suppliers.csv"
-
-MATERIALS_HEADERS = ['MaterialID', 'MaterialName', 'Category', 'UnitOfMeasure', 'CurrentStock',
-                     'ReorderPoint', 'StandardOrderQuantity', 'PreferredSupplierID',
-                     'ProductPageURL', 'LeadTimeDays', 'SafetyStockQuantity', 'Notes', 'CurrentPrice']
-SUPPLIERS_HEADERS = ['SupplierID', 'SupplierName', 'ContactPerson', 'Email', 'Phone', 'Website', 'OrderMethod']
+from storage import get_storage, typed_records, MATERIALS_HEADERS, SUPPLIERS_HEADERS
+from data_access import load_table, upsert_rows, delete_rows
+from stock_ledger import apply_ledger_stock, set_stock_level
+from table_models import DataFrameTableModel, create_table_view, selected_source_rows
 
 def get_int_val(val_str, default=0):
     try: return int(float(str(val_str))) if pd.notna(val_str) and str(val_str).strip() != '' else default
@@ -29,39 +25,30 @@ class DataEntryHubGUI(QMainWindow):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Procurement Data Entry Hub"); self.setGeometry(100, 100, 1100, 800)
-        self.materials_df = self.load_or_create_dataframe(MATERIALS_FILE, MATERIALS_HEADERS)
-        self.suppliers_df = self.load_or_create_dataframe(SUPPLIERS_FILE, SUPPLIERS_HEADERS)
+        self.materials_df = apply_ledger_stock(self.load_or_create_dataframe('materials'))
+        self.suppliers_df = self.load_or_create_dataframe('suppliers')
         self.init_ui()
         self.refresh_materials_table(); self.refresh_suppliers_table()
 
-    def load_or_create_dataframe(self, file_path, expected_headers):
-        if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
-            try:
-                df = pd.read_csv(file_path, dtype=str).fillna('')
-                for header in expected_headers:
-                    if header not in df.columns: df[header] = ''
-                return df[expected_headers].fillna('')
-            except Exception as e:
-                QMessageBox.critical(self, "Load Error", f"Error loading {file_path}: {e}")
-                return pd.DataFrame(columns=expected_headers).astype(str).fillna('')
-        return pd.DataFrame(columns=expected_headers).astype(str).fillna('')
+    def load_or_create_dataframe(self, table):
+        return load_table(table, on_error=lambda msg: QMessageBox.critical(self, "Load Error", msg))
 
-    def save_dataframe(self, df, file_path, headers_order):
+    def save_dataframe(self, table, upserted=None, deleted=None):
+        # Row-level save: only the edited/deleted records are written to the backend.
+        source = get_storage().describe(table)
         try:
-            df_to_save = df.copy()
-            for header in headers_order:
-                 if header not in df_to_save.columns: df_to_save[header] = ''
-            df_to_save[headers_order].to_csv(file_path, index=False)
-            QMessageBox.information(self, "Success", f"Data saved to {file_path}")
-        except Exception as e: QMessageBox.critical(self, "Save Error", f"Error saving to {file_path}: {e}")
+            if upserted: upsert_rows(table, upserted)
+            if deleted: delete_rows(table, deleted)
+            QMessageBox.information(self, "Success", f"Data saved to {source}")
+        except Exception as e: QMessageBox.critical(self, "Save Error", f"Error saving to {source}: {e}")
 
     def init_ui(self):
         self.tabs = QTabWidget(); self.setCentralWidget(self.tabs)
         self.materials_tab = QWidget(); self.tabs.addTab(self.materials_tab, "Materials Master")
         mat_layout = QVBoxLayout(self.materials_tab)
-        self.materials_table_view = QTableWidget()
-        self.materials_table_view.itemSelectionChanged.connect(self.on_material_selected)
-        mat_layout.addWidget(self.materials_table_view)
+        self.materials_model = DataFrameTableModel(MATERIALS_HEADERS)
+        self.materials_table_view = create_table_view(self.materials_model, mat_layout, "Filter materials...")
+        self.materials_table_view.selectionModel().selectionChanged.connect(self.on_material_selected)
         mat_form_group = QGroupBox("Material Details"); mat_form = QFormLayout()
         self.mat_id_edit = QLineEdit(); self.mat_name_edit = QLineEdit(); self.mat_cat_edit = QLineEdit(); self.mat_uom_edit = QLineEdit()
         self.mat_stock_spin = QSpinBox(); self.mat_stock_spin.setRange(0,999999)
@@ -91,8 +78,9 @@ class DataEntryHubGUI(QMainWindow):
 
         self.suppliers_tab = QWidget(); self.tabs.addTab(self.suppliers_tab, "Suppliers")
         sup_layout = QVBoxLayout(self.suppliers_tab)
-        self.suppliers_table_view = QTableWidget(); self.suppliers_table_view.itemSelectionChanged.connect(self.on_supplier_selected_from_table)
-        sup_layout.addWidget(self.suppliers_table_view)
+        self.suppliers_model = DataFrameTableModel(SUPPLIERS_HEADERS)
+        self.suppliers_table_view = create_table_view(self.suppliers_model, sup_layout, "Filter suppliers...")
+        self.suppliers_table_view.selectionModel().selectionChanged.connect(self.on_supplier_selected_from_table)
         sup_form_group = QGroupBox("Supplier Details"); sup_form_details = QFormLayout()
         self.sup_id_edit = QLineEdit(); self.sup_name_edit = QLineEdit(); self.sup_contact_edit = QLineEdit()
         self.sup_email_edit = QLineEdit(); self.sup_phone_edit = QLineEdit()
@@ -138,42 +126,20 @@ class DataEntryHubGUI(QMainWindow):
         if self.materials_df is None: return
         for header in MATERIALS_HEADERS:
             if header not in self.materials_df.columns: self.materials_df[header] = ''
-        display_df = self.materials_df[MATERIALS_HEADERS].fillna('')
-        self.materials_table_view.setRowCount(display_df.shape[0]); self.materials_table_view.setColumnCount(len(MATERIALS_HEADERS))
-        self.materials_table_view.setHorizontalHeaderLabels(MATERIALS_HEADERS)
-        for i in range(display_df.shape[0]):
-            for j, header in enumerate(MATERIALS_HEADERS):
-                self.materials_table_view.setItem(i, j, QTableWidgetItem(str(display_df.iloc[i].get(header, ''))))
-        self.materials_table_view.resizeColumnsToContents(); self.materials_table_view.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
-        self.materials_table_view.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        self.materials_model.set_frame(self.materials_df) # The view formats only the rows it shows
+        self.materials_table_view.resizeColumnsToContents()
 
     def on_material_selected(self):
-        rows = self.materials_table_view.selectionModel().selectedRows()
+        rows = selected_source_rows(self.materials_table_view)
         if not rows:
             self.clear_material_form()
             return
 
-        selected_row_index_in_view = rows[0].row()
-        # Ensure 'MaterialID' is a defined constant or directly use the string
-        material_id_col_idx = MATERIALS_HEADERS.index('MaterialID')
-        mat_id_item = self.materials_table_view.item(selected_row_index_in_view, material_id_col_idx)
-
-        if not mat_id_item or not mat_id_item.text():
+        data = self.materials_model.frame.iloc[rows[0]] # Model rows are positions in the displayed frame
+        if not str(data.get('MaterialID', '')):
             self.clear_material_form()
             return
 
-        material_id = mat_id_item.text()
-
-        data_rows = self.materials_df[self.materials_df['MaterialID'] == material_id]
-
-        if data_rows.empty:
-            self.clear_material_form()
-            # Optional: QMessageBox.warning(self, "Data Sync Error", f"MaterialID '{material_id}' not found in DataFrame.")
-            return  # Explicitly return if no data found
-
-        # This line is now only reached if data_rows is NOT empty
-        data = data_rows.iloc[0]
-
         self.mat_id_edit.setText(str(data.get('MaterialID',''))); self.mat_id_edit.setReadOnly(True)
         self.mat_name_edit.setText(str(data.get('MaterialName','')))
         self.mat_cat_edit.setText(str(data.get('Category',''))); self.mat_uom_edit.setText(str(data.get('UnitOfMeasure','')))
@@ -218,60 +184,43 @@ class DataEntryHubGUI(QMainWindow):
             'Notes': self.mat_notes_edit.toPlainText().strip()
         })
         existing = self.materials_df.index[self.materials_df['MaterialID'] == mat_id].tolist()
-        if existing: self.materials_df.loc[existing[0]] = pd.Series(data_dict)
-        else: self.materials_df = pd.concat([self.materials_df, pd.DataFrame([data_dict], columns=MATERIALS_HEADERS)], ignore_index=True)
-        self.save_dataframe(self.materials_df, MATERIALS_FILE, MATERIALS_HEADERS)
+        old_stock = get_int_val(self.materials_df.loc[existing[0], 'CurrentStock']) if existing else 0
+        try: set_stock_level(mat_id, mat_name, self.mat_stock_spin.value(), opening_stock=old_stock) # Stock edits go through the ledger
+        except Exception as e: QMessageBox.critical(self, "Stock Ledger Error", f"Could not record stock change for {mat_id}: {e}")
+        typed_row = typed_records('materials', [data_dict])
+        if existing: self.materials_df.loc[existing[0]] = typed_row.iloc[0]
+        else: self.materials_df = pd.concat([self.materials_df, typed_row], ignore_index=True)
+        self.save_dataframe('materials', upserted=[data_dict])
         self.refresh_materials_table(); self.clear_material_form()
 
     def delete_material(self):
-        rows = self.materials_table_view.selectionModel().selectedRows()
+        rows = selected_source_rows(self.materials_table_view)
         if not rows: QMessageBox.warning(self, "Selection Error", "Select material to delete."); return
-        idx = MATERIALS_HEADERS.index('MaterialID')
-        mat_id_del = self.materials_table_view.item(rows[0].row(), idx).text()
+        mat_id_del = str(self.materials_model.value(rows[0], 'MaterialID'))
         if QMessageBox.question(self, "Confirm", f"Delete '{mat_id_del}'?", QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No) == QMessageBox.StandardButton.Yes:
             self.materials_df = self.materials_df[self.materials_df['MaterialID'] != mat_id_del].reset_index(drop=True)
-            self.save_dataframe(self.materials_df, MATERIALS_FILE, MATERIALS_HEADERS)
+            self.save_dataframe('materials', deleted=[mat_id_del])
             self.refresh_materials_table(); self.clear_material_form()
 
     def refresh_suppliers_table(self):
         if self.suppliers_df is None: return
         for header in SUPPLIERS_HEADERS:
             if header not in self.suppliers_df.columns: self.suppliers_df[header] = ''
-        display_df = self.suppliers_df[SUPPLIERS_HEADERS].fillna('')
-        self.suppliers_table_view.setRowCount(display_df.shape[0]); self.suppliers_table_view.setColumnCount(len(SUPPLIERS_HEADERS))
-        self.suppliers_table_view.setHorizontalHeaderLabels(SUPPLIERS_HEADERS)
-        for i in range(display_df.shape[0]):
-            for j, header in enumerate(SUPPLIERS_HEADERS):
-                self.suppliers_table_view.setItem(i, j, QTableWidgetItem(str(display_df.iloc[i].get(header, ''))))
-        self.suppliers_table_view.resizeColumnsToContents(); self.suppliers_table_view.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
-        self.suppliers_table_view.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        self.suppliers_model.set_frame(self.suppliers_df)
+        self.suppliers_table_view.resizeColumnsToContents()
         self.populate_preferred_supplier_dropdown()
 
-    def on_supplier_selected_from_table(self): # CORRECTED METHOD
-        rows = self.suppliers_table_view.selectionModel().selectedRows()
+    def on_supplier_selected_from_table(self):
+        rows = selected_source_rows(self.suppliers_table_view)
         if not rows:
             self.clear_supplier_form()
             return
 
-        selected_row_index_in_view = rows[0].row()
-
-        supplier_id_col_idx = SUPPLIERS_HEADERS.index('SupplierID')
-        sup_id_item = self.suppliers_table_view.item(selected_row_index_in_view, supplier_id_col_idx)
-
-        if not sup_id_item or not sup_id_item.text():
+        data = self.suppliers_model.frame.iloc[rows[0]]
+        if not str(data.get('SupplierID', '')):
             self.clear_supplier_form()
             return
 
-        supplier_id = sup_id_item.text() # Defined variable `supplier_id`
-
-        data_rows = self.suppliers_df[self.suppliers_df['SupplierID'] == supplier_id] # Used corrected `supplier_id`
-
-        if data_rows.empty:
-            self.clear_supplier_form()
-            return
-
-        data = data_rows.iloc[0]
-
         self.sup_id_edit.setText(str(data.get('SupplierID', ''))); self.sup_id_edit.setReadOnly(True)
         self.sup_name_edit.setText(str(data.get('SupplierName', '')))
         self.sup_contact_edit.setText(str(data.get('ContactPerson', '')))
@@ -301,14 +250,13 @@ class DataEntryHubGUI(QMainWindow):
         existing = self.suppliers_df.index[self.suppliers_df['SupplierID'] == sup_id].tolist()
         if existing: self.suppliers_df.loc[existing[0]] = pd.Series(data_dict)
         else: self.suppliers_df = pd.concat([self.suppliers_df, pd.DataFrame([data_dict], columns=SUPPLIERS_HEADERS)], ignore_index=True)
-        self.save_dataframe(self.suppliers_df, SUPPLIERS_FILE, SUPPLIERS_HEADERS)
+        self.save_dataframe('suppliers', upserted=[data_dict])
         self.refresh_suppliers_table(); self.clear_supplier_form()
 
     def delete_supplier(self):
-        rows = self.suppliers_table_view.selectionModel().selectedRows()
+        rows = selected_source_rows(self.suppliers_table_view)
         if not rows: QMessageBox.warning(self, "Selection Error", "Select supplier to delete."); return
-        idx = SUPPLIERS_HEADERS.index('SupplierID')
-        sup_id_del = self.suppliers_table_view.item(rows[0].row(), idx).text()
+        sup_id_del = str(self.suppliers_model.value(rows[0], 'SupplierID'))
         if not self.materials_df.empty and 'PreferredSupplierID' in self.materials_df.columns:
             used_by = self.materials_df[self.materials_df['PreferredSupplierID'] == sup_id_del]['MaterialID'].tolist()
             if used_by:
@@ -316,7 +264,7 @@ class DataEntryHubGUI(QMainWindow):
                 return
         if QMessageBox.question(self, "Confirm", f"Delete '{sup_id_del}'?", QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No) == QMessageBox.StandardButton.Yes:
             self.suppliers_df = self.suppliers_df[self.suppliers_df['SupplierID'] != sup_id_del].reset_index(drop=True)
-            self.save_dataframe(self.suppliers_df, SUPPLIERS_FILE, SUPPLIERS_HEADERS)
+            self.save_dataframe('suppliers', deleted=[sup_id_del])
             self.refresh_suppliers_table(); self.clear_supplier_form()
 
 if __name__ == '__main__':
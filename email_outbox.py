@@ -0,0 +1,177 @@
+import os
+import sys
+import time
+import uuid
+import random
+import asyncio
+import smtplib
+from contextlib import ExitStack
+from datetime import datetime, timedelta
+import pandas as pd
+
+from action import deliver_email, smtp_configured, SMTPPool, SMTP_SERVER, SMTP_PORT
+from storage import TIMESTAMP_FORMAT
+from data_access import load_table, append_rows, upsert_rows, update_rows, delete_rows
+from write_coordinator import file_lock
+
+# Durable outbox for PO emails. Order generation renders each supplier's email, appends it to the
+# email_outbox table as 'queued' and moves on; delivery passes drain the due messages with an
+# asyncio worker (bounded concurrency, per-server rate limit, exponential backoff between
+# attempts) and write each message's state back to its order lines' OrderMethod.
+# Delivery is at-least-once: a crash between a successful send and saving its state re-sends it.
+OUTBOX_CONCURRENCY = int(os.environ.get('PROCUREMENT_OUTBOX_CONCURRENCY', 4)) # Emails in flight at once
+OUTBOX_RATE_PER_MINUTE = float(os.environ.get('PROCUREMENT_OUTBOX_RATE_PER_MINUTE', 30)) # Per SMTP server
+OUTBOX_MAX_ATTEMPTS = 6
+OUTBOX_BACKOFF_BASE = 30 # Seconds before the first retry; doubles with every failed attempt
+OUTBOX_BACKOFF_MAX = 3600
+OUTBOX_POLL_INTERVAL = 30 # Worker: seconds between checks for newly queued messages
+OUTBOX_RETENTION_DAYS = 90 # Sent messages older than this are dropped from the outbox
+OUTBOX_LOCK_FILE = "email_outbox.deliver" # Held during a pass so two processes never send the same message
+
+QUEUED, SENT, FAILED = 'queued', 'sent', 'failed'
+HISTORY_METHODS = {QUEUED: 'email_queued', SENT: 'email_sent', FAILED: 'email_failed_send'} # Status -> OrderMethod
+PERMANENT_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPNotSupportedError)
+
+def generate_message_id():
+    return f"MSG-{datetime.now().strftime('%Y%m%d-%H%M%S%f')[:-3]}-{uuid.uuid4().hex[:6]}"
+
+def _now(): return datetime.now().strftime(TIMESTAMP_FORMAT)
+
+def enqueue_po_email(order_id, supplier_id, recipient, subject, body):
+    """Stores a rendered PO email for delivery and returns its MessageID (no network I/O)."""
+    message_id = generate_message_id(); now = _now()
+    append_rows('email_outbox', [{'MessageID': message_id, 'Created': now, 'OrderID': order_id, 'SupplierID': supplier_id,
+                                 'Recipient': recipient, 'Subject': subject, 'Body': body, 'Status': QUEUED,
+                                 'Attempts': 0, 'NextAttemptAt': now, 'LastAttemptAt': '', 'LastError': ''}])
+    return message_id
+
+def backoff_seconds(attempts):
+    delay = min(OUTBOX_BACKOFF_MAX, OUTBOX_BACKOFF_BASE * 2 ** max(attempts - 1, 0))
+    return delay * random.uniform(0.8, 1.2) # Jitter, so messages that failed together do not retry together
+
+class RateLimiter:
+    """Spaces sends to one server at least 60/per_minute seconds apart."""
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._next = 0.0; self._lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self._lock:
+            now = time.monotonic(); start = max(now, self._next); self._next = start + self.interval
+        if start > now: await asyncio.sleep(start - now)
+
+def _due_messages(outbox, message_ids=None):
+    queued = outbox[outbox['Status'] == QUEUED]
+    if message_ids is not None: queued = queued[queued['MessageID'].isin(list(message_ids))]
+    due = queued['NextAttemptAt'].isna() | (queued['NextAttemptAt'] <= pd.Timestamp.now())
+    return queued[due]
+
+def _record_attempt(message, error, progress):
+    """The outcome of one attempt: the message's updated outbox row (not saved yet)."""
+    attempts = (0 if pd.isna(message['Attempts']) else int(message['Attempts'])) + 1
+    update = dict(message, Attempts=attempts, LastAttemptAt=_now(), LastError='' if error is None else str(error)[:500])
+    if error is None:
+        update['Status'] = SENT; progress(f"  Email to {message['Recipient']} ({message['OrderID']}) sent.")
+    elif isinstance(error, PERMANENT_ERRORS) or attempts >= OUTBOX_MAX_ATTEMPTS:
+        update['Status'] = FAILED; progress(f"  Email to {message['Recipient']} ({message['OrderID']}) FAILED after {attempts} attempt(s): {error}")
+    else:
+        delay = backoff_seconds(attempts)
+        update['NextAttemptAt'] = (datetime.now() + timedelta(seconds=delay)).strftime(TIMESTAMP_FORMAT)
+        progress(f"  Email to {message['Recipient']} ({message['OrderID']}) failed ({error}); retry {attempts + 1}/{OUTBOX_MAX_ATTEMPTS} in {delay:.0f}s.")
+    return update
+
+async def deliver_outbox(message_ids=None, concurrency=OUTBOX_CONCURRENCY, rate_per_minute=OUTBOX_RATE_PER_MINUTE,
+                         progress=print, should_stop=None):
+    """
+    One delivery pass over the due messages (all of them, or only message_ids).
+
+    Args:
+        should_stop (callable): Checked before each send; messages not started stay queued.
+    Returns:
+        dict: MessageID -> Status after this pass, for the messages attempted.
+    """
+    due = _due_messages(load_table('email_outbox', create_if_missing=True), message_ids)
+    results = {}
+    if due.empty: return results
+    if not smtp_configured():
+        progress("Error: SMTP server, sender email, or password not configured. Messages stay queued."); return results
+    progress(f"Delivering {len(due)} queued email(s), up to {concurrency} at a time...")
+    semaphore = asyncio.Semaphore(concurrency); limiters = {}
+    pool = SMTPPool(max_size=concurrency) # One login per connection for the whole pass
+
+    async def deliver(message):
+        async with semaphore:
+            if should_stop and should_stop(): return
+            await limiters.setdefault(f"{SMTP_SERVER}:{SMTP_PORT}", RateLimiter(rate_per_minute)).wait()
+            if should_stop and should_stop(): return
+            try: await asyncio.to_thread(deliver_email, message['Recipient'], message['Subject'], message['Body'], pool); error = None
+            except Exception as e: error = e
+            update = _record_attempt(message, error, progress)
+            # Saved per message (off the event loop, so other sends carry on), so a crash loses at most the sends in flight
+            await asyncio.to_thread(upsert_rows, 'email_outbox', [update])
+            results[message['MessageID']] = update['Status']
+
+    try: await asyncio.gather(*(deliver(message) for message in due.to_dict('records')))
+    finally:
+        await asyncio.to_thread(pool.close)
+        updated = await asyncio.to_thread(sync_order_history)
+        if updated: progress(f"Updated delivery state on {updated} order line(s).")
+    return results
+
+def sync_order_history(outbox=None):
+    """
+    Writes each message's delivery state to the OrderMethod of its order lines. Only OrderMethod is
+    written (storage update by OrderID + SupplierID), so a check-in saved in the meantime keeps its
+    Status and Notes. Returns the number of lines changed.
+    """
+    outbox = load_table('email_outbox') if outbox is None else outbox
+    if outbox.empty: return 0
+    methods = outbox[['OrderID', 'SupplierID']].astype(str).assign(OrderMethodOutbox=outbox['Status'].map(HISTORY_METHODS))
+    methods = methods.dropna().drop_duplicates(['OrderID', 'SupplierID'], keep='last')
+    history = load_table('order_history')
+    lines = history[history['OrderID'].astype(str).isin(methods['OrderID'])]
+    if lines.empty: return 0
+    lines = lines[['OrderID', 'SupplierID', 'OrderMethod']].astype(str).merge(methods, on=['OrderID', 'SupplierID'], how='inner')
+    lines = lines[lines['OrderMethodOutbox'] != lines['OrderMethod']]
+    if lines.empty: return 0
+    changed = lines.drop_duplicates(['OrderID', 'SupplierID'])[['OrderID', 'SupplierID', 'OrderMethodOutbox']]
+    update_rows('order_history', changed.rename(columns={'OrderMethodOutbox': 'OrderMethod'}), on=['OrderID', 'SupplierID'])
+    return len(lines)
+
+def purge_sent(retention_days=OUTBOX_RETENTION_DAYS):
+    outbox = load_table('email_outbox')
+    if outbox.empty: return 0
+    old = outbox[(outbox['Status'] == SENT) & (outbox['LastAttemptAt'] < pd.Timestamp.now() - pd.Timedelta(days=retention_days))]
+    if not old.empty: delete_rows('email_outbox', old['MessageID'].tolist())
+    return len(old)
+
+def deliver_pending(message_ids=None, progress=print, should_stop=None):
+    """Runs one delivery pass, unless another process is delivering already (it will pick them up)."""
+    with ExitStack() as stack:
+        try: stack.enter_context(file_lock(OUTBOX_LOCK_FILE, timeout=0))
+        except TimeoutError:
+            progress("Another delivery worker is running; it will send the queued emails."); return {}
+        return asyncio.run(deliver_outbox(message_ids, progress=progress, should_stop=should_stop))
+
+def run_worker(until_empty=False, progress=print):
+    """Delivers continuously, sleeping until the next retry is due or new messages may have arrived."""
+    while True:
+        deliver_pending(progress=progress); purge_sent()
+        queued = load_table('email_outbox', create_if_missing=True)
+        queued = queued[queued['Status'] == QUEUED]
+        if queued.empty and until_empty: return
+        next_due = queued['NextAttemptAt'].min() if not queued.empty else pd.NaT
+        wait = OUTBOX_POLL_INTERVAL if pd.isna(next_due) else (next_due - pd.Timestamp.now()).total_seconds()
+        time.sleep(min(OUTBOX_POLL_INTERVAL, max(wait, 1.0)))
+
+if __name__ == "__main__":
+    if '--once' in sys.argv[1:]:
+        results = deliver_pending()
+        print(f"Delivery pass finished: {sum(s == SENT for s in results.values())} sent, "
+              f"{sum(s == QUEUED for s in results.values())} to retry, {sum(s == FAILED for s in results.values())} failed.")
+    elif len(sys.argv) == 1 or '--until-empty' in sys.argv[1:]:
+        print("--- Email outbox worker started (Ctrl+C to stop) ---")
+        try: run_worker(until_empty='--until-empty' in sys.argv[1:])
+        except KeyboardInterrupt: print("\n--- Email outbox worker stopped ---")
+    else:
+        print("Usage: python email_outbox.py [--once | --until-empty]")
@@ -1,42 +1,26 @@
 import pandas as pd
-import re
 
-# --- Configuration (should match eda.py for consistency) ---
-DATA_FILE = "March to May 25 Purchases.csv"
+from purchase_data import DATA_FILE, load_purchases, iter_purchases, combine_meta, streaming_requested
 
-# Columns
-SUPPLIER_COLUMN_CANDIDATES = ['Supplier', 'Supplier Name', 'Vendor']
-ITEM_COLUMN_CANDIDATES = ['Description', 'Item Name', 'RawMaterial'] # For filtering
-CATEGORY_COLUMN_CANDIDATES = ['Material Type', 'Category', 'Type'] # For filtering
-
-# Overhead filtering (should match eda.py and logic.py)
-OVERHEAD_CATEGORIES = [
-    'Shipping', 'Salaries', 'Rent', 'General', 'Admin', 'Software',
-    'Utilities', 'Bank Charges', 'Consultancy', 'Travel', 'Marketing',
-    'Taxes', 'Insurance', 'Maintenance', 'Staff Costs', 'Office Supplies',
-    'Logistics', 'IT Support', 'Legal Fees', 'Accounting Fees', 'Subscriptions', 'Training'
-]
-OVERHEAD_ITEM_KEYWORDS = [
-    'shipment', 'delivery', 'courier', 'consulting', 'fee', 'tax', 'vat',
-    'service charge', 'bank charges', 'rent', 'salary', 'salaries', 'payroll',
-    'interest', 'insurance', 'travel expenses', 'subscription', 'software license',
-    'utilities', 'phone bill', 'internet bill', 'office cleaning', 'repairs'
-]
-
-def find_column(df, candidates):
-    for col in candidates:
-        if col in df.columns:
-            # print(f"Found column: '{col}' for {', '.join(candidates)}")
-            return col
-    # print(f"Warning: None of the candidate columns ({', '.join(candidates)}) found.")
-    return None
+# Column detection and overhead filtering are shared with eda.py via purchase_data.py
 
 def main():
     print(f"Starting script to extract unique supplier names from '{DATA_FILE}'...")
 
+    # Overheads are filtered out by load_purchases (to get suppliers of procurement items primarily).
+    # Streaming mode keeps only each chunk's distinct suppliers.
     try:
-        df = pd.read_csv(DATA_FILE)
-        # print(f"Successfully loaded '{DATA_FILE}'.")
+        if streaming_requested():
+            distinct = pd.Series(dtype=object); metas = []
+            for chunk, chunk_meta in iter_purchases(columns=['supplier'], verbose=False):
+                col = chunk_meta['columns']['supplier']
+                if col: distinct = pd.concat([distinct, pd.Series(chunk[col].dropna().unique(), dtype=object)], ignore_index=True).drop_duplicates()
+                metas.append(chunk_meta)
+            meta = combine_meta(metas)
+            if meta is None: raise ValueError("the purchase file has no rows")
+            df_filtered = pd.DataFrame({meta['columns']['supplier'] or 'supplier': distinct})
+        else:
+            df_filtered, meta = load_purchases(columns=['supplier'], verbose=False)
     except FileNotFoundError:
         print(f"Error: The file '{DATA_FILE}' was not found.")
         return
@@ -44,25 +28,12 @@ def main():
         print(f"Error loading '{DATA_FILE}': {e}")
         return
 
-    supplier_col = find_column(df, SUPPLIER_COLUMN_CANDIDATES)
-    item_col = find_column(df, ITEM_COLUMN_CANDIDATES) # Needed for filtering context
-    category_col = find_column(df, CATEGORY_COLUMN_CANDIDATES) # Needed for filtering context
-
-
+    supplier_col = meta['columns']['supplier']
     if not supplier_col:
         print("Error: Supplier column not found. Cannot extract supplier names.")
         return
 
-    # --- Filtering Overheads (to get suppliers of procurement items primarily) ---
-    # You might decide to remove this filtering if you want ALL suppliers, including overhead ones.
-    df_filtered = df.copy()
-    if category_col:
-        df_filtered = df_filtered[~df_filtered[category_col].astype(str).str.lower().isin([cat.lower() for cat in OVERHEAD_CATEGORIES])]
-    if item_col: # Ensure item_col exists before trying to use it for keyword filtering
-        keyword_pattern = '|'.join([re.escape(keyword.lower()) for keyword in OVERHEAD_ITEM_KEYWORDS])
-        df_filtered = df_filtered[~df_filtered[item_col].astype(str).str.lower().str.contains(keyword_pattern, na=False)]
-    
-    print(f"Number of rows after attempting to filter overheads: {len(df_filtered)}")
+    print(f"Number of rows after attempting to filter overheads: {meta['rows_after_keyword_filter']}")
     
     unique_suppliers = df_filtered[supplier_col].dropna().unique()
     unique_suppliers.sort() # Sort for consistent order
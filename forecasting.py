@@ -0,0 +1,108 @@
+import os
+import numpy as np
+import pandas as pd
+
+# Daily demand forecasts for every material at once (used by logic.py). Ledger quantities are summed
+# per material and day, laid out as a dense materials x days matrix (zero = no order that day) and
+# run through simple exponential smoothing and Holt's linear trend method, one vectorised update
+# per day across all materials. Per material, the model with the lower one-step-ahead mean absolute
+# error gives the forecast. The matrix is built FORECAST_BLOCK_MATERIALS rows at a time, so memory
+# stays bounded by block size x history length whatever the number of materials.
+SES_ALPHA = float(os.environ.get('PROCUREMENT_SES_ALPHA', 0.1)) # Level smoothing, simple exponential smoothing
+HOLT_ALPHA = float(os.environ.get('PROCUREMENT_HOLT_ALPHA', 0.1)) # Level smoothing, Holt
+HOLT_BETA = float(os.environ.get('PROCUREMENT_HOLT_BETA', 0.05)) # Trend smoothing, Holt
+FORECAST_HISTORY_DAYS = int(os.environ.get('PROCUREMENT_FORECAST_HISTORY_DAYS', 730)) # Most recent days fitted
+FORECAST_BLOCK_MATERIALS = 10000 # Matrix rows (materials) per block
+SES, HOLT = 'SES', 'Holt'
+FORECAST_COLUMNS = ['ForecastDailyUsage', 'ForecastModel', 'ForecastTrend', 'ForecastMAE', 'ForecastRMSE', 'ForecastAsOf']
+
+def fit_ses(demand, alpha=SES_ALPHA):
+    """
+    Simple exponential smoothing of each row of `demand` (materials x days), seeded with the first day.
+
+    Returns:
+        tuple: (next-day forecast per row, one-step-ahead errors as a materials x (days - 1) array)
+    """
+    level = demand[:, 0].copy(); errors = np.empty((demand.shape[0], demand.shape[1] - 1), dtype=demand.dtype)
+    for t in range(1, demand.shape[1]):
+        errors[:, t - 1] = demand[:, t] - level
+        level += alpha * errors[:, t - 1]
+    return level, errors
+
+def fit_holt(demand, alpha=HOLT_ALPHA, beta=HOLT_BETA):
+    """
+    Holt's linear trend method on each row of `demand`, seeded with the first day's level and no trend.
+
+    Returns:
+        tuple: (next-day forecast per row, trend per day per row, one-step-ahead errors)
+    """
+    level = demand[:, 0].copy(); trend = np.zeros_like(level)
+    errors = np.empty((demand.shape[0], demand.shape[1] - 1), dtype=demand.dtype)
+    for t in range(1, demand.shape[1]):
+        forecast = level + trend
+        errors[:, t - 1] = demand[:, t] - forecast
+        new_level = forecast + alpha * errors[:, t - 1]
+        trend = beta * (new_level - level) + (1 - beta) * trend
+        level = new_level
+    return level + trend, trend, errors
+
+def demand_days(daily):
+    """The forecast window for `daily` demand: the last FORECAST_HISTORY_DAYS days up to the latest order."""
+    end = daily['Day'].max()
+    start = max(daily['Day'].min(), end - pd.Timedelta(days=FORECAST_HISTORY_DAYS - 1))
+    return pd.date_range(start, end, freq='D')
+
+def demand_blocks(daily, days, block=FORECAST_BLOCK_MATERIALS):
+    """
+    The dense demand matrix of `daily` over `days`, FORECAST_BLOCK_MATERIALS materials at a time.
+
+    Returns:
+        tuple: (materials Index, generator of (first, last, materials x days array) for rows first:last)
+    """
+    codes, materials = pd.factorize(daily['RawMaterial'])
+    offsets = ((daily['Day'] - days[0]) // pd.Timedelta(days=1)).to_numpy()
+    inside = (offsets >= 0) & (offsets < len(days))
+    codes, offsets, quantity = codes[inside], offsets[inside], daily['Quantity'].to_numpy(dtype='float64')[inside]
+    order = np.argsort(codes, kind='stable'); codes, offsets, quantity = codes[order], offsets[order], quantity[order]
+    def blocks():
+        for first in range(0, len(materials), block):
+            last = min(first + block, len(materials))
+            lo, hi = np.searchsorted(codes, [first, last])
+            demand = np.zeros((last - first, len(days)))
+            np.add.at(demand, (codes[lo:hi] - first, offsets[lo:hi]), quantity[lo:hi])
+            yield first, last, demand
+    return materials, blocks()
+
+def forecast_demand(daily, days=None):
+    """
+    Forecast per material from daily demand.
+
+    Args:
+        daily (DataFrame): 'RawMaterial', 'Day' (datetime, midnight) and 'Quantity', one row per material and day.
+        days (DatetimeIndex, optional): The window to fit, e.g. demand_days() of a larger ledger when
+            forecasting a subset of its materials. Defaults to demand_days(daily).
+
+    Returns:
+        DataFrame: Indexed by RawMaterial, FORECAST_COLUMNS. Materials with no demand inside the window
+            forecast 0.
+    """
+    if daily.empty: return pd.DataFrame(columns=FORECAST_COLUMNS, index=pd.Index([], name='RawMaterial'))
+    days = demand_days(daily) if days is None else days
+    materials, blocks = demand_blocks(daily, days)
+    n = len(materials); result = {col: np.empty(n, dtype=object if col in ('ForecastModel', 'ForecastAsOf') else 'float64') for col in FORECAST_COLUMNS}
+    for first, last, demand in blocks:
+        if len(days) < 2: # A single day: nothing to smooth or score
+            result['ForecastDailyUsage'][first:last] = demand[:, 0]; result['ForecastTrend'][first:last] = 0.0
+            result['ForecastMAE'][first:last] = result['ForecastRMSE'][first:last] = np.nan; result['ForecastModel'][first:last] = SES
+            continue
+        ses_forecast, ses_errors = fit_ses(demand)
+        holt_forecast, holt_trend, holt_errors = fit_holt(demand)
+        ses_mae = np.abs(ses_errors).mean(axis=1); holt_mae = np.abs(holt_errors).mean(axis=1)
+        use_holt = holt_mae < ses_mae
+        result['ForecastDailyUsage'][first:last] = np.clip(np.where(use_holt, holt_forecast, ses_forecast), 0, None)
+        result['ForecastModel'][first:last] = np.where(use_holt, HOLT, SES)
+        result['ForecastTrend'][first:last] = np.where(use_holt, holt_trend, 0.0)
+        result['ForecastMAE'][first:last] = np.where(use_holt, holt_mae, ses_mae)
+        result['ForecastRMSE'][first:last] = np.sqrt(np.where(use_holt, (holt_errors ** 2).mean(axis=1), (ses_errors ** 2).mean(axis=1)))
+    result['ForecastAsOf'][:] = days[-1].strftime('%Y-%m-%d')
+    return pd.DataFrame(result, index=pd.Index(materials, name='RawMaterial'))
@@ -0,0 +1,153 @@
+import os
+import sys
+import json
+import time
+import pstats
+import cProfile
+import functools
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+try: import resource # Unix only: process max RSS
+except ImportError: resource = None
+
+# Opt-in run instrumentation for the CLI scripts (main, logic, eda, create_inventory_file). Off
+# unless PROCUREMENT_PROFILE is set or the script is started with --profile[=mode]:
+#   stages   - wall time, CPU time and peak traced memory per named stage (load, filter, ...)
+#   cprofile - stages plus a cProfile of the whole run (.prof file and the top functions)
+#   sample   - stages plus a sampling profile of the main thread (lower overhead than cProfile)
+# A JSON report goes to PROFILE_DIR. Stages may nest and their times are inclusive. Memory is
+# traced with tracemalloc, which slows allocation-heavy code, so compare stage times between
+# profiled runs rather than against unprofiled ones. When off, stage() is a no-op.
+PROFILE_MODE = os.environ.get('PROCUREMENT_PROFILE', '').strip().lower()
+PROFILE_DIR = os.environ.get('PROCUREMENT_PROFILE_DIR', 'profiles')
+PROFILE_MODES = ('stages', 'cprofile', 'sample')
+SAMPLE_INTERVAL = 0.005 # Seconds between stack samples in 'sample' mode
+TOP_FUNCTIONS = 30 # Functions listed in the report
+
+_session = None # The active run, if profiling
+
+def requested_mode(argv=None):
+    """Profiling mode from --profile[=mode] in argv, else PROCUREMENT_PROFILE. None when off."""
+    argv = sys.argv[1:] if argv is None else argv
+    flags = [arg for arg in argv if arg == '--profile' or arg.startswith('--profile=')]
+    mode = (flags[-1].partition('=')[2] or 'stages') if flags else PROFILE_MODE
+    if mode in ('', '0', 'false', 'off', 'no'): return None
+    if mode in ('1', 'true', 'on', 'yes'): return 'stages'
+    if mode not in PROFILE_MODES:
+        print(f"Warning: Unknown profile mode '{mode}' (expected {', '.join(PROFILE_MODES)}). Recording stages only.")
+        return 'stages'
+    return mode
+
+def _function_name(code):
+    return f"{os.path.basename(code.co_filename)}:{code.co_firstlineno}({code.co_name})"
+
+class _Sampler(threading.Thread):
+    """Samples the watched thread's stack every `interval` seconds."""
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.thread_id = thread_id; self.interval = interval; self.samples = 0
+        self.own = Counter(); self.cumulative = Counter(); self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None: continue
+            self.samples += 1; self.own[_function_name(frame.f_code)] += 1
+            seen = set()
+            while frame is not None:
+                name = _function_name(frame.f_code)
+                if name not in seen: seen.add(name); self.cumulative[name] += 1 # Recursion counts once
+                frame = frame.f_back
+
+    def stop(self):
+        self._stop_event.set(); self.join()
+
+    def report(self, top=TOP_FUNCTIONS):
+        share = lambda count: round(count / self.samples, 4) if self.samples else 0.0
+        return {'interval_s': self.interval, 'samples': self.samples,
+                'top_own': [{'function': f, 'samples': n, 'share': share(n)} for f, n in self.own.most_common(top)],
+                'top_cumulative': [{'function': f, 'samples': n, 'share': share(n)} for f, n in self.cumulative.most_common(top)]}
+
+class _Session:
+    def __init__(self, name, mode):
+        self.name = name; self.mode = mode; self.stages = {}; self._stack = []
+
+    @contextmanager
+    def stage(self, name):
+        current, peak = tracemalloc.get_traced_memory()
+        if self._stack: self._stack[-1]['peak'] = max(self._stack[-1]['peak'], peak) # Keep the enclosing stage's peak so far
+        tracemalloc.reset_peak()
+        frame = {'peak': current, 'memory': current, 'wall': time.perf_counter(), 'cpu': time.process_time()}
+        self._stack.append(frame)
+        try: yield
+        finally:
+            wall = time.perf_counter() - frame['wall']; cpu = time.process_time() - frame['cpu']
+            self._stack.pop(); current, peak = tracemalloc.get_traced_memory(); peak = max(peak, frame['peak'])
+            stats = self.stages.setdefault(name, {'name': name, 'calls': 0, 'wall_s': 0.0, 'cpu_s': 0.0, 'peak_mem_bytes': 0, 'mem_delta_bytes': 0})
+            stats['calls'] += 1; stats['wall_s'] += wall; stats['cpu_s'] += cpu
+            stats['peak_mem_bytes'] = max(stats['peak_mem_bytes'], peak); stats['mem_delta_bytes'] += current - frame['memory']
+            if self._stack: self._stack[-1]['peak'] = max(self._stack[-1]['peak'], peak)
+
+def stage(name):
+    """Times a named stage of the current profiled run; a no-op when profiling is off."""
+    session = _session
+    if session is None or threading.current_thread() is not threading.main_thread(): return nullcontext()
+    return session.stage(name)
+
+def staged(name):
+    """Decorator form of stage()."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name): return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def _cprofile_report(profiler, base_path, top=TOP_FUNCTIONS):
+    profiler.dump_stats(base_path + ".prof")
+    stats = pstats.Stats(profiler).stats
+    rows = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:top] # By cumulative time
+    return {'file': base_path + ".prof",
+            'top_cumulative': [{'function': f"{os.path.basename(path)}:{line}({func})", 'calls': nc, 'own_s': round(tt, 6), 'cumulative_s': round(ct, 6)}
+                               for (path, line, func), (cc, nc, tt, ct, callers) in rows]}
+
+@contextmanager
+def profile_run(name, argv=None):
+    """
+    Instruments the enclosed run of script `name` if profiling was requested (see requested_mode)
+    and writes the report to PROFILE_DIR when the block exits, also if it raised.
+    """
+    global _session
+    mode = requested_mode(argv)
+    if mode is None or _session is not None: yield; return
+    session = _Session(name, mode); started = datetime.now()
+    tracing = tracemalloc.is_tracing()
+    if not tracing: tracemalloc.start()
+    profiler = cProfile.Profile() if mode == 'cprofile' else None
+    sampler = _Sampler(threading.get_ident()) if mode == 'sample' else None
+    _session = session
+    if sampler: sampler.start()
+    if profiler: profiler.enable()
+    try:
+        with session.stage('total'): yield
+    finally:
+        if profiler: profiler.disable()
+        if sampler: sampler.stop()
+        _session = None
+        total = session.stages.pop('total')
+        report = {'script': name, 'mode': mode, 'started': started.isoformat(timespec='seconds'), 'argv': sys.argv,
+                  'total': {k: total[k] for k in ('wall_s', 'cpu_s', 'peak_mem_bytes')}, 'stages': list(session.stages.values())}
+        if resource: report['total']['max_rss_bytes'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+        if not tracing: tracemalloc.stop()
+        base_path = os.path.join(PROFILE_DIR, f"{name}-{started.strftime('%Y%m%d-%H%M%S')}")
+        try:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            if profiler: report['cprofile'] = _cprofile_report(profiler, base_path)
+            if sampler: report['sampling'] = sampler.report()
+            with open(base_path + ".json", 'w') as f: json.dump(report, f, indent=2)
+            print(f"Profile report written to '{base_path}.json'.")
+        except Exception as e: print(f"Error writing profile report: {e}")
@@ -1,187 +1,329 @@
-import pandas as pd
-import numpy as np
+import os
+import io
+import sys
 import json
-import re
-from collections import Counter
+import time
+import hashlib
+import pandas as pd
 
-# --- Configuration (should largely match eda.py for consistency) ---
-DATA_FILE = "March to May 25 Purchases.csv"
-RULES_OUTPUT_FILE = "procurement_rules.json"
+from purchase_data import (DATA_FILE, CACHE_DIR, CACHE_VERSION, load_purchases, prepare_purchases, iter_purchases,
+                           combine_meta, streaming_requested)
+from instrumentation import stage, profile_run
+from data_access import load_table
+from storage import MATERIALS_FILE
+import forecasting
+from forecasting import forecast_demand, demand_days, FORECAST_COLUMNS
+from safety_stock import simulate_safety_stock, SERVICE_LEVEL, SIMULATION_SCENARIOS, SIMULATION_SEED, LEAD_TIME_CV
+from order_quantity import price_candidates, economic_order_quantities, EOQ_COLUMNS
 
-# Columns - adjust if your CSV has different headers (should match eda.py)
-DATE_COLUMN = 'Date'
-ITEM_COLUMN_CANDIDATES = ['Description', 'Item Name', 'RawMaterial']
-SUPPLIER_COLUMN_CANDIDATES = ['Supplier', 'Supplier Name', 'Vendor']
-QUANTITY_COLUMN_CANDIDATES = ['Quantity', 'Qty', 'Amount']
-CATEGORY_COLUMN_CANDIDATES = ['Material Type', 'Category', 'Type']
-
-# Overhead filtering (should match eda.py)
-OVERHEAD_CATEGORIES = [
-    'Shipping', 'Salaries', 'Rent', 'General', 'Admin', 'Software',
-    'Utilities', 'Bank Charges', 'Consultancy', 'Travel', 'Marketing',
-    'Taxes', 'Insurance', 'Maintenance', 'Staff Costs', 'Office Supplies',
-    'Logistics', 'IT Support', 'Legal Fees', 'Accounting Fees', 'Subscriptions', 'Training'
-]
-OVERHEAD_ITEM_KEYWORDS = [
-    'shipment', 'delivery', 'courier', 'consulting', 'fee', 'tax', 'vat',
-    'service charge', 'bank charges', 'rent', 'salary', 'salaries', 'payroll',
-    'interest', 'insurance', 'travel expenses', 'subscription', 'software license',
-    'utilities', 'phone bill', 'internet bill', 'office cleaning', 'repairs'
-]
+# --- Configuration ---
+RULES_OUTPUT_FILE = "procurement_rules.json"
+# Column detection and overhead filtering are shared with eda.py via purchase_data.py
 
 # Parameters for procurement logic
 DEFAULT_LEAD_TIME_DAYS = 7 # Days
 SAFETY_STOCK_DAYS = 14 # Days of average usage
 ANALYSIS_PERIOD_DAYS = 90 # Assumed period for daily usage calculation
+# Daily usage behind SafetyStock/ReorderPoint: 'average' (total quantity / ANALYSIS_PERIOD_DAYS) or,
+# opt-in, 'forecast' (forecasting.py, fitted to each material's daily demand; on sparse demand SES
+# decays towards 0). Both are written to the rules either way.
+USAGE_BASIS = os.environ.get('PROCUREMENT_USAGE_BASIS', 'average')
+# SafetyStock/ReorderPoint sizing: 'days' (SAFETY_STOCK_DAYS of daily usage) or 'simulation'
+# (safety_stock.py: Monte Carlo lead-time demand at safety_stock.SERVICE_LEVEL; CPU-heavy, uses a process pool)
+SAFETY_STOCK_METHOD = os.environ.get('PROCUREMENT_SAFETY_STOCK_METHOD', 'days')
+
+# Incremental regeneration: per-material sufficient statistics (quantity sum, order count, first/last
+# order date, order count per supplier, quantity per day) are kept in CACHE_DIR (Arrow files, needs pyarrow) with a
+# watermark on the ledger in RULES_STATE_FILE (rows and bytes processed, and a hash of those bytes). When the ledger has only grown since, just
+# the appended rows are parsed and only the materials they touch get new rules. Anything else (ledger
+# edited, cleaning changed, state missing) or --full rebuilds the statistics from the whole ledger.
+RULES_STATE_FILE = os.path.join(CACHE_DIR, "procurement_rules.state.json")
+RULES_STATE_VERSION = 2
+STAT_COLUMNS = ['QuantitySum', 'OrderCount', 'FirstDate', 'LastDate']
+SUPPLIER_STAT_COLUMNS = ['RawMaterial', 'Supplier', 'Orders', 'FirstRow']
+DAILY_STAT_COLUMNS = ['RawMaterial', 'Day', 'Quantity']
+
+def rule_parameters():
+    return {'lead_time_days': DEFAULT_LEAD_TIME_DAYS, 'safety_stock_days': SAFETY_STOCK_DAYS, 'analysis_period_days': ANALYSIS_PERIOD_DAYS,
+            'usage_basis': USAGE_BASIS, 'ses_alpha': forecasting.SES_ALPHA, 'holt_alpha': forecasting.HOLT_ALPHA,
+            'holt_beta': forecasting.HOLT_BETA, 'forecast_history_days': forecasting.FORECAST_HISTORY_DAYS,
+            'safety_stock_method': SAFETY_STOCK_METHOD, 'service_level': SERVICE_LEVEL,
+            'simulation_scenarios': SIMULATION_SCENARIOS, 'simulation_seed': SIMULATION_SEED, 'lead_time_cv': LEAD_TIME_CV}
+
+# --- Sufficient Statistics ---
+def material_stats(df, item_col, supplier_col, qty_col, date_col):
+    """
+    Per-material statistics of prepared ledger rows (rows missing the item, quantity or date are skipped).
+
+    Returns:
+        tuple: (stats DataFrame indexed by material with STAT_COLUMNS,
+                supplier DataFrame with SUPPLIER_STAT_COLUMNS: orders per material/supplier and the first SourceRow,
+                daily DataFrame with DAILY_STAT_COLUMNS: quantity per material and day)
+    """
+    df = df.dropna(subset=[item_col, qty_col, date_col])
+    grouped = df.groupby(item_col, sort=False)
+    stats = pd.DataFrame({'QuantitySum': grouped[qty_col].sum(), 'OrderCount': grouped.size(),
+                          'FirstDate': grouped[date_col].min(), 'LastDate': grouped[date_col].max()})
+    stats.index.name = 'RawMaterial'
+    suppliers = pd.DataFrame(columns=SUPPLIER_STAT_COLUMNS)
+    if supplier_col and supplier_col in df:
+        with_supplier = df.dropna(subset=[supplier_col])
+        suppliers = with_supplier.groupby([item_col, supplier_col], sort=False)['SourceRow'].agg(['size', 'min']).reset_index()
+        suppliers.columns = SUPPLIER_STAT_COLUMNS
+    daily = df.groupby([df[item_col], df[date_col].dt.normalize()], sort=False)[qty_col].sum().reset_index()
+    daily.columns = DAILY_STAT_COLUMNS
+    return stats, suppliers, daily
+
+def combine_stats(parts):
+    """Merges (stats, suppliers, daily) triples from disjoint sets of ledger rows."""
+    stats = pd.concat([part[0] for part in parts])
+    grouped = stats.groupby(level=0, sort=False)
+    stats = pd.DataFrame({'QuantitySum': grouped['QuantitySum'].sum(), 'OrderCount': grouped['OrderCount'].sum(),
+                          'FirstDate': grouped['FirstDate'].min(), 'LastDate': grouped['LastDate'].max()})
+    suppliers = pd.concat([part[1] for part in parts if not part[1].empty] or [parts[0][1]])
+    suppliers = suppliers.groupby(['RawMaterial', 'Supplier'], sort=False).agg(Orders=('Orders', 'sum'), FirstRow=('FirstRow', 'min')).reset_index()
+    daily = pd.concat([part[2] for part in parts if not part[2].empty] or [parts[0][2]])
+    daily = daily.groupby(['RawMaterial', 'Day'], sort=False)['Quantity'].sum().reset_index()
+    return stats, suppliers, daily
+
+def primary_suppliers(suppliers):
+    """Most frequent supplier per material; on a tie, the one that appears first in the ledger."""
+    ranked = suppliers.sort_values(['Orders', 'FirstRow'], ascending=[False, True], kind='stable')
+    return ranked.drop_duplicates('RawMaterial').set_index('RawMaterial')['Supplier']
+
+def rules_from_stats(stats, suppliers, forecast=None, simulation=None):
+    """
+    Procurement rules from the statistics, as a DataFrame indexed by material (RawMaterial). With a
+    `forecast` (forecasting.forecast_demand) its columns are added and, under USAGE_BASIS 'forecast',
+    its daily usage drives SafetyStock and ReorderPoint. A `simulation` (safety_stock.simulate_safety_stock)
+    sets SafetyStock and ReorderPoint instead, and adds the target ServiceLevel.
+    """
+    avg_daily_usage = stats['QuantitySum'] / ANALYSIS_PERIOD_DAYS
+    if forecast is not None: forecast = forecast.reindex(stats.index)
+    usage = forecast['ForecastDailyUsage'].fillna(0) if forecast is not None and USAGE_BASIS == 'forecast' else avg_daily_usage
+    safety_stock = usage * SAFETY_STOCK_DAYS; reorder_point = usage * DEFAULT_LEAD_TIME_DAYS + safety_stock
+    if simulation is not None:
+        simulation = simulation.reindex(stats.index).fillna(0)
+        safety_stock, reorder_point = simulation['SafetyStock'], simulation['ReorderPoint']
+    rules = pd.DataFrame({'AverageDailyUsage': avg_daily_usage.round(2).to_numpy(),
+                          'LeadTimeDays': DEFAULT_LEAD_TIME_DAYS,
+                          'SafetyStock': safety_stock.round(2).to_numpy(),
+                          'ReorderPoint': reorder_point.round(2).to_numpy(),
+                          'StandardOrderQuantity': (stats['QuantitySum'] / stats['OrderCount']).round(2).to_numpy(),
+                          'PrimarySupplier': stats.index.map(primary_suppliers(suppliers)).fillna("N/A").to_numpy()},
+                         index=pd.Index(stats.index, name='RawMaterial'))
+    if forecast is not None:
+        for col in FORECAST_COLUMNS: rules[col] = forecast[col].to_numpy()
+        rules = rules.round({'ForecastDailyUsage': 2, 'ForecastTrend': 4, 'ForecastMAE': 2, 'ForecastRMSE': 2})
+    if simulation is not None: rules['ServiceLevel'] = SERVICE_LEVEL
+    return rules
+
+def merge_rules(existing, updated):
+    """`existing` rules (DataFrame as read from RULES_OUTPUT_FILE, or None) with `updated`'s materials replaced or added; other fields kept."""
+    if existing is None or existing.empty or 'RawMaterial' not in existing: return updated.sort_index(kind='stable')
+    existing = existing.drop_duplicates('RawMaterial', keep='last').set_index('RawMaterial')
+    merged = updated.combine_first(existing)
+    merged = merged[list(updated.columns) + [col for col in existing.columns if col not in updated.columns]]
+    restore = {col: dtype for col, dtype in updated.dtypes.items() if merged[col].notna().all()} # e.g. LeadTimeDays back to int
+    return merged.astype(restore).sort_index(kind='stable')
+
+# --- Watermark & State ---
+def _scan_source(data_file, size, checkpoint=None):
+    """sha256 of the first `size` bytes and, if given, of the first `checkpoint` bytes, in one read."""
+    sha = hashlib.sha256(); prefix = None
+    with open(data_file, 'rb') as f:
+        for end in ([checkpoint] if checkpoint is not None else []) + [size]:
+            while f.tell() < end:
+                block = f.read(min(1 << 20, end - f.tell()))
+                if not block: break
+                sha.update(block)
+            if end == checkpoint: prefix = sha.hexdigest()
+    return sha.hexdigest(), prefix
+
+def _ends_with_newline(data_file, size):
+    if size == 0: return True
+    with open(data_file, 'rb') as f:
+        f.seek(size - 1); return f.read(1) == b'\n'
+
+def _state_paths(generation):
+    base = os.path.join(CACHE_DIR, f"procurement_rules.{generation}")
+    return base + ".stats.arrow", base + ".suppliers.arrow", base + ".daily.arrow"
+
+def load_state():
+    """The saved statistics and watermark, or None if missing, outdated or unreadable."""
+    try:
+        with open(RULES_STATE_FILE) as f: state = json.load(f)
+        if state.get('version') != RULES_STATE_VERSION or state.get('cache_version') != CACHE_VERSION: return None
+        import pyarrow.feather as feather
+        stats_path, suppliers_path, daily_path = _state_paths(state['generation'])
+        state['stats'] = feather.read_table(stats_path).to_pandas().set_index('RawMaterial')
+        state['suppliers'] = feather.read_table(suppliers_path).to_pandas()
+        state['daily'] = feather.read_table(daily_path).to_pandas()
+        return state
+    except Exception: return None # Missing state, partial files or no pyarrow: rebuild
 
-# --- Helper Functions (from eda.py or similar) ---
-def parse_quantity(description):
-    if pd.isna(description): return np.nan
-    description_str = str(description).lower()
-    match = re.search(r'(\d[\d,]*\.?\d*)\s*(sheet|sheets|pack|packs|unit|units|roll|rolls|m|box|each|x)?', description_str)
-    if match:
-        try: return float(match.group(1).replace(',', ''))
-        except ValueError: return np.nan
-    match_simple_num = re.match(r'(\d[\d,]*\.?\d*)', description_str)
-    if match_simple_num:
-        try: return float(match_simple_num.group(1).replace(',', ''))
-        except ValueError: return np.nan
-    return np.nan
-
-def find_column(df, candidates):
-    for col in candidates:
-        if col in df.columns:
-            print(f"Found column: '{col}' for {', '.join(candidates)}")
-            return col
-    print(f"Warning: None of the candidate columns ({', '.join(candidates)}) found.")
-    return None
+def load_state_generation():
+    try:
+        with open(RULES_STATE_FILE) as f: return json.load(f).get('generation')
+    except (OSError, json.JSONDecodeError): return None
+
+def save_state(source, columns, stats, suppliers, daily):
+    """
+    Writes the statistics as Arrow files (like the purchase cache) named by a new generation, then
+    the JSON watermark pointing at them, so a reader never pairs a watermark with other statistics.
+    Raises ImportError without pyarrow (every run is then a full rebuild).
+    """
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    previous = load_state_generation()
+    generation = f"{os.getpid()}-{int(time.time() * 1000)}"
+    stats_path, suppliers_path, daily_path = _state_paths(generation)
+    feather.write_feather(pa.Table.from_pandas(stats.reset_index(), preserve_index=False), stats_path)
+    feather.write_feather(pa.Table.from_pandas(suppliers.astype({'Orders': 'int64', 'FirstRow': 'int64'}), preserve_index=False), suppliers_path)
+    feather.write_feather(pa.Table.from_pandas(daily, preserve_index=False), daily_path)
+    state = {'version': RULES_STATE_VERSION, 'cache_version': CACHE_VERSION, 'generation': generation,
+             'parameters': rule_parameters(), 'source': source, 'columns': columns}
+    tmp_path = RULES_STATE_FILE + ".tmp"
+    with open(tmp_path, 'w') as f: json.dump(state, f, indent=2)
+    os.replace(tmp_path, RULES_STATE_FILE)
+    if previous and previous != generation:
+        for path in _state_paths(previous):
+            try: os.remove(path)
+            except OSError: pass
+
+def read_appended_rows(data_file, state):
+    """
+    The ledger rows appended since the state's watermark, or None if the ledger was changed in any
+    other way (then the statistics must be rebuilt).
+
+    Returns:
+        tuple: (raw DataFrame of the new rows, new source watermark), or None.
+    """
+    source = state['source']; size = os.path.getsize(data_file)
+    if source.get('file') != os.path.abspath(data_file) or size < source['size']: return None
+    if size > source['size'] and not _ends_with_newline(data_file, source['size']): return None # Last row was unterminated
+    sha, prefix = _scan_source(data_file, size, checkpoint=source['size'])
+    if prefix != source['sha256']: return None
+    header = pd.read_csv(data_file, nrows=0).columns
+    with open(data_file, 'rb') as f:
+        f.seek(source['size']); tail = f.read(size - source['size'])
+    text_columns = {state['columns'][k]: str for k in ('item', 'supplier') if state['columns'][k] in header} # As in the full file, even if all-numeric here
+    raw = pd.read_csv(io.BytesIO(tail), header=None, names=list(header), dtype=text_columns) if tail.strip() else pd.DataFrame(columns=header)
+    return raw, {'file': source['file'], 'size': size, 'sha256': sha, 'rows': source['rows'] + len(raw)}
 
 # --- Main Logic ---
-def main():
-    print(f"Starting script to generate '{RULES_OUTPUT_FILE}'...")
+def full_rebuild(data_file, stream=False):
+    """
+    Statistics from the whole ledger; with `stream`, chunk by chunk (iter_purchases) so memory is
+    bounded by the chunk size and the statistics. Returns (stats, suppliers, daily, columns,
+    source watermark or None), or None if the essential columns are missing.
+    """
+    size = os.path.getsize(data_file)
+    wanted = ['date', 'item', 'supplier', 'quantity', 'SourceRow']
+    chunks = iter_purchases(columns=wanted, data_file=data_file) if stream else [load_purchases(columns=wanted, data_file=data_file)]
+    stats = None; metas = []
+    for df, meta in chunks:
+        columns = meta['columns']
+        if not columns['item'] or not columns['date'] or columns['date'] not in df.columns:
+            print("Error: Essential columns (item description or date) not found. Cannot proceed.")
+            return None
+        with stage('groupby'):
+            part = material_stats(df, columns['item'], columns['supplier'], columns['quantity'], columns['date'])
+            stats = part if stats is None else combine_stats([stats, part]) # Partial aggregates, merged as we go
+        metas.append(meta)
+    if not metas: return pd.DataFrame(columns=STAT_COLUMNS), pd.DataFrame(columns=SUPPLIER_STAT_COLUMNS), pd.DataFrame(columns=DAILY_STAT_COLUMNS), {}, None # Empty ledger
+    meta = combine_meta(metas); columns = meta['columns']
+    if stream: print(f"Streamed {meta['source_rows']} ledger rows in {len(metas)} chunk(s).")
+    print(f"Using '{columns['quantity']}' for quantity calculations.")
+    print(f"Rows remaining after overhead filtering: {meta['rows_after_keyword_filter']}")
+    source = None
+    if os.path.getsize(data_file) == size and _ends_with_newline(data_file, size): # Not written to while loading
+        source = {'file': os.path.abspath(data_file), 'size': size, 'sha256': _scan_source(data_file, size)[0], 'rows': meta['source_rows']}
+    return *stats, columns, source
 
-    # Load data
+def load_rules():
     try:
-        df = pd.read_csv(DATA_FILE)
-        print(f"Successfully loaded '{DATA_FILE}'.")
-    except FileNotFoundError:
-        print(f"Error: The file '{DATA_FILE}' was not found.")
-        return
-    except Exception as e:
-        print(f"Error loading '{DATA_FILE}': {e}")
-        return
+        with open(RULES_OUTPUT_FILE) as f: rules = json.load(f)
+        return pd.DataFrame(rules) if isinstance(rules, list) else None
+    except (OSError, json.JSONDecodeError, ValueError): return None
 
-    # --- Initial Cleaning and Column Identification ---
-    item_col = find_column(df, ITEM_COLUMN_CANDIDATES)
-    supplier_col = find_column(df, SUPPLIER_COLUMN_CANDIDATES)
-    qty_col_actual = find_column(df, QUANTITY_COLUMN_CANDIDATES)
-    category_col = find_column(df, CATEGORY_COLUMN_CANDIDATES)
-    date_col = DATE_COLUMN # Assuming 'Date' is the date column as per eda.py
+def main(full=False, verbose=False, data_file=DATA_FILE, stream=None):
+    print(f"Starting script to generate '{RULES_OUTPUT_FILE}'...")
+    if not os.path.exists(data_file):
+        print(f"Error: The file '{data_file}' was not found.")
+        return
 
-    if not item_col or not date_col or date_col not in df.columns:
-        print("Error: Essential columns (item description or date) not found. Cannot proceed.")
+    state = None if full else load_state()
+    existing_rules = load_rules() if state is not None else None
+    appended = read_appended_rows(data_file, state) if state is not None and existing_rules is not None else None
+    try:
+        if appended is not None:
+            raw, source = appended
+            print(f"Incremental update: {len(raw)} new ledger row(s) since the last run.")
+            with stage('filter'): df, meta = prepare_purchases(raw, verbose=False)
+            df['SourceRow'] += state['source']['rows']
+            columns = state['columns']
+            if len(raw) and {k: meta['columns'][k] for k in ('date', 'item', 'supplier', 'quantity')} != {k: columns[k] for k in ('date', 'item', 'supplier', 'quantity')}:
+                print("Note: New rows resolve to different columns than the stored statistics. Rebuilding.")
+                appended = None
+        if appended is not None:
+            with stage('groupby'):
+                new_stats = material_stats(df, columns['item'], columns['supplier'], columns['quantity'], columns['date'])
+                stats, suppliers, daily = combine_stats([(state['stats'], state['suppliers'], state['daily']), new_stats])
+            # Forecasts of every material move when the window does (a later last order day)
+            same_window = state['daily'].empty or daily.empty or demand_days(state['daily']).equals(demand_days(daily))
+            affected = set(new_stats[0].index) if state.get('parameters') == rule_parameters() and same_window else set(stats.index)
+        else:
+            if not full and state is not None: print("Ledger changed other than by appending rows (or rules missing). Rebuilding from the full ledger.")
+            rebuilt = full_rebuild(data_file, streaming_requested(data_file) if stream is None else stream)
+            if rebuilt is None: return
+            stats, suppliers, daily, columns, source = rebuilt; affected = set(stats.index); existing_rules = None
+    except Exception as e:
+        print(f"Error loading '{data_file}': {e}")
         return
 
-    # Convert date column
-    df[date_col] = pd.to_datetime(df[date_col], errors='coerce', dayfirst=True)
-    df = df.dropna(subset=[date_col]) # Remove rows where date conversion failed
-
-    # Prepare quantity column (parse if necessary, like in eda.py)
-    df['parsed_quantity'] = df[item_col].apply(parse_quantity)
-    qty_to_use = 'parsed_quantity'
-    if qty_col_actual:
-        df[qty_col_actual] = pd.to_numeric(df[qty_col_actual], errors='coerce')
-        df[qty_col_actual] = df[qty_col_actual].fillna(df['parsed_quantity'])
-        qty_to_use = qty_col_actual
-    else:
-        print("Using 'parsed_quantity' as no dedicated quantity column was found/suitable.")
-    
-    df[qty_to_use] = pd.to_numeric(df[qty_to_use], errors='coerce')
-    print(f"Using '{qty_to_use}' for quantity calculations.")
-
-
-    # --- Filtering Overheads (mirroring eda.py) ---
-    print("\n--- Filtering Overheads ---")
-    df_procurement = df.copy()
-    if category_col:
-        df_procurement = df_procurement[~df_procurement[category_col].astype(str).str.lower().isin([cat.lower() for cat in OVERHEAD_CATEGORIES])]
-    if item_col:
-        keyword_pattern = '|'.join([re.escape(keyword.lower()) for keyword in OVERHEAD_ITEM_KEYWORDS])
-        df_procurement = df_procurement[~df_procurement[item_col].astype(str).str.lower().str.contains(keyword_pattern, na=False)]
-    
-    print(f"Rows remaining after overhead filtering: {len(df_procurement)}")
-    if df_procurement.empty:
+    if stats.empty:
         print("No procurement data left after filtering. Cannot generate rules.")
         return
 
-    # --- Calculate Procurement Parameters ---
-    procurement_rules = []
-    
-    # Get unique materials from the filtered data
-    # Ensure item_col and qty_to_use are valid before groupby
-    if item_col not in df_procurement.columns or qty_to_use not in df_procurement.columns:
-        print(f"Error: Item column ('{item_col}') or Quantity column ('{qty_to_use}') not found in filtered DataFrame.")
-        return
+    # --- Calculate Procurement Parameters (affected materials only) ---
+    affected_daily = daily[daily['RawMaterial'].isin(affected)]; window = demand_days(daily) if not daily.empty else None
+    with stage('forecast'): forecast = forecast_demand(affected_daily, days=window)
+    simulation = None
+    if SAFETY_STOCK_METHOD == 'simulation':
+        with stage('simulate'): simulation = simulate_safety_stock(affected_daily, DEFAULT_LEAD_TIME_DAYS, days=window)
+    with stage('groupby'):
+        updated = rules_from_stats(stats.loc[stats.index.isin(affected)], suppliers[suppliers['RawMaterial'].isin(affected)], forecast, simulation)
+        procurement_rules = merge_rules(existing_rules, updated)
+    print(f"Rules updated for {len(updated)} of {len(procurement_rules)} materials.")
 
-    # Drop rows where essential item name or quantity is NaN for calculations
-    df_calc = df_procurement.dropna(subset=[item_col, qty_to_use])
-
-
-    for material_name, group in df_calc.groupby(item_col):
-        print(f"\nProcessing: {material_name}")
-
-        total_quantity_ordered = group[qty_to_use].sum()
-        avg_daily_usage = total_quantity_ordered / ANALYSIS_PERIOD_DAYS
-        
-        # If avg_daily_usage is 0 or NaN, some subsequent calculations might be problematic
-        if pd.isna(avg_daily_usage) or avg_daily_usage == 0:
-            print(f"Warning: Average daily usage for {material_name} is {avg_daily_usage}. Some rules may be zero or defaults.")
-            # Set to a very small number to avoid division by zero if necessary, or handle as per policy
-            # For now, we'll let it be, but this can lead to ROP = Safety Stock if lead time calc becomes 0
-            avg_daily_usage = 0 if pd.isna(avg_daily_usage) else avg_daily_usage
-
-
-        lead_time = DEFAULT_LEAD_TIME_DAYS # Placeholder
-        safety_stock = avg_daily_usage * SAFETY_STOCK_DAYS
-        
-        reorder_point = (avg_daily_usage * lead_time) + safety_stock
-        
-        # Calculate average order quantity for this specific material
-        avg_order_quantity = group[qty_to_use].mean()
-        if pd.isna(avg_order_quantity): # Handle cases with no valid quantity data for mean
-            avg_order_quantity = avg_daily_usage * (lead_time + (SAFETY_STOCK_DAYS / 2)) # Fallback, e.g. cover leadtime + half safety
-            avg_order_quantity = max(1, round(avg_order_quantity)) # Ensure it's at least 1
-            print(f"Warning: Could not calculate avg_order_quantity for {material_name}, using fallback: {avg_order_quantity}")
-
-
-        # Determine primary supplier
-        primary_supplier = "N/A"
-        if supplier_col and supplier_col in group.columns:
-            supplier_counts = group[supplier_col].value_counts()
-            if not supplier_counts.empty:
-                primary_supplier = supplier_counts.index[0]
-        
-        procurement_rules.append({
-            'RawMaterial': material_name,
-            'AverageDailyUsage': round(avg_daily_usage, 2),
-            'LeadTimeDays': lead_time,
-            'SafetyStock': round(safety_stock, 2),
-            'ReorderPoint': round(reorder_point, 2),
-            'StandardOrderQuantity': round(avg_order_quantity, 2),
-            'PrimarySupplier': primary_supplier
-        })
-        print(f"  Avg Daily Usage: {avg_daily_usage:.2f}, ROP: {reorder_point:.2f}, Order Qty: {avg_order_quantity:.2f}, Supplier: {primary_supplier}")
-
-    # --- Save Rules to JSON ---
-    if procurement_rules:
+    # --- Economic Order Quantities (all materials: prices and tiers change independently of the ledger) ---
+    with stage('optimize'):
+        usage = procurement_rules['ForecastDailyUsage'] if USAGE_BASIS == 'forecast' and 'ForecastDailyUsage' in procurement_rules else procurement_rules['AverageDailyUsage']
+        candidates = price_candidates(load_table('materials', on_error=None), load_table('price_tiers', on_error=None))
+        procurement_rules = procurement_rules.drop(columns=EOQ_COLUMNS, errors='ignore').join(economic_order_quantities(usage, candidates))
+    print(f"Economic order quantities for {int(procurement_rules['EconomicOrderQuantity'].notna().sum())} materials (priced in {MATERIALS_FILE}).")
+    if verbose:
+        for name, rule in updated.iterrows():
+            print(f"  {name}: Avg Daily Usage: {rule['AverageDailyUsage']:.2f}, Forecast: {rule['ForecastDailyUsage']:.2f} ({rule['ForecastModel']}), ROP: {rule['ReorderPoint']:.2f}, "
+                  f"Order Qty: {rule['StandardOrderQuantity']:.2f}, Supplier: {rule['PrimarySupplier']}")
+
+    # --- Save Rules to JSON (pandas' encoder: json.dump with indent is pure Python and slow for large ledgers) ---
+    try:
+        with stage('write'):
+            procurement_rules.reset_index().to_json(RULES_OUTPUT_FILE, orient='records', indent=4)
+        print(f"\nSuccessfully saved procurement rules to '{RULES_OUTPUT_FILE}'. Contains {len(procurement_rules)} items.")
+    except Exception as e:
+        print(f"Error saving rules to JSON: {e}")
+        return
+    if source is not None:
         try:
-            with open(RULES_OUTPUT_FILE, 'w') as f:
-                json.dump(procurement_rules, f, indent=4)
-            print(f"\nSuccessfully saved procurement rules to '{RULES_OUTPUT_FILE}'. Contains {len(procurement_rules)} items.")
+            with stage('write'): save_state(source, columns, stats, suppliers, daily)
+        except ImportError:
+            print("Note: pyarrow not installed; incremental rule updates disabled (pip install pyarrow).")
         except Exception as e:
-            print(f"Error saving rules to JSON: {e}")
-    else:
-        print("\nNo procurement rules were generated (likely no materials found after filtering).")
+            print(f"Warning: Could not save rule statistics ({e}). The next run will rebuild them.")
 
 if __name__ == "__main__":
-    main()
+    with profile_run('logic'): main(full='--full' in sys.argv[1:], verbose='--verbose' in sys.argv[1:])
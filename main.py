@@ -1,136 +1,151 @@
-import pandas as pd
+import sys
 from datetime import datetime
-import os
-from action import generate_po_email_content, send_po_email # Ensure action.py is ready
+from action import generate_po_email_content # Ensure action.py is ready
+from email_outbox import enqueue_po_email, deliver_pending, SENT, QUEUED, FAILED, HISTORY_METHODS
 
-MATERIALS_MASTER_FILE = "materials_master.csv"
-SUPPLIERS_FILE = "suppliers.csv"
-ORDER_HISTORY_FILE = "order_history.csv"
+from storage import MATERIALS_FILE as MATERIALS_MASTER_FILE, ORDER_HISTORY_FILE
+from stock_ledger import apply_ledger_stock
+from reorder import plan_reorders, iter_supplier_orders
+from order_quantity import apply_rule_order_quantities, ORDER_QUANTITY_SOURCE
+from data_access import load_table, append_rows
+from instrumentation import stage, profile_run
+from run_journal import (generate_run_id, idempotency_key, record, journal_state, prior_order,
+                         interrupted_orders, planned_lines, PLANNED, COMPLETED)
 
-MATERIALS_HEADERS = ['MaterialID', 'MaterialName', 'Category', 'UnitOfMeasure', 'CurrentStock', 
-                     'ReorderPoint', 'StandardOrderQuantity', 'PreferredSupplierID', 
-                     'ProductPageURL', 'LeadTimeDays', 'SafetyStockQuantity', 'Notes', 'CurrentPrice']
-SUPPLIERS_HEADERS = ['SupplierID', 'SupplierName', 'ContactPerson', 'Email', 'Phone', 'Website', 'OrderMethod']
-ORDER_HISTORY_HEADERS = ['OrderID', 'Timestamp', 'MaterialID', 'MaterialName', 'QuantityOrdered', 
-                         'UnitPricePaid', 'TotalPricePaid', 'SupplierID', 'SupplierName', 
-                         'OrderMethod', 'Status', 'Notes']
+def generate_order_id():
+    return f"PO-{datetime.now().strftime('%Y%m%d-%H%M%S%f')[:-3]}"
 
-def load_csv_to_dataframe(file_path, expected_headers, create_if_missing=False):
-    if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
-        try:
-            df = pd.read_csv(file_path, dtype=str).fillna('')
-            for header in expected_headers:
-                if header not in df.columns: df[header] = ''
-            return df[expected_headers] 
-        except Exception as e:
-            print(f"Error loading {file_path}: {e}. Returning empty DF.")
-            return pd.DataFrame(columns=expected_headers)
-    elif create_if_missing:
-        df = pd.DataFrame(columns=expected_headers); df.to_csv(file_path, index=False)
-        return df
-    return pd.DataFrame(columns=expected_headers)
+def place_supplier_order(sup_info, items, order_id):
+    """Emails (queues) or prompts one supplier PO. Returns (OrderMethod to log, queued MessageID or None)."""
+    sup_id = sup_info['SupplierID']; sup_name = sup_info['SupplierName']; method = sup_info['OrderMethod'].lower().strip()
+    email = sup_info['Email'].strip(); web = sup_info['Website'].strip()
+    email_items = [{'name': i['MaterialName'], 'quantity': i['QuantityOrdered']} for i in items]
+    message_id = None
 
-def append_to_csv(df_to_append, file_path, expected_headers):
-    # Ensure the DataFrame to append has all expected columns in the correct order
-    df_ready_to_append = pd.DataFrame(columns=expected_headers)
-    for col in expected_headers:
-        if col in df_to_append.columns:
-            df_ready_to_append[col] = df_to_append[col]
+    if method == "email":
+        if not email: logged_method = "failed_email_no_address"; print(f"  Error: No email for {sup_name}.")
         else:
-            df_ready_to_append[col] = None # Or appropriate default like ""
-    
-    if not os.path.exists(file_path) or os.path.getsize(file_path) == 0:
-        df_ready_to_append.to_csv(file_path, index=False, header=True)
+            print(f"  Preparing email for {len(email_items)} item(s) to {email}...")
+            subj, body = generate_po_email_content(sup_name, email_items)
+            if subj and body:
+                message_id = enqueue_po_email(order_id, sup_id, email, subj, body)
+                logged_method = "email_queued"; print(f"  Email to {sup_name} queued for delivery.")
+            else: logged_method = "email_failed_content"; print(f"  Error generating email content for {sup_name}.")
+    elif method == "online":
+        logged_method = "online_prompted"; print("  Action: Place ONLINE order with:")
+        for i in items: print(f"    - {i['MaterialName']} (Qty: {i['QuantityOrdered']}) URL: {i['ProductPageURL'] if i['ProductPageURL'] else web}")
+    elif method == "phone":
+        logged_method = "phone_prompted"; print(f"  Action: Place PHONE order with {sup_name} (Phone: {sup_info.get('Phone', 'N/A')}):")
+        for i in items: print(f"    - {i['MaterialName']}: {i['QuantityOrdered']}")
     else:
-        df_ready_to_append.to_csv(file_path, index=False, header=False, mode='a')
+        logged_method = f"manual_review_method_{method if method else 'unknown'}"
+        print(f"  Warning: Unknown OrderMethod ('{method}') for {sup_name}. Items:")
+        for i in items: print(f"    - {i['MaterialName']}: {i['QuantityOrdered']}")
+    return logged_method, message_id
 
-def generate_order_id():
-    return f"PO-{datetime.now().strftime('%Y%m%d-%H%M%S%f')[:-3]}"
+def log_order_lines(order_id, sup_info, items, logged_method):
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    history_entries = [{
+        'OrderID': order_id, 'Timestamp': timestamp, 'MaterialID': i['MaterialID'],
+        'MaterialName': i['MaterialName'], 'QuantityOrdered': i['QuantityOrdered'],
+        'UnitPricePaid': i['UnitPricePaid'], 'TotalPricePaid': i['TotalPricePaid'],
+        'SupplierID': sup_info['SupplierID'], 'SupplierName': sup_info['SupplierName'], 'OrderMethod': logged_method,
+        'Status': 'Ordered', 'Notes': '' } for i in items]
+    if history_entries:
+        append_rows('order_history', history_entries)
+        print(f"  Logged {len(history_entries)} item(s) to {ORDER_HISTORY_FILE} with OrderID {order_id}")
 
-def main():
-    print("--- Starting Procurement Order Generation ---")
-    materials_df = load_csv_to_dataframe(MATERIALS_MASTER_FILE, MATERIALS_HEADERS)
-    suppliers_df = load_csv_to_dataframe(SUPPLIERS_FILE, SUPPLIERS_HEADERS)
-    # Create order_history.csv with headers if it doesn't exist or is empty
-    load_csv_to_dataframe(ORDER_HISTORY_FILE, ORDER_HISTORY_HEADERS, create_if_missing=True)
+def supplier_record(suppliers_df, sup_id):
+    match = suppliers_df[suppliers_df['SupplierID'].astype(str) == str(sup_id)]
+    if match.empty: return {'SupplierID': sup_id, 'SupplierName': sup_id, 'OrderMethod': '', 'Email': '', 'Phone': '', 'Website': ''}
+    return {col: str(match.iloc[0].get(col, '')) for col in ['SupplierID', 'SupplierName', 'OrderMethod', 'Email', 'Phone', 'Website']}
 
+def resume_interrupted_orders(suppliers_df):
+    """
+    Finishes POs whose run stopped between its 'planned' and 'completed' journal entries, reusing
+    the journaled OrderID. Steps that already happened (queued email, logged lines) are not repeated.
+    Returns the MessageIDs still waiting for delivery.
+    """
+    interrupted = interrupted_orders()
+    if interrupted.empty: print("\n--- Resume: no interrupted orders ---"); return []
+    print(f"\n--- Resuming {len(interrupted)} Interrupted Order(s) ---")
+    history = load_table('order_history'); outbox = load_table('email_outbox', create_if_missing=True)
+    logged_ids = set(history['OrderID'].astype(str)); queued_ids = []
+    for entry in interrupted.to_dict('records'):
+        order_id = entry['OrderID']; sup_info = supplier_record(suppliers_df, entry['SupplierID'])
+        print(f"\n--- RESUMING ORDER {order_id} FOR SUPPLIER: {sup_info['SupplierName']} (run {entry['RunID']}) ---")
+        if order_id in logged_ids: # Only the completion entry is missing
+            logged_method = str(history.loc[history['OrderID'].astype(str) == order_id, 'OrderMethod'].iloc[0])
+            print(f"  Already logged to {ORDER_HISTORY_FILE}.")
+        else:
+            items = planned_lines(entry).to_dict('records')
+            messages = outbox[outbox['OrderID'] == order_id]
+            if messages.empty: logged_method, message_id = place_supplier_order(sup_info, items, order_id)
+            else: # Email was queued before the interruption: log its current state, do not queue it again
+                message = messages.iloc[-1]; message_id = message['MessageID'] if message['Status'] == QUEUED else None
+                logged_method = HISTORY_METHODS.get(message['Status'], 'email_queued'); print(f"  Email already queued ({message['Status']}).")
+            if message_id: queued_ids.append(message_id)
+            log_order_lines(order_id, sup_info, items, logged_method)
+        record(entry['RunID'], entry['IdempotencyKey'], order_id, entry['SupplierID'], COMPLETED, detail=f"{logged_method} (resumed)")
+    return queued_ids
 
-    if materials_df.empty: print(f"Error: {MATERIALS_MASTER_FILE} empty. Exiting."); return
-    
-    items_to_order_by_supplier = {} 
+def main(resume=False):
+    """
+    Places a PO with each supplier that has materials below their reorder point.
 
-    print("\n--- Checking Material Stock Levels ---")
-    for _, mat_row in materials_df.iterrows():
-        try:
-            mat_id = str(mat_row.get('MaterialID', '')).strip()
-            mat_name = str(mat_row.get('MaterialName', 'Unknown')).strip()
-            stock = float(mat_row.get('CurrentStock', 0)); rop = float(mat_row.get('ReorderPoint', float('inf')))
-            print(f"Checking: {mat_name} (ID: {mat_id}, Stock: {stock}, ROP: {rop})")
-            if stock < rop:
-                print(f"  Reorder needed for {mat_name}.")
-                sup_id = str(mat_row.get('PreferredSupplierID', '')).strip()
-                order_qty = float(mat_row.get('StandardOrderQuantity', 0))
-                price = float(mat_row.get('CurrentPrice', 0))
-                url = str(mat_row.get('ProductPageURL', '')).strip()
-                if not sup_id or order_qty <= 0: print(f"  Skipping: Missing SupplierID or invalid OrderQty for {mat_name}."); continue
-                items_to_order_by_supplier.setdefault(sup_id, []).append({
-                    'MaterialID': mat_id, 'MaterialName': mat_name, 'QuantityOrdered': order_qty,
-                    'UnitPricePaid': price, 'ProductPageURL': url })
-                print(f"  Added {mat_name} (Qty: {order_qty}) for supplier ID {sup_id}")
-        except ValueError as ve: print(f"  Skipping material {mat_row.get('MaterialID', 'Unknown')} due to data error: {ve}")
-        except Exception as e: print(f"  Error with material {mat_row.get('MaterialID', 'Unknown')}: {e}")
+    Quantities still on order (order_history lines with Status 'Ordered') count towards stock, so
+    the job can run on a frequent schedule without ordering a material again while its last order
+    is in transit. Every supplier PO is journaled (run_journal) before it is dispatched and after it
+    is logged; while a PO to a supplier is left half done by an interrupted run, no new PO goes to
+    that supplier until a run with resume=True (`python main.py --resume`) finishes it.
+    """
+    print("--- Starting Procurement Order Generation ---")
+    with stage('load'):
+        materials_df = apply_ledger_stock(load_table('materials')) # CurrentStock comes from the stock ledger
+        if ORDER_QUANTITY_SOURCE == 'eoq': materials_df = apply_rule_order_quantities(materials_df) # Order quantities from logic.py's rules
+        suppliers_df = load_table('suppliers')
+        # Create order_history.csv with headers if it doesn't exist or is empty
+        history_df = load_table('order_history', create_if_missing=True)
+    run_id = generate_run_id()
+    queued_ids = resume_interrupted_orders(suppliers_df) if resume else []
+    if resume: history_df = load_table('order_history') # Now with the resumed orders' lines
 
-    if not items_to_order_by_supplier: print("\n--- No items require reordering. ---"); return
+    if materials_df.empty: print(f"Error: {MATERIALS_MASTER_FILE} empty. Exiting."); return
     
-    print("\n--- Processing Orders ---")
-    for sup_id, items in items_to_order_by_supplier.items():
-        sup_info_rows = suppliers_df[suppliers_df['SupplierID'] == sup_id]
-        if sup_info_rows.empty: print(f"Warning: SupplierID '{sup_id}' not found. Cannot order: {[i['MaterialName'] for i in items]}."); continue
-        
-        sup_info = sup_info_rows.iloc[0]
-        sup_name = str(sup_info.get('SupplierName', sup_id)); method = str(sup_info.get('OrderMethod', '')).lower().strip()
-        email = str(sup_info.get('Email', '')).strip(); web = str(sup_info.get('Website', '')).strip()
-        
-        print(f"\n--- ORDER FOR SUPPLIER: {sup_name} (ID: {sup_id}) ---")
-        order_id = generate_order_id(); timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        history_entries = []
-        email_items = [{'name': i['MaterialName'], 'quantity': i['QuantityOrdered']} for i in items]
-        logged_method = ""
-
-        if method == "email":
-            if not email: logged_method = "failed_email_no_address"; print(f"  Error: No email for {sup_name}.")
-            else:
-                print(f"  Preparing email for {len(email_items)} item(s) to {email}...")
-                subj, body = generate_po_email_content(sup_name, email_items)
-                if subj and body:
-                    print(f"  Attempting to send email...")
-                    success = send_po_email(email, subj, body)
-                    logged_method = "email_sent" if success else "email_failed_send"
-                    print(f"  Email to {sup_name} {'succeeded' if success else 'failed'}.")
-                else: logged_method = "email_failed_content"; print(f"  Error generating email content for {sup_name}.")
-        elif method == "online":
-            logged_method = "online_prompted"; print("  Action: Place ONLINE order with:")
-            for i in items: print(f"    - {i['MaterialName']} (Qty: {i['QuantityOrdered']}) URL: {i['ProductPageURL'] if i['ProductPageURL'] else web}")
-        elif method == "phone":
-            logged_method = "phone_prompted"; print(f"  Action: Place PHONE order with {sup_name} (Phone: {sup_info.get('Phone', 'N/A')}):")
-            for i in items: print(f"    - {i['MaterialName']}: {i['QuantityOrdered']}")
-        else:
-            logged_method = f"manual_review_method_{method if method else 'unknown'}"
-            print(f"  Warning: Unknown OrderMethod ('{method}') for {sup_name}. Items:")
-            for i in items: print(f"    - {i['MaterialName']}: {i['QuantityOrdered']}")
+    print("\n--- Checking Material Stock Levels ---")
+    with stage('filter'): plan = plan_reorders(materials_df, suppliers_df, history_df)
+    reorder_count = len(plan['lines']) + len(plan['skipped']) + len(plan['unknown_suppliers'])
+    print(f"Checked {plan['checked']} material(s); {reorder_count} below reorder point.")
+    for mat_id in plan['invalid_stock']['MaterialID']: print(f"  Skipping material {mat_id or 'Unknown'} due to data error: missing or invalid CurrentStock.")
+    for mat_name in plan['skipped']['MaterialName']: print(f"  Skipping: Missing SupplierID or invalid OrderQty for {mat_name}.")
+    for sup_id, names in plan['unknown_suppliers'].groupby('SupplierID', sort=False)['MaterialName']:
+        print(f"Warning: SupplierID '{sup_id}' not found. Cannot order: {names.tolist()}.")
 
-        for i in items:
-            history_entries.append({
-                'OrderID': order_id, 'Timestamp': timestamp, 'MaterialID': i['MaterialID'], 
-                'MaterialName': i['MaterialName'], 'QuantityOrdered': i['QuantityOrdered'],
-                'UnitPricePaid': i['UnitPricePaid'], 'TotalPricePaid': i['QuantityOrdered'] * i['UnitPricePaid'],
-                'SupplierID': sup_id, 'SupplierName': sup_name, 'OrderMethod': logged_method,
-                'Status': 'Ordered', 'Notes': '' })
-        
-        if history_entries:
-            append_to_csv(pd.DataFrame(history_entries), ORDER_HISTORY_FILE, ORDER_HISTORY_HEADERS)
-            print(f"  Logged {len(history_entries)} item(s) to {ORDER_HISTORY_FILE} with OrderID {order_id}")
-        print(f"--- FINISHED SUPPLIER: {sup_name.upper()} ---")
+    if plan['lines'].empty: print("\n--- No items require reordering. ---")
+    else:
+        print(f"\n--- Processing Orders (run {run_id}) ---")
+        journal = journal_state()
+        for sup_info, lines in iter_supplier_orders(plan):
+            sup_id = sup_info['SupplierID']; sup_name = sup_info['SupplierName']; items = lines.to_dict('records')
+            print(f"\n--- ORDER FOR SUPPLIER: {sup_name} (ID: {sup_id}) ---")
+            key = idempotency_key(sup_id, lines); prior = prior_order(journal, sup_id)
+            if prior is not None:
+                print(f"  Skipping: order {prior['OrderID']} for this supplier was interrupted; run with --resume to finish it.")
+                continue
+            order_id = generate_order_id()
+            with stage('write'): record(run_id, key, order_id, sup_id, PLANNED, lines=lines) # Before anything leaves the building
+            with stage('dispatch'): logged_method, message_id = place_supplier_order(sup_info, items, order_id)
+            if message_id: queued_ids.append(message_id)
+            with stage('write'):
+                log_order_lines(order_id, sup_info, items, logged_method)
+                record(run_id, key, order_id, sup_id, COMPLETED, detail=logged_method)
+            print(f"--- FINISHED SUPPLIER: {sup_name.upper()} ---")
+    if queued_ids or resume: # One delivery pass now (on resume also for emails an interrupted run queued); the outbox worker retries the rest
+        print("\n--- Sending Queued Emails ---")
+        with stage('deliver'): results = deliver_pending(None if resume else queued_ids)
+        print(f"  {sum(s == SENT for s in results.values())} sent, {sum(s == FAILED for s in results.values())} failed, "
+              f"{len(set(queued_ids) - results.keys()) + sum(s == QUEUED for s in results.values())} still queued (run email_outbox.py to retry).")
     print("\n--- Procurement Order Generation Finished ---")
 
-if __name__ == "__main__": main()
+if __name__ == "__main__":
+    with profile_run('main'): main(resume='--resume' in sys.argv[1:])
@@ -0,0 +1,51 @@
+PENDING_STATUSES = ("ordered", "partially received") # Lower-cased Status values still awaiting goods
+
+class OpenOrdersIndex:
+    """
+    Order lines keyed by (OrderID, MaterialID) and partitioned by lower-cased Status.
+
+    Built once from the order history frame; receipts then move a single key between
+    partitions, so looking up or receiving a line is O(1) and the pending list is maintained
+    incrementally instead of being recomputed over the whole history.
+    """
+    def __init__(self, order_history_df=None):
+        self.rebuild(order_history_df)
+
+    def rebuild(self, order_history_df):
+        """Indexes every line of the frame (row labels are kept to locate the line later)."""
+        self._rows = {}; self._status = {}; self._partitions = {}
+        if order_history_df is None or order_history_df.empty: return
+        statuses = order_history_df['Status'].astype(str).str.strip().str.lower().tolist()
+        keys = zip(order_history_df['OrderID'].astype(str), order_history_df['MaterialID'].astype(str))
+        for key, label, status in zip(keys, order_history_df.index, statuses):
+            if key in self._status: self._partitions[self._status[key]].pop(key, None) # Later line wins
+            self._rows[key] = label; self._status[key] = status
+            self._partitions.setdefault(status, {})[key] = None # dicts keep insertion order
+
+    def __len__(self): return len(self._rows)
+
+    def __contains__(self, key): return key in self._rows
+
+    def row_label(self, key):
+        """Row label of the line in the indexed frame, or None."""
+        return self._rows.get(key)
+
+    def status(self, key): return self._status.get(key)
+
+    def keys_with_status(self, *statuses):
+        return [key for status in statuses for key in self._partitions.get(status, {})]
+
+    def pending_keys(self): return self.keys_with_status(*PENDING_STATUSES)
+
+    def is_pending(self, key): return self._status.get(key) in PENDING_STATUSES
+
+    def set_status(self, key, status):
+        """Moves a line to another status partition (e.g. after a receipt)."""
+        status = str(status).strip().lower()
+        old_status = self._status.get(key)
+        if old_status is not None: self._partitions[old_status].pop(key, None)
+        self._status[key] = status
+        self._partitions.setdefault(status, {})[key] = None
+
+    def add_line(self, key, label, status):
+        self._rows[key] = label; self.set_status(key, status)
@@ -0,0 +1,58 @@
+import threading
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+from email_outbox import deliver_pending
+
+# Delivers queued PO emails off the Qt main thread. The GUI renders and enqueues each supplier's
+# email (email_outbox) and hands the MessageIDs here; one QRunnable runs an outbox delivery pass,
+# which keeps several suppliers in flight at once on asyncio, so a slow SMTP server never blocks
+# the window. The worker only talks to the GUI through signals, which Qt queues onto the main thread.
+
+class DispatchSignals(QObject):
+    progress = pyqtSignal(str) # Log line
+    done = pyqtSignal(dict) # MessageID -> outbox Status after the pass
+
+class OutboxDeliveryTask(QRunnable):
+    """Runs one email_outbox delivery pass for the given messages."""
+    def __init__(self, message_ids, cancel_event, signals):
+        super().__init__()
+        self.message_ids = message_ids; self.cancel_event = cancel_event; self.signals = signals
+
+    def run(self):
+        try: results = deliver_pending(self.message_ids, progress=self.signals.progress.emit, should_stop=self.cancel_event.is_set)
+        except Exception as e: # Never leave the dispatcher waiting; undelivered messages stay queued
+            self.signals.progress.emit(f"Email delivery failed: {e}"); results = {}
+        self.signals.done.emit(results)
+
+class OrderDispatcher(QObject):
+    """
+    Delivers queued messages in the background and emits finished({MessageID: Status}) when the
+    pass is over. cancel() leaves messages whose send has not started queued for the next run;
+    sends already talking to the server run to completion so their state is recorded.
+    """
+    progress = pyqtSignal(str)
+    finished = pyqtSignal(dict)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.pool = QThreadPool(self); self.pool.setMaxThreadCount(1) # One pass at a time; it has its own concurrency
+        self.cancel_event = threading.Event(); self.running = False
+        self.signals = DispatchSignals(self)
+        self.signals.progress.connect(self.progress); self.signals.done.connect(self._on_done)
+
+    def is_running(self): return self.running
+
+    def start(self, message_ids):
+        self.cancel_event.clear()
+        if not message_ids: self.finished.emit({}); return
+        self.running = True; self.pool.start(OutboxDeliveryTask(list(message_ids), self.cancel_event, self.signals))
+
+    def cancel(self):
+        if self.is_running(): self.cancel_event.set()
+
+    def wait(self):
+        """Blocks until the delivery pass has returned (e.g. when the window closes)."""
+        self.pool.waitForDone()
+
+    def _on_done(self, results):
+        self.running = False; self.finished.emit(results)
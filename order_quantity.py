@@ -0,0 +1,80 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+
+# Economic order quantities for the whole catalogue in one pass (computed by logic.py, ordered by
+# main.py). Per material: annual demand D (daily usage x DAYS_PER_YEAR), a cost per order S
+# (ORDER_COST) and a yearly holding cost of HOLDING_COST_RATE x the unit price p. The unit price is
+# CurrentPrice from the materials table or, from MinQuantity up, a quantity break in the price_tiers
+# table for the material at its preferred supplier (all-units: the whole order gets the tier price).
+# Every (material, price) pair is a candidate: its EOQ sqrt(2DS / hp), raised to the tier's
+# MinQuantity and rounded up to whole units, costed at Dp + DS/q + hpq/2; per material the cheapest
+# candidate wins. Materials are matched to rules by MaterialName == RawMaterial.
+ORDER_COST = float(os.environ.get('PROCUREMENT_ORDER_COST', 50.0)) # Per order placed
+HOLDING_COST_RATE = float(os.environ.get('PROCUREMENT_HOLDING_COST_RATE', 0.25)) # Per year, share of unit price
+DAYS_PER_YEAR = 365
+# Quantity main.py orders: 'standard' (materials StandardOrderQuantity) or 'eoq' (the rules'
+# EconomicOrderQuantity and its unit price, where the rules have one)
+ORDER_QUANTITY_SOURCE = os.environ.get('PROCUREMENT_ORDER_QUANTITY', 'standard')
+RULES_FILE = "procurement_rules.json"
+EOQ_COLUMNS = ['EconomicOrderQuantity', 'EconomicUnitPrice']
+
+def price_candidates(materials_df, tiers_df):
+    """
+    Unit prices on offer per material: CurrentPrice from quantity 0, plus the price tiers for the
+    material at its preferred supplier (or at any supplier).
+
+    Returns:
+        DataFrame: 'RawMaterial', 'MinQuantity', 'UnitPrice'; only positive prices.
+    """
+    materials = materials_df[['MaterialID', 'MaterialName', 'PreferredSupplierID', 'CurrentPrice']].astype({'MaterialID': str, 'PreferredSupplierID': str})
+    materials = materials[materials['MaterialName'] != ''].drop_duplicates('MaterialName')
+    base = pd.DataFrame({'RawMaterial': materials['MaterialName'], 'MinQuantity': 0.0, 'UnitPrice': materials['CurrentPrice']})
+    tiers = tiers_df.astype({'MaterialID': str, 'SupplierID': str}).merge(materials, on='MaterialID', sort=False)
+    tiers = tiers[(tiers['SupplierID'] == '') | (tiers['SupplierID'] == tiers['PreferredSupplierID'])]
+    candidates = pd.concat([base, tiers.rename(columns={'MaterialName': 'RawMaterial'})[['RawMaterial', 'MinQuantity', 'UnitPrice']]], ignore_index=True)
+    return candidates[candidates['UnitPrice'] > 0].fillna({'MinQuantity': 0.0})
+
+def economic_order_quantities(daily_usage, candidates, order_cost=ORDER_COST, holding_cost_rate=HOLDING_COST_RATE):
+    """
+    The cost-minimising order quantity per material.
+
+    Args:
+        daily_usage (Series): Expected daily demand, indexed by material.
+        candidates (DataFrame): price_candidates().
+
+    Returns:
+        DataFrame: Indexed by RawMaterial, EOQ_COLUMNS (the quantity and the unit price it is bought
+            at). Materials without demand or without a price are left out.
+    """
+    demand = candidates['RawMaterial'].map(daily_usage).to_numpy(dtype='float64') * DAYS_PER_YEAR
+    price = candidates['UnitPrice'].to_numpy(dtype='float64'); holding = holding_cost_rate * price
+    valid = demand > 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        quantity = np.ceil(np.maximum(np.sqrt(2 * demand * order_cost / holding), candidates['MinQuantity'].to_numpy(dtype='float64')))
+        cost = demand * price + demand * order_cost / quantity + holding * quantity / 2
+    best = pd.DataFrame({'RawMaterial': candidates['RawMaterial'].to_numpy()[valid], 'EconomicOrderQuantity': quantity[valid],
+                         'EconomicUnitPrice': price[valid], 'Cost': cost[valid]})
+    best = best.sort_values('Cost', kind='stable').drop_duplicates('RawMaterial').set_index('RawMaterial')
+    return best[EOQ_COLUMNS].sort_index()
+
+def apply_rule_order_quantities(materials_df, rules=None):
+    """
+    Overlays the rules' EconomicOrderQuantity (as StandardOrderQuantity) and EconomicUnitPrice (as
+    CurrentPrice) onto a materials frame, by MaterialName. Materials without one keep their values.
+    """
+    if materials_df.empty: return materials_df
+    if rules is None:
+        try:
+            with open(RULES_FILE) as f: rules = pd.DataFrame(json.load(f))
+        except (OSError, ValueError): return materials_df
+    if rules.empty or 'EconomicOrderQuantity' not in rules: return materials_df
+    rules = rules.dropna(subset=['EconomicOrderQuantity']).drop_duplicates('RawMaterial', keep='last').set_index('RawMaterial')
+    quantity = materials_df['MaterialName'].map(rules['EconomicOrderQuantity'])
+    has_rule = quantity.notna()
+    if has_rule.any():
+        materials_df = materials_df.copy()
+        materials_df.loc[has_rule, 'StandardOrderQuantity'] = quantity[has_rule]
+        materials_df.loc[has_rule, 'CurrentPrice'] = materials_df.loc[has_rule, 'MaterialName'].map(rules['EconomicUnitPrice'])
+    return materials_df
@@ -0,0 +1,121 @@
+import re
+import sys
+import functools
+import numpy as np
+import pandas as pd
+
+# Overhead classification for the purchase ledger (used by purchase_data.prepare_purchases). A row is
+# overhead if its category is one of OVERHEAD_CATEGORIES (exact, case-insensitive) or its description
+# contains one of OVERHEAD_ITEM_KEYWORDS (substring, case-insensitive). Each row gets a reason code:
+#   'category:<Category>' or 'keyword:<keyword>' if excluded, '' if kept
+# The category wins when both apply. Keywords are matched by a trie automaton built once, so a
+# description is scanned once whatever the number of keywords, and each distinct description is
+# classified once (per call via factorize, across calls via an LRU cache).
+OVERHEAD_CATEGORIES = [
+    'Shipping', 'Salaries', 'Rent', 'General', 'Admin', 'Software',
+    'Utilities', 'Bank Charges', 'Consultancy', 'Travel', 'Marketing',
+    'Taxes', 'Insurance', 'Maintenance', 'Staff Costs', 'Office Supplies',
+    'Logistics', 'IT Support', 'Legal Fees', 'Accounting Fees', 'Subscriptions', 'Training'
+]
+# Additional overhead filtering based on keywords in item description
+OVERHEAD_ITEM_KEYWORDS = [
+    'shipment', 'delivery', 'courier', 'consulting', 'fee', 'tax', 'vat',
+    'service charge', 'bank charges', 'rent', 'salary', 'salaries', 'payroll',
+    'interest', 'insurance', 'travel expenses', 'subscription', 'software license',
+    'utilities', 'phone bill', 'internet bill', 'office cleaning', 'repairs'
+]
+CATEGORY_REASON, KEYWORD_REASON = 'category', 'keyword'
+DESCRIPTION_CACHE_SIZE = 1 << 16 # Distinct descriptions remembered across calls
+
+class KeywordAutomaton:
+    """
+    Keyword trie compiled to one regular expression. Alternatives sharing a prefix share a branch
+    (e.g. 'salar(?:ies|y)'), so a scan tests each text position against the trie once, in C, instead
+    of trying every keyword in turn. find() returns the leftmost keyword (longest at that position).
+    """
+    def __init__(self, keywords):
+        self.keywords = list(dict.fromkeys(k.lower() for k in keywords if k))
+        trie = {}
+        for keyword in self.keywords:
+            node = trie
+            for char in keyword: node = node.setdefault(char, {})
+            node[''] = {} # End of a keyword
+        self.pattern = re.compile(self._compile(trie)) if self.keywords else None
+
+    @classmethod
+    def _compile(cls, node):
+        branches = [re.escape(char) + cls._compile(child) for char, child in sorted(node.items()) if char]
+        if not branches: return ''
+        body = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        return f"(?:{body})?" if '' in node else body # Greedy: a longer keyword wins over its prefix
+
+    def find(self, text):
+        """The leftmost keyword in `text`, or None. `text` must be lower-case."""
+        match = self.pattern.search(text) if self.pattern else None
+        return match.group(0) if match else None
+
+_automaton = KeywordAutomaton(OVERHEAD_ITEM_KEYWORDS)
+_categories = {category.lower(): category for category in OVERHEAD_CATEGORIES}
+
+@functools.lru_cache(maxsize=DESCRIPTION_CACHE_SIZE)
+def keyword_reason(description):
+    """Reason code for one description: 'keyword:<keyword>' or ''."""
+    keyword = _automaton.find(str(description).lower())
+    return f"{KEYWORD_REASON}:{keyword}" if keyword else ''
+
+def category_reason(category):
+    """Reason code for one category value: 'category:<Category>' or ''."""
+    if pd.isna(category): return ''
+    match = _categories.get(str(category).lower())
+    return f"{CATEGORY_REASON}:{match}" if match else ''
+
+def _per_distinct(values, func):
+    codes, uniques = pd.factorize(values, sort=False) # Missing values get code -1 and reason ''
+    reasons = np.array([func(value) for value in uniques] + [''], dtype=object)
+    return reasons[np.where(codes < 0, len(uniques), codes)]
+
+def classify(df, item_col=None, category_col=None):
+    """
+    Overhead reason code per row of df ('' = procurement row, keep).
+
+    Returns:
+        Series: Reason codes on df's index.
+    """
+    reasons = np.full(len(df), '', dtype=object)
+    if category_col: reasons = _per_distinct(df[category_col], category_reason)
+    if item_col:
+        pending = reasons == ''
+        if pending.any(): reasons[pending] = _per_distinct(df[item_col].to_numpy()[pending], keyword_reason)
+    return pd.Series(reasons, index=df.index, name='OverheadReason')
+
+def summarize(reasons):
+    """Excluded row counts per reason code, most frequent first."""
+    excluded = reasons[reasons != '']
+    return {reason: int(count) for reason, count in excluded.value_counts().items()}
+
+# --- Audit ---
+def main(argv=None):
+    """Writes the excluded ledger rows with their reason codes: python overhead.py [output.csv]"""
+    from purchase_data import DATA_FILE, ITEM_COLUMN_CANDIDATES, CATEGORY_COLUMN_CANDIDATES, find_column
+    argv = sys.argv[1:] if argv is None else argv
+    output = argv[0] if argv else "overhead_audit.csv"
+    try:
+        df = pd.read_csv(DATA_FILE)
+    except FileNotFoundError:
+        print(f"Error: The file '{DATA_FILE}' was not found.")
+        return
+    item_col = find_column(df, ITEM_COLUMN_CANDIDATES, verbose=False)
+    category_col = find_column(df, CATEGORY_COLUMN_CANDIDATES, verbose=False)
+    df.insert(0, 'SourceRow', np.arange(len(df)))
+    df['OverheadReason'] = classify(df, item_col, category_col)
+    excluded = df[df['OverheadReason'] != '']
+    print(f"{len(excluded)} of {len(df)} rows classified as overhead.")
+    for reason, count in summarize(df['OverheadReason']).items(): print(f"  {reason}: {count}")
+    try:
+        excluded.to_csv(output, index=False)
+        print(f"Excluded rows written to '{output}'.")
+    except Exception as e:
+        print(f"Error saving '{output}': {e}")
+
+if __name__ == "__main__":
+    main()
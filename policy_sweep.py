@@ -0,0 +1,147 @@
+import argparse
+import itertools
+import numpy as np
+import pandas as pd
+
+import logic
+from purchase_data import DATA_FILE, streaming_requested
+from forecasting import demand_blocks, demand_days, forecast_demand
+from safety_stock import simulate_safety_stock
+from instrumentation import stage, profile_run
+
+# What-if sweep of the rule parameters in logic.py (DEFAULT_LEAD_TIME_DAYS, SAFETY_STOCK_DAYS,
+# ANALYSIS_PERIOD_DAYS) against the purchase ledger's daily demand. Every parameter combination
+# gets each material's rules as logic.py would compute them and replays the ledger history under
+# them. The ReorderPoint follows logic.USAGE_BASIS and logic.SAFETY_STOCK_METHOD: daily usage (the
+# total quantity over the analysis period, or the forecast's ForecastDailyUsage, which does not
+# depend on the period) x (lead time + safety stock days), or under 'simulation' the Monte Carlo
+# reorder point for the lead time (safety stock days and period then have no effect). The standard
+# order quantity does not depend on the parameters. In the replay, each day demand is taken from stock (unmet demand is lost),
+# and when stock plus open orders falls below the reorder point one standard order is placed,
+# arriving after the lead time. All combinations and a block of materials advance together as one
+# combinations x materials array, so the sweep costs one pass over the days per block.
+#   python policy_sweep.py --lead-times 3,7,14 --safety-days 7,14,28 --periods 30,90,180
+LEAD_TIME_GRID = [3, 7, 14]
+SAFETY_STOCK_GRID = [7, 14, 21, 28]
+ANALYSIS_PERIOD_GRID = [30, 90, 180]
+SWEEP_BLOCK_MATERIALS = 2000 # Materials replayed together (memory: combinations x block x max lead time)
+SWEEP_OUTPUT_FILE = "policy_sweep.csv"
+PARAMETER_COLUMNS = ['LeadTimeDays', 'SafetyStockDays', 'AnalysisPeriodDays']
+RESULT_COLUMNS = ['Orders', 'StockoutDays', 'UnmetQuantity', 'FillRate', 'AverageInventory']
+
+def parameter_grid(lead_times=LEAD_TIME_GRID, safety_days=SAFETY_STOCK_GRID, periods=ANALYSIS_PERIOD_GRID):
+    """Every combination of the given values, as a DataFrame with PARAMETER_COLUMNS."""
+    return pd.DataFrame(list(itertools.product(lead_times, safety_days, periods)), columns=PARAMETER_COLUMNS)
+
+def replay(demand, reorder_point, order_quantity, lead_time_days):
+    """
+    Replays daily demand under reorder policies.
+
+    Args:
+        demand (ndarray): Daily demand, materials x days.
+        reorder_point (ndarray): combinations x materials.
+        order_quantity (ndarray): Per material.
+        lead_time_days (ndarray): Per combination (whole days, at least 1).
+
+    Returns:
+        dict: Per combination, summed over materials: 'Orders', 'StockoutDays' (material-days with unmet
+            demand), 'UnmetQuantity' and 'InventoryDays' (stock on hand summed over days).
+    """
+    combinations = reorder_point.shape[0]; slots = int(lead_time_days.max()) + 1
+    stock = reorder_point + order_quantity # Each material starts just after a delivery
+    on_order = np.zeros_like(stock); pipeline = np.zeros((slots,) + stock.shape) # Deliveries due, by day mod slots
+    orders, stockouts, unmet, inventory = (np.zeros_like(stock) for _ in range(4))
+    rows = np.arange(combinations)
+    for day in range(demand.shape[1]):
+        arriving = pipeline[day % slots]
+        stock += arriving; on_order -= arriving; arriving[:] = 0
+        shortfall = np.maximum(demand[:, day] - stock, 0)
+        stockouts += shortfall > 0; unmet += shortfall
+        stock = np.maximum(stock - demand[:, day], 0)
+        placed = np.where(stock + on_order < reorder_point, order_quantity, 0.0)
+        orders += placed > 0; on_order += placed
+        pipeline[(day + lead_time_days) % slots, rows] += placed
+        inventory += stock
+    return {'Orders': orders.sum(axis=1), 'StockoutDays': stockouts.sum(axis=1), 'UnmetQuantity': unmet.sum(axis=1), 'InventoryDays': inventory.sum(axis=1)}
+
+def sweep(stats, daily, grid, usage_basis=None, safety_stock_method=None):
+    """
+    Replays the ledger history under every parameter combination in `grid`.
+
+    Args:
+        stats (DataFrame): logic.material_stats() statistics, indexed by material.
+        daily (DataFrame): Quantity per material and day (logic.material_stats()).
+        grid (DataFrame): PARAMETER_COLUMNS, one row per combination.
+        usage_basis, safety_stock_method (str): As logic.USAGE_BASIS and logic.SAFETY_STOCK_METHOD (the defaults).
+
+    Returns:
+        DataFrame: `grid` with RESULT_COLUMNS (totals over all materials; FillRate is the share of
+            demand met, AverageInventory the units on hand on an average day).
+    """
+    usage_basis = logic.USAGE_BASIS if usage_basis is None else usage_basis
+    safety_stock_method = logic.SAFETY_STOCK_METHOD if safety_stock_method is None else safety_stock_method
+    days = demand_days(daily)
+    lead_time = grid['LeadTimeDays'].to_numpy(dtype=np.int64)
+    cover_days = (grid['LeadTimeDays'] + grid['SafetyStockDays']).to_numpy(dtype='float64')[:, None]
+    period = grid['AnalysisPeriodDays'].to_numpy(dtype='float64')[:, None]
+    materials, blocks = demand_blocks(daily, days, SWEEP_BLOCK_MATERIALS)
+    stats = stats.reindex(materials)
+    quantity_sum = stats['QuantitySum'].to_numpy(dtype='float64'); order_quantity = quantity_sum / stats['OrderCount'].to_numpy(dtype='float64')
+    # logic.rules_from_stats, per combination x material of a block
+    if safety_stock_method == 'simulation':
+        simulated = {lead: simulate_safety_stock(daily, lead, days=days)['ReorderPoint'].reindex(materials).fillna(0).to_numpy(dtype='float64')
+                     for lead in np.unique(lead_time)}
+        reorder_points = lambda first, last: np.stack([simulated[lead][first:last] for lead in lead_time])
+    else:
+        # combinations x materials for the average (it depends on the period), materials for the forecast
+        usage = quantity_sum / period if usage_basis != 'forecast' else \
+                forecast_demand(daily, days=days)['ForecastDailyUsage'].reindex(materials).fillna(0).to_numpy(dtype='float64')
+        reorder_points = lambda first, last: usage[..., first:last] * cover_days
+    totals = dict.fromkeys(['Orders', 'StockoutDays', 'UnmetQuantity', 'InventoryDays'], 0.0); total_demand = 0.0
+    for first, last, demand in blocks:
+        for key, values in replay(demand, reorder_points(first, last), order_quantity[first:last], lead_time).items(): totals[key] = totals[key] + values
+        total_demand += demand.sum()
+    results = grid.copy()
+    results['Orders'] = totals['Orders'].astype(np.int64); results['StockoutDays'] = totals['StockoutDays'].astype(np.int64)
+    results['UnmetQuantity'] = totals['UnmetQuantity'].round(2)
+    results['FillRate'] = (1 - totals['UnmetQuantity'] / total_demand).round(4) if total_demand else 1.0
+    results['AverageInventory'] = (totals['InventoryDays'] / len(days)).round(2)
+    return results
+
+def _values(text): return [int(value) for value in text.split(',') if value.strip()]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay the purchase ledger under a grid of rule parameters.")
+    parser.add_argument('--lead-times', type=_values, default=LEAD_TIME_GRID, help="Comma-separated lead times in days")
+    parser.add_argument('--safety-days', type=_values, default=SAFETY_STOCK_GRID, help="Comma-separated safety stock days")
+    parser.add_argument('--periods', type=_values, default=ANALYSIS_PERIOD_GRID, help="Comma-separated analysis periods in days")
+    parser.add_argument('--output', default=SWEEP_OUTPUT_FILE)
+    parser.add_argument('--stream', action='store_true', help="Read the ledger in chunks (see purchase_data.py)")
+    parser.add_argument('--profile', nargs='?', const='stages', help="Profile the run (see instrumentation.py)")
+    args = parser.parse_args(argv)
+    if min(args.lead_times + args.periods, default=0) < 1 or min(args.safety_days, default=0) < 0:
+        print("Error: Lead times and periods must be at least 1 day, safety stock days at least 0."); return
+
+    print(f"Starting policy sweep over '{DATA_FILE}'...")
+    try:
+        rebuilt = logic.full_rebuild(DATA_FILE, stream=args.stream or streaming_requested(DATA_FILE, []))
+    except FileNotFoundError:
+        print(f"Error: The file '{DATA_FILE}' was not found."); return
+    if rebuilt is None: return
+    stats, _, daily = rebuilt[:3]
+    if daily.empty: print("No procurement data left after filtering. Nothing to replay."); return
+
+    grid = parameter_grid(args.lead_times, args.safety_days, args.periods)
+    print(f"Reorder points as logic.py computes them: usage basis '{logic.USAGE_BASIS}', safety stock method '{logic.SAFETY_STOCK_METHOD}'.")
+    print(f"Replaying {len(demand_days(daily))} days for {len(stats)} materials under {len(grid)} parameter combination(s)...")
+    with stage('simulate'): results = sweep(stats, daily, grid)
+    current = (results['LeadTimeDays'] == logic.DEFAULT_LEAD_TIME_DAYS) & (results['SafetyStockDays'] == logic.SAFETY_STOCK_DAYS) & (results['AnalysisPeriodDays'] == logic.ANALYSIS_PERIOD_DAYS)
+    print(results.assign(Current=np.where(current, '*', '')).to_string(index=False))
+    try:
+        with stage('write'): results.to_csv(args.output, index=False)
+        print(f"\nSweep results written to '{args.output}'.")
+    except Exception as e:
+        print(f"Error saving '{args.output}': {e}")
+
+if __name__ == "__main__":
+    with profile_run('policy_sweep'): main()
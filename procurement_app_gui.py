@@ -2,29 +2,26 @@ import sys
 import pandas as pd
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QTabWidget,
-    QTableWidget, QTableWidgetItem, QLineEdit, QPushButton, QLabel, QFormLayout,
+    QLineEdit, QPushButton, QLabel, QFormLayout,
     QMessageBox, QComboBox, QSpinBox, QTextEdit, QHeaderView, QDoubleSpinBox,
-    QGroupBox, QCheckBox # <--- QCheckBox ADDED HERE
+    QGroupBox
 )
 from PyQt6.QtCore import Qt, QUrl
 from PyQt6.QtGui import QDesktopServices
-import os
 from datetime import datetime
 
 def generate_order_id():
     return f"PO-{datetime.now().strftime('%Y%m%d-%H%M%S%f')[:-3]}"
 
-MATERIALS_FILE = "materials_master.csv"
-SUPPLIERS_FILE = "suppliers.csv"
-ORDER_HISTORY_FILE = "order_history.csv"
-
-MATERIALS_HEADERS = ['MaterialID', 'MaterialName', 'Category', 'UnitOfMeasure', 'CurrentStock',
-                     'ReorderPoint', 'StandardOrderQuantity', 'PreferredSupplierID',
-                     'ProductPageURL', 'LeadTimeDays', 'SafetyStockQuantity', 'Notes', 'CurrentPrice']
-SUPPLIERS_HEADERS = ['SupplierID', 'SupplierName', 'ContactPerson', 'Email', 'Phone', 'Website', 'OrderMethod']
-ORDER_HISTORY_HEADERS = ['OrderID', 'Timestamp', 'MaterialID', 'MaterialName', 'QuantityOrdered',
-                         'UnitPricePaid', 'TotalPricePaid', 'SupplierID', 'SupplierName',
-                         'OrderMethod', 'Status', 'Notes']
+from storage import (get_storage, typed_records, ORDER_HISTORY_FILE,
+                     MATERIALS_HEADERS, SUPPLIERS_HEADERS)
+from data_access import load_table, save_table, append_rows, upsert_rows, delete_rows
+from stock_ledger import apply_ledger_stock, set_stock_level
+from reorder import plan_reorders, proposed_orders_frame
+from order_dispatch import OrderDispatcher
+from action import generate_po_email_content
+from email_outbox import enqueue_po_email, SENT, QUEUED
+from table_models import DataFrameTableModel, create_table_view, selected_source_rows, source_row, money_text
 
 def get_int_val(val_str, default=0):
     try: return int(float(str(val_str))) if pd.notna(val_str) and str(val_str).strip() != '' else default
@@ -33,28 +30,10 @@ def get_float_val(val_str, default=0.0):
     try: return float(str(val_str)) if pd.notna(val_str) and str(val_str).strip() != '' else default
     except ValueError: return default
 
-def load_or_create_dataframe_app(file_path, expected_headers, default_dtype=str, parent_widget=None, create_if_missing=False):
-    if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
-        try:
-            df = pd.read_csv(file_path, dtype=default_dtype).fillna('')
-            missing_cols = False; current_headers = df.columns.tolist()
-            for header in expected_headers:
-                if header not in current_headers: df[header] = ''; missing_cols = True
-            if missing_cols : QMessageBox.information(parent_widget,"File Schema Notice", f"File '{file_path}' had schema issues; attempted align.")
-            return df[expected_headers].fillna('')
-        except Exception as e:
-            QMessageBox.critical(parent_widget, "Load Error", f"Error loading {file_path}: {e}")
-            return pd.DataFrame(columns=expected_headers).astype(default_dtype).fillna('')
-    elif create_if_missing:
-        if not os.path.exists(file_path): QMessageBox.information(parent_widget, "File Notice", f"'{file_path}' not found. Creating.")
-        elif os.path.getsize(file_path) == 0: QMessageBox.information(parent_widget, "File Notice", f"'{file_path}' empty. Initializing.")
-        try:
-            df = pd.DataFrame(columns=expected_headers); df.to_csv(file_path, index=False)
-            return df.astype(default_dtype).fillna('')
-        except Exception as e: QMessageBox.critical(parent_widget, "File Creation Error", f"Could not create {file_path}: {e}")
-        return pd.DataFrame(columns=expected_headers).astype(default_dtype).fillna('')
-    else:
-        return pd.DataFrame(columns=expected_headers).astype(default_dtype).fillna('')
+def load_or_create_dataframe_app(table, parent_widget=None, create_if_missing=False):
+    return load_table(table, create_if_missing=create_if_missing,
+                      on_error=lambda msg: QMessageBox.critical(parent_widget, "Load Error", msg),
+                      on_notice=lambda msg: QMessageBox.information(parent_widget, "File Notice", msg))
 
 class DataManagementWidget(QWidget): # Unchanged from last working version
     def __init__(self, materials_df_ref, suppliers_df_ref, parent_save_cb, parent_refresh_sup_dd_cb):
@@ -68,8 +47,9 @@ class DataManagementWidget(QWidget): # Unchanged from last working version
         layout = QVBoxLayout(self); self.data_tabs = QTabWidget(); layout.addWidget(self.data_tabs)
         self.materials_tab_widget = QWidget(); self.data_tabs.addTab(self.materials_tab_widget, "Materials Master")
         mat_layout = QVBoxLayout(self.materials_tab_widget)
-        self.materials_table_view = QTableWidget(); self.materials_table_view.itemSelectionChanged.connect(self.on_material_selected)
-        mat_layout.addWidget(self.materials_table_view)
+        self.materials_model = DataFrameTableModel(MATERIALS_HEADERS)
+        self.materials_table_view = create_table_view(self.materials_model, mat_layout, "Filter materials...")
+        self.materials_table_view.selectionModel().selectionChanged.connect(self.on_material_selected)
         mat_form_group = QGroupBox("Material Details"); mat_form = QFormLayout()
         self.mat_id_edit = QLineEdit(); self.mat_name_edit = QLineEdit(); self.mat_cat_edit = QLineEdit(); self.mat_uom_edit = QLineEdit()
         self.mat_stock_spin = QSpinBox(); self.mat_stock_spin.setRange(0,999999); self.mat_rop_spin = QSpinBox(); self.mat_rop_spin.setRange(0,999999)
@@ -91,8 +71,9 @@ class DataManagementWidget(QWidget): # Unchanged from last working version
         mat_layout.addLayout(mat_btns_layout)
         self.suppliers_tab_widget = QWidget(); self.data_tabs.addTab(self.suppliers_tab_widget, "Suppliers")
         sup_layout = QVBoxLayout(self.suppliers_tab_widget)
-        self.suppliers_table_view = QTableWidget(); self.suppliers_table_view.itemSelectionChanged.connect(self.on_supplier_selected_from_table)
-        sup_layout.addWidget(self.suppliers_table_view)
+        self.suppliers_model = DataFrameTableModel(SUPPLIERS_HEADERS)
+        self.suppliers_table_view = create_table_view(self.suppliers_model, sup_layout, "Filter suppliers...")
+        self.suppliers_table_view.selectionModel().selectionChanged.connect(self.on_supplier_selected_from_table)
         sup_form_group = QGroupBox("Supplier Details"); sup_form_details = QFormLayout()
         self.sup_id_edit = QLineEdit(); self.sup_name_edit = QLineEdit(); self.sup_contact_edit = QLineEdit()
         self.sup_email_edit = QLineEdit(); self.sup_phone_edit = QLineEdit()
@@ -132,39 +113,19 @@ class DataManagementWidget(QWidget): # Unchanged from last working version
         if self.materials_df is None: return
         for header in MATERIALS_HEADERS:
             if header not in self.materials_df.columns: self.materials_df[header] = ''
-        display_df = self.materials_df[MATERIALS_HEADERS].fillna('')
-        self.materials_table_view.setRowCount(display_df.shape[0]); self.materials_table_view.setColumnCount(len(MATERIALS_HEADERS))
-        self.materials_table_view.setHorizontalHeaderLabels(MATERIALS_HEADERS);self.materials_table_view.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
-        for i in range(display_df.shape[0]):
-            for j, header in enumerate(MATERIALS_HEADERS): self.materials_table_view.setItem(i, j, QTableWidgetItem(str(display_df.iloc[i].get(header, ''))))
-        self.materials_table_view.resizeColumnsToContents(); self.materials_table_view.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.materials_model.set_frame(self.materials_df) # The view formats only the rows it shows
+        self.materials_table_view.resizeColumnsToContents()
     def on_material_selected(self):
-        rows = self.materials_table_view.selectionModel().selectedRows()
+        rows = selected_source_rows(self.materials_table_view)
         if not rows:
             self.clear_material_form()
             return
 
-        selected_row_index_in_view = rows[0].row()
-        # Ensure 'MaterialID' is a defined constant or directly use the string
-        material_id_col_idx = MATERIALS_HEADERS.index('MaterialID')
-        mat_id_item = self.materials_table_view.item(selected_row_index_in_view, material_id_col_idx)
-
-        if not mat_id_item or not mat_id_item.text():
+        data = self.materials_model.frame.iloc[rows[0]] # Model rows are positions in the displayed frame
+        if not str(data.get('MaterialID', '')):
             self.clear_material_form()
             return
 
-        material_id = mat_id_item.text() # Variable `material_id` is defined
-
-        # CORRECTED: Use the variable `material_id` (defined above)
-        data_rows = self.materials_df[self.materials_df['MaterialID'] == material_id]
-
-        if data_rows.empty:
-            self.clear_material_form()
-            # Optional: QMessageBox.warning(self, "Data Sync Error", f"MaterialID '{material_id}' not found in DataFrame.")
-            return  # Explicitly return if no data found
-
-        data = data_rows.iloc[0] # This line should now be safe
-
         self.mat_id_edit.setText(str(data.get('MaterialID',''))); self.mat_id_edit.setReadOnly(True)
         self.mat_name_edit.setText(str(data.get('MaterialName','')))
         self.mat_cat_edit.setText(str(data.get('Category',''))); self.mat_uom_edit.setText(str(data.get('UnitOfMeasure','')))
@@ -201,36 +162,34 @@ class DataManagementWidget(QWidget): # Unchanged from last working version
                           'ProductPageURL':self.mat_url_edit.text().strip(), 'LeadTimeDays':str(self.mat_lead_spin.value()),
                           'SafetyStockQuantity':str(self.mat_safe_stock_spin.value()), 'Notes':self.mat_notes_edit.toPlainText().strip()})
         existing = self.materials_df.index[self.materials_df['MaterialID'] == mat_id].tolist()
-        if existing: self.materials_df.loc[existing[0]] = pd.Series(data_dict)
-        else: self.materials_df = pd.concat([self.materials_df, pd.DataFrame([data_dict], columns=MATERIALS_HEADERS)], ignore_index=True)
-        self.parent_save_cb(MATERIALS_FILE, self.materials_df, MATERIALS_HEADERS)
+        old_stock = get_int_val(self.materials_df.loc[existing[0], 'CurrentStock']) if existing else 0
+        try: set_stock_level(mat_id, mat_name, self.mat_stock_spin.value(), opening_stock=old_stock) # Stock edits go through the ledger
+        except Exception as e: QMessageBox.critical(self, "Stock Ledger Error", f"Could not record stock change for {mat_id}: {e}")
+        typed_row = typed_records('materials', [data_dict])
+        if existing: self.materials_df.loc[existing[0]] = typed_row.iloc[0]
+        else: self.materials_df = pd.concat([self.materials_df, typed_row], ignore_index=True)
+        self.parent_save_cb('materials', self.materials_df, upserted=[data_dict])
         self.refresh_materials_table(); self.clear_material_form()
     def delete_material(self):
-        rows=self.materials_table_view.selectionModel().selectedRows()
+        rows=selected_source_rows(self.materials_table_view)
         if not rows: QMessageBox.warning(self,"Selection Error","Select material to delete."); return
-        idx=MATERIALS_HEADERS.index('MaterialID'); mat_id_del=self.materials_table_view.item(rows[0].row(),idx).text()
+        mat_id_del=str(self.materials_model.value(rows[0],'MaterialID'))
         if QMessageBox.question(self,"Confirm",f"Delete '{mat_id_del}'?",QMessageBox.StandardButton.Yes|QMessageBox.StandardButton.No)==QMessageBox.StandardButton.Yes:
             self.materials_df = self.materials_df[self.materials_df['MaterialID'] != mat_id_del].reset_index(drop=True)
-            self.parent_save_cb(MATERIALS_FILE, self.materials_df, MATERIALS_HEADERS)
+            self.parent_save_cb('materials', self.materials_df, deleted=[mat_id_del])
             self.refresh_materials_table(); self.clear_material_form()
     def refresh_suppliers_table(self):
         if self.suppliers_df is None: return
         for header in SUPPLIERS_HEADERS:
             if header not in self.suppliers_df.columns: self.suppliers_df[header] = ''
-        display_df = self.suppliers_df[SUPPLIERS_HEADERS].fillna('')
-        self.suppliers_table_view.setRowCount(display_df.shape[0]); self.suppliers_table_view.setColumnCount(len(SUPPLIERS_HEADERS))
-        self.suppliers_table_view.setHorizontalHeaderLabels(SUPPLIERS_HEADERS); self.suppliers_table_view.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
-        for i in range(display_df.shape[0]):
-            for j, header in enumerate(SUPPLIERS_HEADERS): self.suppliers_table_view.setItem(i, j, QTableWidgetItem(str(display_df.iloc[i].get(header, ''))))
-        self.suppliers_table_view.resizeColumnsToContents(); self.suppliers_table_view.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.suppliers_model.set_frame(self.suppliers_df)
+        self.suppliers_table_view.resizeColumnsToContents()
         # self.parent_refresh_sup_dd_cb() # This is called by parent app after this refresh is done via parent_save_cb
     def on_supplier_selected_from_table(self):
-        rows=self.suppliers_table_view.selectionModel().selectedRows()
+        rows=selected_source_rows(self.suppliers_table_view)
         if not rows: self.clear_supplier_form(); return
-        idx=SUPPLIERS_HEADERS.index('SupplierID'); sup_id_item=self.suppliers_table_view.item(rows[0].row(),idx)
-        if not sup_id_item or not sup_id_item.text(): self.clear_supplier_form(); return; supplier_id=sup_id_item.text()
-        data_rows=self.suppliers_df[self.suppliers_df['SupplierID']==supplier_id]
-        if data_rows.empty: self.clear_supplier_form(); return; data=data_rows.iloc[0]
+        data=self.suppliers_model.frame.iloc[rows[0]]
+        if not str(data.get('SupplierID','')): self.clear_supplier_form(); return
         self.sup_id_edit.setText(str(data.get('SupplierID',''))); self.sup_id_edit.setReadOnly(True); self.sup_name_edit.setText(str(data.get('SupplierName','')))
         self.sup_contact_edit.setText(str(data.get('ContactPerson',''))); self.sup_email_edit.setText(str(data.get('Email','')))
         self.sup_phone_edit.setText(str(data.get('Phone',''))); self.sup_website_edit.setText(str(data.get('Website','')))
@@ -250,13 +209,13 @@ class DataManagementWidget(QWidget): # Unchanged from last working version
         existing=self.suppliers_df.index[self.suppliers_df['SupplierID']==sup_id].tolist()
         if existing: self.suppliers_df.loc[existing[0]] = pd.Series(data_dict)
         else: self.suppliers_df=pd.concat([self.suppliers_df, pd.DataFrame([data_dict], columns=SUPPLIERS_HEADERS)], ignore_index=True)
-        self.parent_save_cb(SUPPLIERS_FILE, self.suppliers_df, SUPPLIERS_HEADERS)
+        self.parent_save_cb('suppliers', self.suppliers_df, upserted=[data_dict])
         self.refresh_suppliers_table(); self.clear_supplier_form()
         self.parent_refresh_sup_dd_cb()
     def delete_supplier(self):
-        rows=self.suppliers_table_view.selectionModel().selectedRows()
+        rows=selected_source_rows(self.suppliers_table_view)
         if not rows: QMessageBox.warning(self,"Selection Error","Select supplier to delete."); return
-        idx=SUPPLIERS_HEADERS.index('SupplierID'); sup_id_del=self.suppliers_table_view.item(rows[0].row(),idx).text()
+        sup_id_del=str(self.suppliers_model.value(rows[0],'SupplierID'))
         if not self.materials_df.empty and 'PreferredSupplierID' in self.materials_df.columns:
             if sup_id_del in self.materials_df['PreferredSupplierID'].values:
                 used_by=self.materials_df[self.materials_df['PreferredSupplierID']==sup_id_del]['MaterialID'].tolist()
@@ -264,7 +223,7 @@ class DataManagementWidget(QWidget): # Unchanged from last working version
                 return
         if QMessageBox.question(self,"Confirm",f"Delete '{sup_id_del}'?",QMessageBox.StandardButton.Yes|QMessageBox.StandardButton.No)==QMessageBox.StandardButton.Yes:
             self.suppliers_df = self.suppliers_df[self.suppliers_df['SupplierID']!=sup_id_del].reset_index(drop=True)
-            self.parent_save_cb(SUPPLIERS_FILE, self.suppliers_df, SUPPLIERS_HEADERS)
+            self.parent_save_cb('suppliers', self.suppliers_df, deleted=[sup_id_del])
             self.refresh_suppliers_table(); self.clear_supplier_form()
             self.parent_refresh_sup_dd_cb()
 
@@ -274,9 +233,9 @@ class ProcurementAppGUI(QMainWindow):
         self.setWindowTitle("Integrated Procurement Application")
         self.setGeometry(50, 50, 1200, 850)
 
-        self.materials_df = load_or_create_dataframe_app(MATERIALS_FILE, MATERIALS_HEADERS, parent_widget=self, create_if_missing=True)
-        self.suppliers_df = load_or_create_dataframe_app(SUPPLIERS_FILE, SUPPLIERS_HEADERS, parent_widget=self, create_if_missing=True)
-        self.order_history_df = load_or_create_dataframe_app(ORDER_HISTORY_FILE, ORDER_HISTORY_HEADERS, create_if_missing=True, parent_widget=self)
+        self.materials_df = apply_ledger_stock(load_or_create_dataframe_app('materials', parent_widget=self, create_if_missing=True))
+        self.suppliers_df = load_or_create_dataframe_app('suppliers', parent_widget=self, create_if_missing=True)
+        self.order_history_df = load_or_create_dataframe_app('order_history', create_if_missing=True, parent_widget=self)
         
         self.main_tabs = QTabWidget(); self.setCentralWidget(self.main_tabs)
         self.data_management_widget = DataManagementWidget(self.materials_df,self.suppliers_df,self.save_any_dataframe,self.refresh_preferred_supplier_dropdown_in_materials_tab)
@@ -288,13 +247,17 @@ class ProcurementAppGUI(QMainWindow):
         self.run_order_check_button = QPushButton("Refresh / Prepare Draft Orders"); self.run_order_check_button.clicked.connect(self.prepare_orders_action)
         gen_ord_top_btn_layout.addWidget(self.run_order_check_button)
         self.process_selected_orders_button = QPushButton("Process Selected Orders"); self.process_selected_orders_button.clicked.connect(self.process_selected_orders_action); self.process_selected_orders_button.setEnabled(False) 
-        gen_ord_top_btn_layout.addWidget(self.process_selected_orders_button); gen_ord_top_btn_layout.addStretch(); gen_ord_layout.addLayout(gen_ord_top_btn_layout)
-        self.proposed_orders_table = QTableWidget()
+        gen_ord_top_btn_layout.addWidget(self.process_selected_orders_button)
+        self.cancel_dispatch_button = QPushButton("Cancel Sending"); self.cancel_dispatch_button.clicked.connect(self.cancel_dispatch_action); self.cancel_dispatch_button.setEnabled(False)
+        gen_ord_top_btn_layout.addWidget(self.cancel_dispatch_button); gen_ord_top_btn_layout.addStretch(); gen_ord_layout.addLayout(gen_ord_top_btn_layout)
         self.proposed_orders_cols = ["Select", "SupplierName", "SupplierID", "MaterialID", "MaterialName", "OrderQty", "Unit Price", "Total Price", "OrderMethod", "ActionDetails", "Open Link"]
-        self.proposed_orders_table.setColumnCount(len(self.proposed_orders_cols)); self.proposed_orders_table.setHorizontalHeaderLabels(self.proposed_orders_cols)
-        self.proposed_orders_table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers); gen_ord_layout.addWidget(self.proposed_orders_table)
+        self.proposed_orders_model = DataFrameTableModel(self.proposed_orders_cols, formatters={"Unit Price": money_text, "Total Price": money_text}, checkable="Select")
+        self.proposed_orders_table = create_table_view(self.proposed_orders_model, gen_ord_layout, "Filter proposed orders...")
+        self.proposed_orders_table.clicked.connect(self.on_proposed_order_clicked)
         self.order_process_log = QTextEdit(); self.order_process_log.setReadOnly(True); self.order_process_log.setFixedHeight(150)
         gen_ord_layout.addWidget(QLabel("Processing Log:")); gen_ord_layout.addWidget(self.order_process_log)
+        self.dispatcher = OrderDispatcher(parent=self)
+        self.dispatcher.progress.connect(self.order_process_log.append); self.dispatcher.finished.connect(self.on_dispatch_finished)
         
         self.order_checkin_tab = QWidget(); self.main_tabs.addTab(self.order_checkin_tab, "Order Check-In (TBD)")
         self.order_checkin_tab.setLayout(QVBoxLayout()); self.order_checkin_tab.layout().addWidget(QLabel("Order check-in functionality will be integrated here."))
@@ -305,24 +268,24 @@ class ProcurementAppGUI(QMainWindow):
     # generate_order_id is NOT a method here, it's a module-level function now.
     # No @staticmethod needed if it's outside the class.
 
-    def save_any_dataframe(self, file_path, df, headers_order):
-        # ... (This method should be correct from your last working version)
+    def save_any_dataframe(self, table, df, upserted=None, deleted=None):
+        # Only the changed rows are persisted; the in-memory frame is already up to date.
+        source = get_storage().describe(table)
         try:
-            df_to_save = df.copy()
-            for header in headers_order:
-                 if header not in df_to_save.columns: df_to_save[header] = ''
-            df_to_save[headers_order].to_csv(file_path, index=False)
-            QMessageBox.information(self, "Success", f"Data saved to {file_path}")
-            if file_path == SUPPLIERS_FILE: 
+            if upserted: upsert_rows(table, upserted)
+            if deleted: delete_rows(table, deleted)
+            if upserted is None and deleted is None: save_table(table, df)
+            QMessageBox.information(self, "Success", f"Data saved to {source}")
+            if table == 'suppliers': 
                 self.suppliers_df = df.copy() 
                 if hasattr(self, 'data_management_widget'): self.data_management_widget.suppliers_df = self.suppliers_df 
                 self.refresh_preferred_supplier_dropdown_in_materials_tab()
-            elif file_path == MATERIALS_FILE: 
+            elif table == 'materials': 
                 self.materials_df = df.copy() 
                 if hasattr(self, 'data_management_widget'): self.data_management_widget.materials_df = self.materials_df
-            elif file_path == ORDER_HISTORY_FILE: 
+            elif table == 'order_history': 
                 self.order_history_df = df.copy() 
-        except Exception as e: QMessageBox.critical(self, "Save Error", f"Error saving to {file_path} (App): {e}")
+        except Exception as e: QMessageBox.critical(self, "Save Error", f"Error saving to {source} (App): {e}")
 
 
     def refresh_preferred_supplier_dropdown_in_materials_tab(self):
@@ -332,52 +295,26 @@ class ProcurementAppGUI(QMainWindow):
 
     def prepare_orders_action(self):
         # ... (This method should be correct from your last working version)
-        self.order_process_log.clear(); self.proposed_orders_table.setRowCount(0)
+        self.order_process_log.clear(); self.proposed_orders_model.set_frame(None)
         self.order_process_log.append(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}: Starting order prep...")
         current_materials_df = self.materials_df; current_suppliers_df = self.suppliers_df
         if current_materials_df.empty: self.order_process_log.append("Error: Materials empty."); return
-        items_to_order_by_supplier_id = {} 
-        for _, mat_row in current_materials_df.iterrows():
-            try:
-                mat_id = str(mat_row.get('MaterialID','')).strip(); mat_name = str(mat_row.get('MaterialName','U')).strip()
-                stock = get_float_val(str(mat_row.get('CurrentStock','0')),0.0); rop = get_float_val(str(mat_row.get('ReorderPoint','inf')),float('inf'))
-                if stock < rop:
-                    pref_sup_id=str(mat_row.get('PreferredSupplierID','')).strip(); order_qty=get_float_val(str(mat_row.get('StandardOrderQuantity','0')),0.0)
-                    price=get_float_val(str(mat_row.get('CurrentPrice','0')),0.0); url=str(mat_row.get('ProductPageURL','')).strip()
-                    if not pref_sup_id or order_qty <= 0: self.order_process_log.append(f"  Skip {mat_name}: No SupID or 0 Qty."); continue
-                    items_to_order_by_supplier_id.setdefault(pref_sup_id,[]).append({'MaterialID':mat_id,'MaterialName':mat_name,'QuantityOrdered':order_qty,'UnitPricePaid':price,'ProductPageURL':url})
-            except Exception as e: self.order_process_log.append(f"  Error processing {mat_row.get('MaterialID','Unknown')}: {e}")
-        if not items_to_order_by_supplier_id: self.order_process_log.append("No items to reorder."); return
-        self.order_process_log.append("Populating proposed orders table..."); self.proposed_orders_table.setRowCount(0)
-        for sup_id, items in items_to_order_by_supplier_id.items():
-            sup_info_rows=current_suppliers_df[current_suppliers_df['SupplierID']==sup_id]
-            if sup_info_rows.empty: self.order_process_log.append(f"  WARN: SupID '{sup_id}' not found for items: {[i['MaterialName'] for i in items]}."); continue
-            sup_info=sup_info_rows.iloc[0]; sup_name=str(sup_info.get('SupplierName',sup_id)); method=str(sup_info.get('OrderMethod','N/A')).lower().strip()
-            for item_dict in items:
-                r=self.proposed_orders_table.rowCount(); self.proposed_orders_table.insertRow(r)
-                col_idx_select = self.proposed_orders_cols.index("Select"); chkbox = QCheckBox(); self.proposed_orders_table.setCellWidget(r, col_idx_select, chkbox)
-                self.proposed_orders_table.setItem(r,self.proposed_orders_cols.index("SupplierName"),QTableWidgetItem(sup_name))
-                self.proposed_orders_table.setItem(r,self.proposed_orders_cols.index("SupplierID"),QTableWidgetItem(sup_id))
-                self.proposed_orders_table.setItem(r,self.proposed_orders_cols.index("MaterialID"),QTableWidgetItem(item_dict['MaterialID']))
-                self.proposed_orders_table.setItem(r,self.proposed_orders_cols.index("MaterialName"),QTableWidgetItem(item_dict['MaterialName']))
-                self.proposed_orders_table.setItem(r,self.proposed_orders_cols.index("OrderQty"),QTableWidgetItem(str(item_dict['QuantityOrdered'])))
-                self.proposed_orders_table.setItem(r,self.proposed_orders_cols.index("Unit Price"),QTableWidgetItem(f"{item_dict['UnitPricePaid']:.2f}"))
-                self.proposed_orders_table.setItem(r,self.proposed_orders_cols.index("Total Price"),QTableWidgetItem(f"{(item_dict['QuantityOrdered']*item_dict['UnitPricePaid']):.2f}"))
-                self.proposed_orders_table.setItem(r,self.proposed_orders_cols.index("OrderMethod"),QTableWidgetItem(method))
-                action_str=""; url_btn_visible=False; url_to_open = ""
-                if method=="email": action_str=f"Email: {sup_info.get('Email','N/A')}"
-                elif method=="online": 
-                    item_url=item_dict['ProductPageURL']; sup_web=sup_info.get('SupplierWebsite','N/A'); url_to_open=item_url if item_url else sup_web
-                    action_str=f"Online order at: {url_to_open if url_to_open else 'N/A'}"; url_btn_visible=bool(url_to_open)
-                elif method=="phone": action_str=f"Phone: {sup_info.get('Phone','N/A')}"
-                else: action_str="Manual Review"
-                self.proposed_orders_table.setItem(r,self.proposed_orders_cols.index("ActionDetails"),QTableWidgetItem(action_str))
-                if url_btn_visible:
-                    btn=QPushButton("Open"); btn.clicked.connect(lambda chk=False, u=url_to_open: self.open_url_action(u))
-                    self.proposed_orders_table.setCellWidget(r,self.proposed_orders_cols.index("Open Link"),btn)
-                else: self.proposed_orders_table.setItem(r,self.proposed_orders_cols.index("Open Link"),QTableWidgetItem(""))
+        self.order_history_df = load_or_create_dataframe_app('order_history', parent_widget=self, create_if_missing=True) # Orders placed elsewhere count as on order too
+        plan = plan_reorders(current_materials_df, current_suppliers_df, self.order_history_df)
+        for mat_id in plan['invalid_stock']['MaterialID']: self.order_process_log.append(f"  Skip {mat_id or 'Unknown'}: Missing or invalid CurrentStock.")
+        for mat_name in plan['skipped']['MaterialName']: self.order_process_log.append(f"  Skip {mat_name}: No SupID or 0 Qty.")
+        for sup_id, names in plan['unknown_suppliers'].groupby('SupplierID', sort=False)['MaterialName']:
+            self.order_process_log.append(f"  WARN: SupID '{sup_id}' not found for items: {names.tolist()}.")
+        if plan['lines'].empty: self.order_process_log.append("No items to reorder."); return
+        self.order_process_log.append("Populating proposed orders table...")
+        self.proposed_orders_model.set_frame(proposed_orders_frame(plan)) # Clicking "Open" opens OpenURL, see on_proposed_order_clicked
         self.proposed_orders_table.resizeColumnsToContents(); self.order_process_log.append("Order prep complete.")
-        self.process_selected_orders_button.setEnabled(True if self.proposed_orders_table.rowCount() > 0 else False)
+        self.process_selected_orders_button.setEnabled(self.proposed_orders_model.rowCount() > 0)
+
+    def on_proposed_order_clicked(self, index):
+        if self.proposed_orders_cols[index.column()] != "Open Link": return
+        url_to_open = self.proposed_orders_model.value(source_row(self.proposed_orders_table, index), 'OpenURL')
+        if url_to_open: self.open_url_action(url_to_open)
 
     def open_url_action(self, url_string):
         # ... (This method should be correct from your last working version)
@@ -387,25 +324,12 @@ class ProcurementAppGUI(QMainWindow):
 
     def process_selected_orders_action(self):
         self.order_process_log.append(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}: Processing selected orders...")
-        selected_count = 0
-        orders_to_log_and_action = [] 
-        for r in range(self.proposed_orders_table.rowCount()):
-            checkbox = self.proposed_orders_table.cellWidget(r, self.proposed_orders_cols.index("Select"))
-            if checkbox and checkbox.isChecked():
-                selected_count +=1
-                supplier_id = self.proposed_orders_table.item(r, self.proposed_orders_cols.index("SupplierID")).text()
-                supplier_name = self.proposed_orders_table.item(r, self.proposed_orders_cols.index("SupplierName")).text()
-                material_id = self.proposed_orders_table.item(r, self.proposed_orders_cols.index("MaterialID")).text()
-                material_name = self.proposed_orders_table.item(r, self.proposed_orders_cols.index("MaterialName")).text()
-                qty_ordered = get_float_val(self.proposed_orders_table.item(r, self.proposed_orders_cols.index("OrderQty")).text())
-                unit_price = get_float_val(self.proposed_orders_table.item(r, self.proposed_orders_cols.index("Unit Price")).text())
-                order_method = self.proposed_orders_table.item(r, self.proposed_orders_cols.index("OrderMethod")).text()
-                orders_to_log_and_action.append({
-                    "SupplierID": supplier_id, "SupplierName": supplier_name, "MaterialID": material_id, 
-                    "MaterialName": material_name, "QuantityOrdered": qty_ordered, "UnitPricePaid": unit_price,
-                    "OrderMethod": order_method,
-                    "ActionDetail": self.proposed_orders_table.item(r, self.proposed_orders_cols.index("ActionDetails")).text()
-                })
+        selected = self.proposed_orders_model.frame.iloc[self.proposed_orders_model.checked_rows()]
+        orders_to_log_and_action = [{
+            "SupplierID": line['SupplierID'], "SupplierName": line['SupplierName'], "MaterialID": line['MaterialID'],
+            "MaterialName": line['MaterialName'], "QuantityOrdered": float(line['OrderQty']), "UnitPricePaid": round(float(line['Unit Price']), 2), # As displayed
+            "OrderMethod": line['OrderMethod'], "ActionDetail": line['ActionDetails']
+        } for line in selected.to_dict('records')]
         if not orders_to_log_and_action: self.order_process_log.append("No orders were selected."); return
         self.order_process_log.append(f"Found {len(orders_to_log_and_action)} selected lines.")
         grouped_for_email = {}; new_history_entries = []
@@ -429,240 +353,50 @@ class ProcurementAppGUI(QMainWindow):
             elif order_detail['OrderMethod'] == "phone": self.order_process_log.append(f"  CONFIRMED for phone order: {order_detail['MaterialName']} from {order_detail['SupplierName']}. Details: {order_detail['ActionDetail']}")
             else: self.order_process_log.append(f"  CONFIRMED for manual review: {order_detail['MaterialName']} from {order_detail['SupplierName']}. Details: {order_detail['ActionDetail']}")
         
-        from action import generate_po_email_content, send_po_email 
+        # Emails are rendered and queued here (no network I/O); the dispatcher then runs a delivery pass in the background
+        message_ids = []; outcomes = {}
         for supplier_id, items_for_email in grouped_for_email.items():
             supplier_info_rows = self.suppliers_df[self.suppliers_df['SupplierID'] == supplier_id]
-            if not supplier_info_rows.empty:
-                supplier_info = supplier_info_rows.iloc[0]; supplier_name = str(supplier_info.get('SupplierName', supplier_id)); supplier_email = str(supplier_info.get('Email','')).strip()
-                if supplier_email:
-                    self.order_process_log.append(f"  Generating email for {supplier_name} ({len(items_for_email)} items)...")
-                    subject, body = generate_po_email_content(supplier_name, items_for_email)
-                    if subject and body:
-                        success = send_po_email(supplier_email, subject, body)
-                        log_method_outcome = "email_sent" if success else "email_failed_send"
-                        self.order_process_log.append(f"    Email to {supplier_name} {'succeeded' if success else 'failed'}.")
-                        for entry in new_history_entries:
-                            if entry['SupplierID'] == supplier_id and entry['OrderMethod'] == 'email': entry['OrderMethod'] = log_method_outcome
-                    else:
-                        self.order_process_log.append(f"    FAILED to generate email content for {supplier_name}.")
-                        for entry in new_history_entries:
-                            if entry['SupplierID'] == supplier_id and entry['OrderMethod'] == 'email': entry['OrderMethod'] = "email_failed_content"
-                else:
-                    self.order_process_log.append(f"  SKIPPED email for {supplier_name}: No email address found.")
-                    for entry in new_history_entries:
-                            if entry['SupplierID'] == supplier_id and entry['OrderMethod'] == 'email': entry['OrderMethod'] = "email_failed_no_address"
+            if supplier_info_rows.empty: continue
+            supplier_info = supplier_info_rows.iloc[0]
+            supplier_name = str(supplier_info.get('SupplierName', supplier_id)); supplier_email = str(supplier_info.get('Email','')).strip()
+            if not supplier_email:
+                self.order_process_log.append(f"  SKIPPED email for {supplier_name}: No email address found."); outcomes[supplier_id] = "email_failed_no_address"; continue
+            subject, body = generate_po_email_content(supplier_name, items_for_email)
+            if not (subject and body):
+                self.order_process_log.append(f"    FAILED to generate email content for {supplier_name}."); outcomes[supplier_id] = "email_failed_content"; continue
+            message_ids.append(enqueue_po_email(batch_order_id, supplier_id, supplier_email, subject, body)); outcomes[supplier_id] = "email_queued"
+            self.order_process_log.append(f"  Queued email for {supplier_name} ({len(items_for_email)} items).")
+        for entry in new_history_entries:
+            if entry['OrderMethod'] == 'email' and entry['SupplierID'] in outcomes: entry['OrderMethod'] = outcomes[entry['SupplierID']]
         if new_history_entries:
-            history_df_to_append = pd.DataFrame(new_history_entries)
-            append_to_csv(history_df_to_append, ORDER_HISTORY_FILE, ORDER_HISTORY_HEADERS)
+            append_rows('order_history', new_history_entries)
             self.order_process_log.append(f"Logged {len(new_history_entries)} lines to {ORDER_HISTORY_FILE} (OrderID: {batch_order_id}).")
-            self.order_history_df = load_or_create_dataframe_app(ORDER_HISTORY_FILE, ORDER_HISTORY_HEADERS, parent_widget=self, create_if_missing=True)
+        if message_ids: self.order_process_log.append(f"Sending {len(message_ids)} supplier emails in the background...")
+        self.set_dispatch_running(True); self.dispatcher.start(message_ids)
+
+    def on_dispatch_finished(self, results):
+        if results:
+            sent = sum(status == SENT for status in results.values()); retry = sum(status == QUEUED for status in results.values())
+            self.order_process_log.append(f"Emails: {sent} sent, {retry} queued for retry, {len(results) - sent - retry} failed.")
+        self.order_history_df = load_or_create_dataframe_app('order_history', parent_widget=self, create_if_missing=True) # Delivery updated OrderMethod
         self.order_process_log.append("Finished processing selected orders.")
-        self.prepare_orders_action(); self.process_selected_orders_button.setEnabled(self.proposed_orders_table.rowCount() > 0)
+        self.set_dispatch_running(False); self.prepare_orders_action()
 
-# if __name__ == '__main__': block as before
-if __name__ == '__main__':
-    app = QApplication(sys.argv)
-    main_app_window = ProcurementAppGUI()
-    main_app_window.show()
-    sys.exit(app.exec())
+    def set_dispatch_running(self, running):
+        self.cancel_dispatch_button.setEnabled(running); self.run_order_check_button.setEnabled(not running)
+        self.process_selected_orders_button.setEnabled(not running and self.proposed_orders_model.rowCount() > 0)
 
-    def save_any_dataframe(self, file_path, df, headers_order):
-        try:
-            df_to_save = df.copy()
-            for header in headers_order:
-                 if header not in df_to_save.columns: df_to_save[header] = ''
-            df_to_save[headers_order].to_csv(file_path, index=False)
-            QMessageBox.information(self, "Success", f"Data saved to {file_path}")
-            if file_path == SUPPLIERS_FILE:
-                self.suppliers_df = df.copy(); self.data_management_widget.suppliers_df = self.suppliers_df
-                self.refresh_preferred_supplier_dropdown_in_materials_tab()
-            elif file_path == MATERIALS_FILE:
-                self.materials_df = df.copy(); self.data_management_widget.materials_df = self.materials_df
-            elif file_path == ORDER_HISTORY_FILE: self.order_history_df = df.copy()
-        except Exception as e: QMessageBox.critical(self, "Save Error", f"Error saving to {file_path} (App): {e}")
-
-    def refresh_preferred_supplier_dropdown_in_materials_tab(self):
-        if hasattr(self, 'data_management_widget'): self.data_management_widget.populate_preferred_supplier_dropdown()
-
-    def prepare_orders_action(self):
-        self.order_process_log.clear(); self.proposed_orders_table.setRowCount(0)
-        self.order_process_log.append(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}: Starting order prep...")
-        current_materials_df = self.materials_df; current_suppliers_df = self.suppliers_df
-        if current_materials_df.empty: self.order_process_log.append("Error: Materials empty."); return
-        items_to_order_by_supplier_id = {}
-        for _, mat_row in current_materials_df.iterrows():
-            try:
-                mat_id = str(mat_row.get('MaterialID','')).strip(); mat_name = str(mat_row.get('MaterialName','U')).strip()
-                stock = get_float_val(str(mat_row.get('CurrentStock','0')),0.0); rop = get_float_val(str(mat_row.get('ReorderPoint','inf')),float('inf'))
-                if stock < rop:
-                    pref_sup_id=str(mat_row.get('PreferredSupplierID','')).strip(); order_qty=get_float_val(str(mat_row.get('StandardOrderQuantity','0')),0.0)
-                    price=get_float_val(str(mat_row.get('CurrentPrice','0')),0.0); url=str(mat_row.get('ProductPageURL','')).strip()
-                    if not pref_sup_id or order_qty <= 0: self.order_process_log.append(f"  Skip {mat_name}: No SupID or 0 Qty."); continue
-                    items_to_order_by_supplier_id.setdefault(pref_sup_id,[]).append({'MaterialID':mat_id,'MaterialName':mat_name,'QuantityOrdered':order_qty,'UnitPricePaid':price,'ProductPageURL':url})
-            except Exception as e: self.order_process_log.append(f"  Error processing {mat_row.get('MaterialID','Unknown')}: {e}")
-        if not items_to_order_by_supplier_id: self.order_process_log.append("No items to reorder."); return
-        self.order_process_log.append("Populating proposed orders table..."); self.proposed_orders_table.setRowCount(0)
-        for sup_id, items in items_to_order_by_supplier_id.items():
-            sup_info_rows=current_suppliers_df[current_suppliers_df['SupplierID']==sup_id]
-            if sup_info_rows.empty: self.order_process_log.append(f"  WARN: SupID '{sup_id}' not found for items: {[i['MaterialName'] for i in items]}."); continue
-            sup_info=sup_info_rows.iloc[0]; sup_name=str(sup_info.get('SupplierName',sup_id)); method=str(sup_info.get('OrderMethod','N/A')).lower().strip()
-            for item_dict in items:
-                r=self.proposed_orders_table.rowCount(); self.proposed_orders_table.insertRow(r)
-                col_idx_select = self.proposed_orders_cols.index("Select"); chkbox = QCheckBox(); self.proposed_orders_table.setCellWidget(r, col_idx_select, chkbox)
-                self.proposed_orders_table.setItem(r,self.proposed_orders_cols.index("SupplierName"),QTableWidgetItem(sup_name))
-                self.proposed_orders_table.setItem(r,self.proposed_orders_cols.index("SupplierID"),QTableWidgetItem(sup_id))
-                self.proposed_orders_table.setItem(r,self.proposed_orders_cols.index("MaterialID"),QTableWidgetItem(item_dict['MaterialID']))
-                self.proposed_orders_table.setItem(r,self.proposed_orders_cols.index("MaterialName"),QTableWidgetItem(item_dict['MaterialName']))
-                self.proposed_orders_table.setItem(r,self.proposed_orders_cols.index("OrderQty"),QTableWidgetItem(str(item_dict['QuantityOrdered'])))
-                self.proposed_orders_table.setItem(r,self.proposed_orders_cols.index("Unit Price"),QTableWidgetItem(f"{item_dict['UnitPricePaid']:.2f}"))
-                self.proposed_orders_table.setItem(r,self.proposed_orders_cols.index("Total Price"),QTableWidgetItem(f"{(item_dict['QuantityOrdered']*item_dict['UnitPricePaid']):.2f}"))
-                self.proposed_orders_table.setItem(r,self.proposed_orders_cols.index("OrderMethod"),QTableWidgetItem(method))
-                action_str=""; url_btn_visible=False; url_to_open = ""
-                if method=="email": action_str=f"Email: {sup_info.get('Email','N/A')}"
-                elif method=="online":
-                    item_url=item_dict['ProductPageURL']; sup_web=sup_info.get('SupplierWebsite','N/A'); url_to_open=item_url if item_url else sup_web
-                    action_str=f"Online order at: {url_to_open if url_to_open else 'N/A'}"; url_btn_visible=bool(url_to_open)
-                elif method=="phone": action_str=f"Phone: {sup_info.get('Phone','N/A')}"
-                else: action_str="Manual Review"
-                self.proposed_orders_table.setItem(r,self.proposed_orders_cols.index("ActionDetails"),QTableWidgetItem(action_str))
-                if url_btn_visible:
-                    btn=QPushButton("Open"); btn.clicked.connect(lambda chk=False, u=url_to_open: self.open_url_action(u))
-                    self.proposed_orders_table.setCellWidget(r,self.proposed_orders_cols.index("Open Link"),btn)
-                else: self.proposed_orders_table.setItem(r,self.proposed_orders_cols.index("Open Link"),QTableWidgetItem(""))
-        self.proposed_orders_table.resizeColumnsToContents(); self.order_process_log.append("Order prep complete.")
-        self.process_selected_orders_button.setEnabled(True if self.proposed_orders_table.rowCount() > 0 else False)
-
-    def open_url_action(self, url_string):
-        if not url_string: QMessageBox.information(self, "No URL", "No URL available."); return
-        if not url_string.startswith(('http://','https://')): url_string='http://'+url_string
-        if not QDesktopServices.openUrl(QUrl(url_string)): QMessageBox.warning(self,"Open URL Failed",f"Could not open: {url_string}")
-
-    def process_selected_orders_action(self):
-        self.order_process_log.append(f"\n{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}: Processing selected orders...")
-        selected_count = 0
-        # This will be a list of dictionaries, each dict is a row from the table
-        orders_to_log_and_action = []
-
-        for r in range(self.proposed_orders_table.rowCount()):
-            checkbox = self.proposed_orders_table.cellWidget(r, self.proposed_orders_cols.index("Select"))
-            if checkbox and checkbox.isChecked():
-                selected_count +=1
-                # Extract all necessary data from the table row
-                supplier_id = self.proposed_orders_table.item(r, self.proposed_orders_cols.index("SupplierID")).text()
-                supplier_name = self.proposed_orders_table.item(r, self.proposed_orders_cols.index("SupplierName")).text()
-                material_id = self.proposed_orders_table.item(r, self.proposed_orders_cols.index("MaterialID")).text()
-                material_name = self.proposed_orders_table.item(r, self.proposed_orders_cols.index("MaterialName")).text()
-                qty_ordered = get_float_val(self.proposed_orders_table.item(r, self.proposed_orders_cols.index("OrderQty")).text())
-                unit_price = get_float_val(self.proposed_orders_table.item(r, self.proposed_orders_cols.index("Unit Price")).text())
-                order_method = self.proposed_orders_table.item(r, self.proposed_orders_cols.index("OrderMethod")).text()
-                # ProductPageURL for online orders is in ActionDetails or could be a hidden column
-                # For simplicity, let's assume we might re-fetch it or it's part of ActionDetails if needed for action.
-
-                orders_to_log_and_action.append({
-                    "SupplierID": supplier_id, "SupplierName": supplier_name,
-                    "MaterialID": material_id, "MaterialName": material_name,
-                    "QuantityOrdered": qty_ordered, "UnitPricePaid": unit_price,
-                    "OrderMethod": order_method,
-                    # We might need to store the specific email or full URL from ActionDetails if it's complex
-                    "ActionDetail": self.proposed_orders_table.item(r, self.proposed_orders_cols.index("ActionDetails")).text()
-                })
-
-        if not orders_to_log_and_action:
-            self.order_process_log.append("No orders were selected to process."); return
-
-        self.order_process_log.append(f"Found {len(orders_to_log_and_action)} selected order lines to process.")
-
-        # Group by supplier for email generation
-        grouped_for_email = {}
-        new_history_entries = []
-
-        # Generate OrderID per batch processed now, or per supplier later
-        batch_order_id = generate_order_id() # One ID for this entire processing batch
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-        for order_detail in orders_to_log_and_action:
-            supplier_id = order_detail["SupplierID"]
-            # Log to history first
-            history_entry = {
-                'OrderID': batch_order_id, # Could also be more granular like per supplier
-                'Timestamp': timestamp,
-                'MaterialID': order_detail['MaterialID'],
-                'MaterialName': order_detail['MaterialName'],
-                'QuantityOrdered': order_detail['QuantityOrdered'],
-                'UnitPricePaid': order_detail['UnitPricePaid'],
-                'TotalPricePaid': order_detail['QuantityOrdered'] * order_detail['UnitPricePaid'],
-                'SupplierID': supplier_id,
-                'SupplierName': order_detail['SupplierName'],
-                'OrderMethod': order_detail['OrderMethod'], # This is the method determined (e.g. "email")
-                'Status': 'Ordered', # Initial status
-                'Notes': 'Processed via GUI selection.'
-            }
-            new_history_entries.append(history_entry)
-
-            if order_detail['OrderMethod'] == "email":
-                grouped_for_email.setdefault(supplier_id, []).append({
-                    'name': order_detail['MaterialName'],
-                    'quantity': order_detail['QuantityOrdered']
-                })
-            elif order_detail['OrderMethod'] == "online":
-                self.order_process_log.append(f"  CONFIRMED for online order: {order_detail['MaterialName']} from {order_detail['SupplierName']}. Details: {order_detail['ActionDetail']}")
-            elif order_detail['OrderMethod'] == "phone":
-                 self.order_process_log.append(f"  CONFIRMED for phone order: {order_detail['MaterialName']} from {order_detail['SupplierName']}. Details: {order_detail['ActionDetail']}")
-            else: # Manual review
-                 self.order_process_log.append(f"  CONFIRMED for manual review: {order_detail['MaterialName']} from {order_detail['SupplierName']}. Details: {order_detail['ActionDetail']}")
-
-
-        # Send emails
-        # Ensure action.py is imported: from action import generate_po_email_content, send_po_email
-        from action import generate_po_email_content, send_po_email # Temporary import
-
-        for supplier_id, items_for_email in grouped_for_email.items():
-            supplier_info_rows = self.suppliers_df[self.suppliers_df['SupplierID'] == supplier_id]
-            if not supplier_info_rows.empty:
-                supplier_info = supplier_info_rows.iloc[0]
-                supplier_name = str(supplier_info.get('SupplierName', supplier_id))
-                supplier_email = str(supplier_info.get('Email','')).strip()
-                if supplier_email:
-                    self.order_process_log.append(f"  Generating email for {supplier_name} ({len(items_for_email)} items)...")
-                    subject, body = generate_po_email_content(supplier_name, items_for_email)
-                    if subject and body:
-                        success = send_po_email(supplier_email, subject, body)
-                        if success: self.order_process_log.append(f"    Email to {supplier_name} sent successfully.")
-                        else: self.order_process_log.append(f"    FAILED to send email to {supplier_name}.")
-                        # Update logged_method in history_entries for these items if needed
-                        for entry in new_history_entries:
-                            if entry['SupplierID'] == supplier_id and entry['OrderMethod'] == 'email':
-                                entry['OrderMethod'] = "email_sent" if success else "email_failed_send"
-                    else:
-                        self.order_process_log.append(f"    FAILED to generate email content for {supplier_name}.")
-                        for entry in new_history_entries:
-                            if entry['SupplierID'] == supplier_id and entry['OrderMethod'] == 'email':
-                                entry['OrderMethod'] = "email_failed_content"
-                else:
-                    self.order_process_log.append(f"  SKIPPED email for {supplier_name}: No email address found.")
-                    for entry in new_history_entries:
-                            if entry['SupplierID'] == supplier_id and entry['OrderMethod'] == 'email':
-                                entry['OrderMethod'] = "email_failed_no_address"
-
-
-        # Save all new history entries
-        if new_history_entries:
-            history_df_to_append = pd.DataFrame(new_history_entries)
-            # Use self.save_any_dataframe to append and update self.order_history_df
-            # This requires append_to_csv to be part of save_any_dataframe or a similar mechanism
-            # For now, directly use our module-level append_to_csv
-            append_to_csv(history_df_to_append, ORDER_HISTORY_FILE, ORDER_HISTORY_HEADERS)
-            self.order_process_log.append(f"Logged {len(new_history_entries)} lines to {ORDER_HISTORY_FILE} with OrderID {batch_order_id}.")
-            # Reload order history in the app
-            self.order_history_df = load_or_create_dataframe_app(ORDER_HISTORY_FILE, ORDER_HISTORY_HEADERS, parent_widget=self, create_if_missing=True)
-
-
-        self.order_process_log.append("Finished processing selected orders.")
-        # Refresh the proposed orders table (it might now be empty or show fewer items)
-        self.prepare_orders_action() # This will re-evaluate what needs ordering
-        self.process_selected_orders_button.setEnabled(False if self.proposed_orders_table.rowCount() == 0 else True)
+    def cancel_dispatch_action(self):
+        self.order_process_log.append("Cancelling: emails not yet started stay queued for the next delivery run...")
+        self.dispatcher.cancel(); self.cancel_dispatch_button.setEnabled(False)
 
+    def closeEvent(self, event):
+        if self.dispatcher.is_running(): # Let sends in progress finish and record their state before closing
+            self.dispatcher.cancel(); self.dispatcher.wait(); QApplication.processEvents()
+        super().closeEvent(event)
 
+# if __name__ == '__main__': block as before
 if __name__ == '__main__':
     app = QApplication(sys.argv)
     main_app_window = ProcurementAppGUI()
@@ -0,0 +1,310 @@
+import os
+import re
+import sys
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from instrumentation import stage
+from overhead import CATEGORY_REASON, classify, summarize
+
+# --- Configuration (shared by eda.py, logic.py, create_inventory_file.py and extract_suppliers.py) ---
+DATA_FILE = "March to May 25 Purchases.csv"
+CACHE_DIR = os.environ.get('PROCUREMENT_CACHE_DIR', '.procurement_cache')
+CACHE_VERSION = 3 # Bump whenever the cleaning/filtering below changes, to invalidate old caches
+
+# Columns - adjust if your CSV has different headers
+DATE_COLUMN = 'Date'
+ITEM_COLUMN_CANDIDATES = ['Description', 'Item Name', 'RawMaterial'] # Order of preference
+SUPPLIER_COLUMN_CANDIDATES = ['Supplier', 'Supplier Name', 'Vendor']
+QUANTITY_COLUMN_CANDIDATES = ['Quantity', 'Qty', 'Amount']
+CATEGORY_COLUMN_CANDIDATES = ['Material Type', 'Category', 'Type']
+STREAM_CHUNK_ROWS = int(os.environ.get('PROCUREMENT_STREAM_CHUNK_ROWS', 200000)) # Source rows per chunk in streaming mode
+STREAM_THRESHOLD_MB = float(os.environ.get('PROCUREMENT_STREAM_THRESHOLD_MB', 512)) # Larger ledgers are streamed even without --stream
+STREAM_SAMPLE_ROWS = 1000 # Rows read up front to detect the columns when streaming
+OVERHEAD_REASONS_SHOWN = 10 # Most frequent exclusion reasons listed by print_filter_summary (python overhead.py for all rows)
+
+# Quantity in free-text descriptions: the first number (thousands separators allowed) and, when it
+# directly follows, a unit. Units are normalised; "8x4"-style dimensions and "3mm" are not units.
+QUANTITY_PATTERN = re.compile(r'(?P<number>\d[\d,]*\.?\d*)(?:\s*(?P<unit>sheets?|packs?|units?|rolls?|box(?:es)?|each|m|x)\b)?')
+UNIT_ALIASES = {'sheets': 'sheet', 'packs': 'pack', 'units': 'unit', 'rolls': 'roll', 'boxes': 'box', 'x': 'each'}
+
+# --- Helper Functions ---
+def parse_quantity(description):
+    """
+    Attempts to parse a numerical quantity from a string.
+    Handles formats like "1 sheet", "2 packs", "1,000 units".
+    """
+    if pd.isna(description): return np.nan
+    match = QUANTITY_PATTERN.search(str(description).lower())
+    return float(match.group('number').replace(',', '')) if match else np.nan
+
+def extract_quantities(descriptions):
+    """
+    Vectorised parse_quantity over a column, plus the normalised unit. Each distinct description
+    is parsed once (str.extract over the factorized uniques) and the results are mapped back.
+
+    Returns:
+        DataFrame: 'quantity' (float, NaN if no number) and 'unit' (str, '' if none), on descriptions' index.
+    """
+    codes, uniques = pd.factorize(descriptions, sort=False) # Missing descriptions get code -1
+    parts = pd.Series(uniques, dtype=object).astype(str).str.lower().str.extract(QUANTITY_PATTERN)
+    quantity = pd.to_numeric(parts['number'].str.replace(',', '', regex=False), errors='coerce').to_numpy(dtype='float64')
+    unit = parts['unit'].fillna('').replace(UNIT_ALIASES).to_numpy(dtype=object)
+    missing = codes < 0
+    quantity = np.append(quantity, np.nan)[np.where(missing, len(uniques), codes)]
+    unit = np.append(unit, '')[np.where(missing, len(uniques), codes)]
+    return pd.DataFrame({'quantity': quantity, 'unit': unit}, index=descriptions.index)
+
+def find_column(df, candidates, verbose=True):
+    """Finds the first existing column from a list of candidates."""
+    for col in candidates:
+        if col in df.columns:
+            if verbose: print(f"Found column: '{col}' for {', '.join(candidates)}")
+            return col
+    if verbose: print(f"Warning: None of the candidate columns ({', '.join(candidates)}) found.")
+    return None
+
+# --- Cleaning Pipeline ---
+def prepare_purchases(df, verbose=True, source_columns=None, first_row=0):
+    """
+    Column detection, date parsing, quantity resolution and overhead filtering.
+
+    Args:
+        source_columns (dict): Columns already detected on another part of the same file
+            (meta['source_columns']), used instead of detecting them on df.
+        first_row (int): SourceRow of df's first row, when df is a later part of the file.
+
+    Returns:
+        tuple: (filtered DataFrame, meta dict with the resolved column names and row counts)
+    """
+    df = df.copy()
+    df['SourceRow'] = np.arange(first_row, first_row + len(df)) # Position in the source file, kept through filtering
+
+    # Convert date column (falling back to any other column with 'date' in its name)
+    date_col = None
+    if source_columns is not None:
+        date_col = source_columns['date']
+        if date_col: df[date_col] = pd.to_datetime(df[date_col], errors='coerce', dayfirst=True)
+    elif DATE_COLUMN in df.columns:
+        df[DATE_COLUMN] = pd.to_datetime(df[DATE_COLUMN], errors='coerce', dayfirst=True)
+        if not df[DATE_COLUMN].isnull().all(): date_col = DATE_COLUMN
+    if not date_col and source_columns is None:
+        if verbose: print(f"Warning: Primary date column '{DATE_COLUMN}' not found or failed conversion.")
+        for col in df.columns:
+            if col != DATE_COLUMN and 'date' in col.lower():
+                df[col] = pd.to_datetime(df[col], errors='coerce', dayfirst=True)
+                if not df[col].isnull().all():
+                    date_col = col
+                    if verbose: print(f"Using '{col}' as the date column.")
+                    break
+
+    if source_columns is not None:
+        item_col, supplier_col, qty_col_actual, category_col = (source_columns[k] for k in ('item', 'supplier', 'quantity', 'category'))
+    else:
+        item_col = find_column(df, ITEM_COLUMN_CANDIDATES, verbose)
+        supplier_col = find_column(df, SUPPLIER_COLUMN_CANDIDATES, verbose)
+        qty_col_actual = find_column(df, QUANTITY_COLUMN_CANDIDATES, verbose)
+        category_col = find_column(df, CATEGORY_COLUMN_CANDIDATES, verbose)
+
+    # Quantity: dedicated column where present, parsed from the description otherwise
+    with stage('parse quantity'):
+        parsed = extract_quantities(df[item_col]) if item_col else pd.DataFrame({'quantity': np.nan, 'unit': ''}, index=df.index)
+        df['parsed_quantity'] = parsed['quantity']; df['parsed_unit'] = parsed['unit']
+        qty_col = 'parsed_quantity'
+        if qty_col_actual:
+            df[qty_col_actual] = pd.to_numeric(df[qty_col_actual], errors='coerce').fillna(df['parsed_quantity'])
+            qty_col = qty_col_actual
+        df[qty_col] = pd.to_numeric(df[qty_col], errors='coerce')
+
+    # Filtering overheads (reason code per row; see overhead.py)
+    source_rows = len(df)
+    with stage('filter'):
+        reasons = classify(df, item_col, category_col)
+        rows_after_category = source_rows - int(reasons.str.startswith(CATEGORY_REASON + ':').sum())
+        excluded = summarize(reasons)
+        df = df[(reasons == '').to_numpy()]
+
+    meta = {'columns': {'date': date_col, 'item': item_col, 'supplier': supplier_col,
+                        'quantity': qty_col, 'category': category_col},
+            'source_columns': {'date': date_col, 'item': item_col, 'supplier': supplier_col,
+                               'quantity': qty_col_actual, 'category': category_col},
+            'source_rows': source_rows, 'rows_after_category_filter': rows_after_category,
+            'rows_after_keyword_filter': len(df), 'excluded': excluded}
+    return df.reset_index(drop=True), meta
+
+# --- Columnar Cache ---
+def _source_signature(data_file, with_hash=True):
+    stat = os.stat(data_file)
+    signature = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    if with_hash:
+        sha = hashlib.sha256()
+        with open(data_file, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''): sha.update(block)
+        signature['sha256'] = sha.hexdigest()
+    return signature
+
+def _cache_paths(data_file):
+    stem = re.sub(r'[^A-Za-z0-9_.-]+', '_', os.path.basename(data_file))
+    base = os.path.join(CACHE_DIR, stem)
+    return base + ".arrow", base + ".meta.json"
+
+def _read_cache_meta(data_file):
+    """Returns the cache meta if the cache is still valid for the current source file, else None."""
+    arrow_path, meta_path = _cache_paths(data_file)
+    if not (os.path.exists(arrow_path) and os.path.exists(meta_path)): return None
+    try:
+        with open(meta_path) as f: meta = json.load(f)
+    except (OSError, json.JSONDecodeError): return None
+    cached = meta.get('source', {})
+    if meta.get('version') != CACHE_VERSION: return None
+    current = _source_signature(data_file, with_hash=False)
+    if cached.get('size') == current['size'] and cached.get('mtime_ns') == current['mtime_ns']: return meta
+    if cached.get('size') != current['size']: return None
+    # Same size, new mtime (e.g. file copied or touched): fall back to the content hash
+    current = _source_signature(data_file)
+    if cached.get('sha256') != current['sha256']: return None
+    meta['source'] = current
+    with open(meta_path, 'w') as f: json.dump(meta, f, indent=2)
+    return meta
+
+def _write_cache(data_file, df, meta):
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    arrow_path, meta_path = _cache_paths(data_file)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    feather.write_feather(table, arrow_path, compression='uncompressed') # Uncompressed IPC can be memory-mapped
+    meta = dict(meta, version=CACHE_VERSION, source=_source_signature(data_file))
+    with open(meta_path, 'w') as f: json.dump(meta, f, indent=2)
+
+def _resolve_columns(columns, meta):
+    """Maps logical names ('item', 'date', ...) to actual column names; other names pass through."""
+    if columns is None: return None
+    resolved = []
+    for col in columns:
+        actual = meta['columns'][col] if col in meta['columns'] else col
+        if actual and actual not in resolved: resolved.append(actual)
+    return resolved
+
+def load_purchases(columns=None, data_file=DATA_FILE, use_cache=True, verbose=True):
+    """
+    Loads the cleaned, typed and overhead-filtered purchase ledger.
+
+    The first load parses the CSV and writes an Arrow IPC copy to CACHE_DIR; later loads
+    memory-map that copy while the source file's size/mtime (or content hash) is unchanged.
+
+    Args:
+        columns (list): Optional subset to read. Logical names ('date', 'item', 'supplier',
+            'quantity', 'category') are resolved to the detected column names.
+
+    Returns:
+        tuple: (DataFrame, meta dict). meta['columns'] maps logical names to column names.
+    Raises:
+        FileNotFoundError: If data_file does not exist.
+    """
+    if not os.path.exists(data_file): raise FileNotFoundError(data_file)
+    if use_cache:
+        meta = _read_cache_meta(data_file)
+        if meta is not None:
+            try:
+                import pyarrow.feather as feather
+                with stage('load'):
+                    table = feather.read_table(_cache_paths(data_file)[0], columns=_resolve_columns(columns, meta), memory_map=True)
+                    df = table.to_pandas()
+                if verbose: print(f"Loaded '{data_file}' from columnar cache ({table.num_rows} rows).")
+                return df, meta
+            except Exception as e:
+                if verbose: print(f"Warning: Could not read purchase cache ({e}). Rebuilding.")
+
+    with stage('load'): raw = pd.read_csv(data_file)
+    df, meta = prepare_purchases(raw, verbose=verbose)
+    if verbose: print(f"Successfully loaded '{data_file}'.")
+    if use_cache:
+        try:
+            with stage('write'): _write_cache(data_file, df, meta)
+        except ImportError:
+            if verbose: print("Note: pyarrow not installed; purchase cache disabled (pip install pyarrow).")
+        except Exception as e:
+            if verbose: print(f"Warning: Could not write purchase cache: {e}")
+    cols = _resolve_columns(columns, meta)
+    return (df[cols] if cols else df), meta
+
+# --- Streaming Ingest ---
+def streaming_requested(data_file=DATA_FILE, argv=None):
+    """True if the script was started with --stream or the ledger is larger than STREAM_THRESHOLD_MB."""
+    argv = sys.argv[1:] if argv is None else argv
+    if '--stream' in argv: return True
+    try: return os.path.getsize(data_file) > STREAM_THRESHOLD_MB * 1024 * 1024
+    except OSError: return False
+
+def iter_purchases(columns=None, data_file=DATA_FILE, chunksize=STREAM_CHUNK_ROWS, verbose=True):
+    """
+    Streams the cleaned, typed and overhead-filtered ledger in chunks of `chunksize` source rows, so
+    memory is bounded by the chunk size rather than the file. Columns are detected once, on the first
+    STREAM_SAMPLE_ROWS rows, and only the columns needed for them (plus `columns`) are read.
+
+    Args:
+        columns (list): As for load_purchases.
+
+    Yields:
+        tuple: (filtered chunk DataFrame, meta dict for the chunk). Combine metas with combine_meta.
+    Raises:
+        FileNotFoundError: If data_file does not exist.
+    """
+    if not os.path.exists(data_file): raise FileNotFoundError(data_file)
+    with stage('load'): sample = pd.read_csv(data_file, nrows=STREAM_SAMPLE_ROWS)
+    source_columns = prepare_purchases(sample, verbose=verbose)[1]['source_columns']
+    text_columns = [source_columns[k] for k in ('item', 'supplier', 'category') if source_columns[k]]
+    extra = [col for col in (columns or []) if col in sample.columns and col not in ('SourceRow',)]
+    usecols = list(dict.fromkeys([col for col in source_columns.values() if col] + extra))
+    first_row = 0
+    with pd.read_csv(data_file, chunksize=chunksize, usecols=usecols, dtype={col: str for col in text_columns}) as reader:
+        while True:
+            with stage('load'): raw = next(reader, None)
+            if raw is None: break
+            df, meta = prepare_purchases(raw, verbose=False, source_columns=source_columns, first_row=first_row)
+            first_row += len(raw)
+            cols = _resolve_columns(columns, meta)
+            yield (df[cols] if cols else df), meta
+
+def load_purchases_streamed(columns=None, data_file=DATA_FILE, chunksize=STREAM_CHUNK_ROWS, verbose=True):
+    """
+    load_purchases for ledgers too large to parse in one go: built from iter_purchases chunks. Text
+    columns (item, supplier, category) are categorical per chunk and then expanded to object columns
+    that point at one shared string per distinct value, so peak memory is one raw chunk plus the
+    compact result instead of a string object per cell. Not cached.
+
+    Returns:
+        tuple: (DataFrame, meta dict), as load_purchases.
+    """
+    parts = []; metas = []
+    for df, meta in iter_purchases(columns, data_file, chunksize, verbose):
+        text_columns = [meta['columns'][k] for k in ('item', 'supplier', 'category') if meta['columns'][k] in df.columns]
+        parts.append(df.astype({col: 'category' for col in text_columns})); metas.append(meta)
+    meta = combine_meta(metas)
+    if meta is None: raise ValueError(f"'{data_file}' has no rows")
+    if verbose: print(f"Streamed '{data_file}' in {len(parts)} chunk(s) ({meta['source_rows']} rows).")
+    combined = pd.concat(parts, ignore_index=True)
+    for col in text_columns: # Chunks have different categories; concat alone would copy every string
+        combined[col] = np.asarray(union_categoricals([part[col] for part in parts]), dtype=object)
+    return combined, meta
+
+def combine_meta(metas):
+    """Meta for the whole file from the per-chunk metas of iter_purchases."""
+    if not metas: return None
+    combined = dict(metas[0], excluded={})
+    for key in ('source_rows', 'rows_after_category_filter', 'rows_after_keyword_filter'): combined[key] = sum(meta[key] for meta in metas)
+    excluded = {}
+    for meta in metas:
+        for reason, count in meta.get('excluded', {}).items(): excluded[reason] = excluded.get(reason, 0) + count
+    combined['excluded'] = dict(sorted(excluded.items(), key=lambda item: -item[1]))
+    return combined
+
+def print_filter_summary(meta):
+    print(f"Rows after category filtering: {meta['rows_after_category_filter']}")
+    print(f"Rows after item keyword filtering: {meta['rows_after_keyword_filter']}")
+    print(f"Total rows removed as overhead: {meta['source_rows'] - meta['rows_after_keyword_filter']}")
+    for reason, count in list(meta.get('excluded', {}).items())[:OVERHEAD_REASONS_SHOWN]: print(f"  {reason}: {count}")
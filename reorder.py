@@ -0,0 +1,131 @@
+import numpy as np
+import pandas as pd
+
+# Columns copied from the supplier record onto every order line
+SUPPLIER_COLUMNS = ['SupplierName', 'OrderMethod', 'Email', 'Phone', 'Website']
+ON_ORDER_STATUS = 'ordered' # order_history Status (lower-cased) of lines placed but not yet received
+# Logged OrderMethods (lower-cased) of POs that never reached the supplier: main.py's and the GUI's
+# failures ('failed_email_no_address', 'email_failed_content', the outbox's 'email_failed_send', ...)
+# and unknown methods left for manual review. Their lines do not count as on order.
+UNPLACED_METHOD_PATTERN = r'fail|^manual_review'
+LINE_COLUMNS = ['MaterialID', 'MaterialName', 'CurrentStock', 'ReorderPoint', 'QuantityOrdered',
+                'UnitPricePaid', 'TotalPricePaid', 'ProductPageURL', 'SupplierID'] + SUPPLIER_COLUMNS
+
+def _text(df, column, strip=False):
+    if column not in df.columns: return pd.Series('', index=df.index, dtype=object)
+    values = df[column]
+    if isinstance(values.dtype, pd.CategoricalDtype): values = values.astype(object)
+    values = values.where(values.notna(), '').astype(str)
+    return values.str.strip() if strip else values
+
+def _number(df, column, default):
+    if column not in df.columns: return pd.Series(default, index=df.index, dtype='float64')
+    return pd.to_numeric(df[column], errors='coerce').astype('float64').fillna(default)
+
+def _per_distinct(values, func):
+    """func applied once per distinct value (categorical in the typed frames), spread back to the rows; missing -> False."""
+    codes, uniques = pd.factorize(values)
+    return np.append(np.asarray(func(pd.Index(uniques).astype(str).str.strip().str.lower()), dtype=bool), False)[codes]
+
+def placed_methods(methods):
+    """True for logged OrderMethods of POs that reached the supplier (or are on their way to it)."""
+    return _per_distinct(methods, lambda values: ~values.str.contains(UNPLACED_METHOD_PATTERN))
+
+def quantity_on_order(history_df):
+    """
+    QuantityOrdered per MaterialID over the order_history lines still on order: Status 'Ordered'
+    and an OrderMethod under which the PO was actually placed (not failed or left for review).
+    """
+    if history_df is None or history_df.empty: return pd.Series(dtype='float64')
+    on_order = _per_distinct(history_df['Status'], lambda statuses: statuses == ON_ORDER_STATUS)
+    lines = history_df[on_order & placed_methods(history_df['OrderMethod'])]
+    quantity = pd.to_numeric(lines['QuantityOrdered'], errors='coerce').astype('float64').fillna(0.0)
+    return quantity.groupby(_text(lines, 'MaterialID').to_numpy(), sort=False).sum()
+
+def find_reorder_candidates(materials_df, on_order=None):
+    """
+    Column-wise reorder check: every material whose CurrentStock plus the quantity already on order
+    (on_order, a Series by MaterialID as from quantity_on_order) is below its ReorderPoint.
+    A missing ReorderPoint never triggers a reorder; materials with a missing or non-numeric
+    CurrentStock are not checked at all.
+
+    Returns:
+        tuple: (orderable lines DataFrame, skipped lines DataFrame, invalid stock DataFrame). Lines
+        without a preferred supplier or with a non-positive StandardOrderQuantity are skipped; the
+        invalid stock frame holds 'MaterialID' and 'MaterialName' of the materials not checked.
+    """
+    stock = _number(materials_df, 'CurrentStock', np.nan).to_numpy()
+    rop = _number(materials_df, 'ReorderPoint', np.inf).to_numpy()
+    invalid = np.isnan(stock)
+    pending = 0.0 if on_order is None or on_order.empty else _text(materials_df, 'MaterialID').map(on_order).fillna(0.0).to_numpy(dtype='float64')
+    below = stock + pending < rop # False for a missing stock
+    invalid_df = materials_df[invalid]
+    invalid_stock = pd.DataFrame({'MaterialID': _text(invalid_df, 'MaterialID'), 'MaterialName': _text(invalid_df, 'MaterialName')}).reset_index(drop=True)
+    below_df = materials_df[below]
+    lines = pd.DataFrame({
+        'MaterialID': _text(below_df, 'MaterialID'), 'MaterialName': _text(below_df, 'MaterialName'),
+        'CurrentStock': stock[below], 'ReorderPoint': rop[below],
+        'QuantityOrdered': _number(below_df, 'StandardOrderQuantity', 0.0),
+        'UnitPricePaid': _number(below_df, 'CurrentPrice', 0.0),
+        'ProductPageURL': _text(below_df, 'ProductPageURL', strip=True), 'SupplierID': _text(below_df, 'PreferredSupplierID', strip=True),
+    }).reset_index(drop=True)
+    lines['TotalPricePaid'] = lines['QuantityOrdered'] * lines['UnitPricePaid']
+    orderable = (lines['SupplierID'] != '') & (lines['QuantityOrdered'] > 0)
+    return lines[orderable].reset_index(drop=True), lines[~orderable].reset_index(drop=True), invalid_stock
+
+def plan_reorders(materials_df, suppliers_df, history_df=None):
+    """
+    Builds the reorder plan shared by main.main() and the GUI's draft orders. With history_df (the
+    order_history table), quantities still on order count towards stock, so a material is not
+    ordered again while its last order is in transit.
+
+    Suppliers are joined with a single merge (first record wins for duplicate SupplierIDs) and
+    lines are grouped by supplier in the order each supplier first appears in the materials file.
+
+    Returns:
+        dict: 'lines' (orderable lines with supplier details, grouped by supplier),
+              'suppliers' (one row per supplier: details, 'Start' and 'LineCount' into 'lines'),
+              'skipped' (below ROP but missing supplier/quantity),
+              'invalid_stock' (materials not checked: missing or non-numeric CurrentStock),
+              'unknown_suppliers' (lines whose SupplierID is not in the suppliers table),
+              'checked' (number of materials evaluated).
+    """
+    candidates, skipped, invalid_stock = find_reorder_candidates(materials_df, quantity_on_order(history_df))
+    supplier_info = pd.DataFrame({'SupplierID': _text(suppliers_df, 'SupplierID')})
+    for col in SUPPLIER_COLUMNS:
+        supplier_info[col] = suppliers_df[col].where(suppliers_df[col].notna(), '').astype(str) if col in suppliers_df.columns else ''
+    supplier_info = supplier_info.drop_duplicates('SupplierID', keep='first')
+    merged = candidates.merge(supplier_info, on='SupplierID', how='left', indicator=True, sort=False)
+    known = (merged.pop('_merge') == 'both').to_numpy()
+    unknown = merged[~known][candidates.columns].reset_index(drop=True)
+    lines = merged[known]
+
+    # Stable sort by first appearance of each supplier keeps the material order within a supplier
+    codes, supplier_ids = pd.factorize(lines['SupplierID'])
+    order = np.argsort(codes, kind='stable')
+    lines = lines.iloc[order][LINE_COLUMNS].reset_index(drop=True)
+    counts = np.bincount(codes, minlength=len(supplier_ids))
+    suppliers = lines.drop_duplicates('SupplierID')[['SupplierID'] + SUPPLIER_COLUMNS].reset_index(drop=True)
+    suppliers['Start'] = np.concatenate(([0], np.cumsum(counts)[:-1])) if len(counts) else np.array([], dtype=int)
+    suppliers['LineCount'] = counts
+    return {'lines': lines, 'suppliers': suppliers, 'skipped': skipped, 'invalid_stock': invalid_stock,
+            'unknown_suppliers': unknown, 'checked': len(materials_df)}
+
+def proposed_orders_frame(plan):
+    """
+    The GUI's draft-order rows for a plan: lines renamed for display plus the normalised
+    OrderMethod, an ActionDetails text and the URL behind the "Open Link" column.
+    """
+    lines = plan['lines']; or_na = lambda col: lines[col].where(lines[col] != '', 'N/A')
+    method = or_na('OrderMethod').str.lower().str.strip()
+    url = lines['ProductPageURL'].where(lines['ProductPageURL'] != '', lines['Website']).where(method == 'online', '')
+    action = np.select([method == 'email', method == 'online', method == 'phone'],
+                       ["Email: " + or_na('Email'), "Online order at: " + url.where(url != '', 'N/A'), "Phone: " + or_na('Phone')], "Manual Review")
+    proposed = lines.rename(columns={'QuantityOrdered': 'OrderQty', 'UnitPricePaid': 'Unit Price', 'TotalPricePaid': 'Total Price'})
+    return proposed.assign(OrderMethod=method, ActionDetails=action, OpenURL=url, **{"Open Link": np.where(url != '', "Open", "")})
+
+def iter_supplier_orders(plan):
+    """Yields (supplier record as dict, that supplier's lines as a DataFrame) from a plan."""
+    lines = plan['lines']
+    for supplier in plan['suppliers'].to_dict('records'):
+        yield supplier, lines.iloc[supplier['Start']:supplier['Start'] + supplier['LineCount']]
@@ -0,0 +1,52 @@
+import json
+import hashlib
+from datetime import datetime
+import pandas as pd
+
+from storage import TIMESTAMP_FORMAT
+from data_access import load_table, append_rows
+
+# Run journal for main.main(). Each supplier PO gets an idempotency key derived from its content
+# (supplier + material/quantity lines). A 'planned' entry carrying the lines and the OrderID the PO
+# will use is appended before anything is dispatched, and a 'completed' entry once its history
+# lines are logged, so after a crash the journal says exactly which POs may be half done.
+# Entries are single O_APPEND writes: an entry is either wholly in the journal or not at all.
+# The journal is for crash recovery only: what is already on order is read from order_history
+# (reorder.quantity_on_order), not from here.
+PLANNED, COMPLETED = 'planned', 'completed'
+LINE_FIELDS = ['MaterialID', 'MaterialName', 'QuantityOrdered', 'UnitPricePaid', 'TotalPricePaid', 'ProductPageURL']
+
+def generate_run_id():
+    return f"RUN-{datetime.now().strftime('%Y%m%d-%H%M%S%f')[:-3]}"
+
+def idempotency_key(supplier_id, lines):
+    """Same supplier, materials and quantities -> same key, whatever the line order."""
+    parts = sorted(f"{m}={q:g}" for m, q in zip(lines['MaterialID'].astype(str), lines['QuantityOrdered'].astype(float)))
+    return hashlib.sha256("|".join([str(supplier_id)] + parts).encode()).hexdigest()[:20]
+
+def record(run_id, key, order_id, supplier_id, stage, lines=None, detail=''):
+    append_rows('order_runs', [{'RunID': run_id, 'Timestamp': datetime.now().strftime(TIMESTAMP_FORMAT), 'IdempotencyKey': key,
+                                'OrderID': order_id, 'SupplierID': supplier_id, 'Stage': stage, 'Detail': detail,
+                                'Lines': '' if lines is None else json.dumps(lines[LINE_FIELDS].to_dict('records'))}])
+
+def journal_state():
+    """Latest journal entry per IdempotencyKey, indexed by key."""
+    journal = load_table('order_runs', create_if_missing=True)
+    return journal.drop_duplicates('IdempotencyKey', keep='last').set_index('IdempotencyKey')
+
+def prior_order(state, supplier_id):
+    """
+    Returns an interrupted ('planned') journal entry for the supplier, or None. Any such entry blocks
+    new POs to that supplier until a resume finishes it, whatever their lines: the interrupted PO may
+    already be on its way (e.g. its email queued), and a changed plan would give a new PO a new key.
+    """
+    interrupted = state[(state['Stage'] == PLANNED) & (state['SupplierID'].astype(str) == str(supplier_id))]
+    return None if interrupted.empty else interrupted.iloc[-1]
+
+def interrupted_orders(state=None):
+    """Planned POs that never completed (oldest first), with IdempotencyKey as a column."""
+    state = journal_state() if state is None else state
+    return state[state['Stage'] == PLANNED].reset_index().sort_values('Timestamp', kind='stable')
+
+def planned_lines(entry):
+    return pd.DataFrame(json.loads(entry['Lines'] or '[]'), columns=LINE_FIELDS)
@@ -0,0 +1,93 @@
+import os
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+from forecasting import demand_blocks, demand_days
+
+# Monte Carlo safety stock (used by logic.py). For every material, SIMULATION_SCENARIOS scenarios of
+# demand over the replenishment lead time are drawn at once: the lead time varies around its nominal
+# value (normal, LEAD_TIME_CV) and the demand is that many consecutive days of the material's own
+# daily history, starting at a random day (circular), so bursts and idle spells are kept. The reorder
+# point is the SERVICE_LEVEL quantile of lead-time demand (the chance of not running out before a
+# replenishment arrives) and the safety stock its excess over the mean. Daily histories are taken as
+# cumulative sums, which turns each scenario's window sum into two lookups; the arrays are then
+# materials x scenarios per block of SIMULATION_BLOCK_MATERIALS, simulated on a process pool.
+# Each material's draws are seeded from SIMULATION_SEED and its name, so results do not depend on
+# the worker count or on which other materials are simulated alongside (incremental runs match full).
+SERVICE_LEVEL = float(os.environ.get('PROCUREMENT_SERVICE_LEVEL', 0.95))
+SIMULATION_SCENARIOS = int(os.environ.get('PROCUREMENT_SIMULATION_SCENARIOS', 10000)) # Per material
+SIMULATION_SEED = int(os.environ.get('PROCUREMENT_SIMULATION_SEED', 42))
+LEAD_TIME_CV = float(os.environ.get('PROCUREMENT_LEAD_TIME_CV', 0.25)) # Lead time std / mean
+SIMULATION_WORKERS = int(os.environ.get('PROCUREMENT_SIMULATION_WORKERS', os.cpu_count() or 1))
+SIMULATION_BLOCK_MATERIALS = 500 # Materials per pool task
+SIMULATION_COLUMNS = ['LeadTimeDemand', 'SafetyStock', 'ReorderPoint']
+
+def scenario_draws(materials, scenarios=SIMULATION_SCENARIOS, seed=SIMULATION_SEED):
+    """Uniform and standard normal draws, materials x scenarios each, from one generator per material."""
+    uniform = np.empty((len(materials), scenarios)); normal = np.empty((len(materials), scenarios))
+    for i, material in enumerate(materials):
+        rng = np.random.default_rng([seed, zlib.crc32(str(material).encode())])
+        uniform[i] = rng.random(scenarios); normal[i] = rng.standard_normal(scenarios)
+    return uniform, normal
+
+def lead_time_demand(demand, lead_time_days, uniform, normal, lead_time_cv=LEAD_TIME_CV):
+    """
+    Demand over the lead time per material and scenario.
+
+    Args:
+        demand (ndarray): Daily demand, materials x days.
+        lead_time_days (ndarray): Nominal lead time per material.
+        uniform, normal (ndarray): scenario_draws() for these materials; pick the start day and the lead time.
+
+    Returns:
+        ndarray: materials x scenarios.
+    """
+    materials, days = demand.shape
+    lead = np.clip(np.rint(lead_time_days[:, None] * (1 + lead_time_cv * normal)), 1, days).astype(np.int64)
+    start = np.minimum((uniform * days).astype(np.int64), days - 1)
+    cumulative = np.zeros((materials, 2 * days + 1)) # History twice over: windows wrap around its end
+    np.cumsum(np.concatenate([demand, demand], axis=1), axis=1, out=cumulative[:, 1:])
+    rows = np.arange(materials)[:, None]
+    return cumulative[rows, start + lead] - cumulative[rows, start]
+
+def _simulate_block(task):
+    materials, demand, lead_time_days, service_level, scenarios, seed, lead_time_cv = task
+    uniform, normal = scenario_draws(materials, scenarios, seed)
+    simulated = lead_time_demand(demand, lead_time_days, uniform, normal, lead_time_cv)
+    mean = simulated.mean(axis=1); reorder_point = np.maximum(np.quantile(simulated, service_level, axis=1), mean)
+    return np.column_stack([mean, reorder_point - mean, reorder_point])
+
+def simulate_safety_stock(daily, lead_time_days, days=None, service_level=SERVICE_LEVEL, scenarios=SIMULATION_SCENARIOS,
+                          seed=SIMULATION_SEED, lead_time_cv=LEAD_TIME_CV, workers=SIMULATION_WORKERS):
+    """
+    Safety stock and reorder point per material for a target service level.
+
+    Args:
+        daily (DataFrame): 'RawMaterial', 'Day' and 'Quantity' (as for forecasting.forecast_demand).
+        lead_time_days (float or Series): Nominal lead time, for all materials or per material (by name).
+        days (DatetimeIndex, optional): The history window. Defaults to forecasting.demand_days(daily).
+        workers (int): Pool size; 1 simulates in this process.
+
+    Returns:
+        DataFrame: Indexed by RawMaterial, SIMULATION_COLUMNS (the mean lead-time demand, safety stock
+            and reorder point). The reorder point is never below the mean lead-time demand.
+    """
+    if daily.empty: return pd.DataFrame(columns=SIMULATION_COLUMNS, index=pd.Index([], name='RawMaterial'))
+    days = demand_days(daily) if days is None else days
+    materials, blocks = demand_blocks(daily, days, SIMULATION_BLOCK_MATERIALS)
+    if isinstance(lead_time_days, pd.Series): lead = lead_time_days.reindex(materials).to_numpy(dtype='float64')
+    else: lead = np.full(len(materials), float(lead_time_days))
+    tasks = ((materials[first:last], demand, lead[first:last], service_level, scenarios, seed, lead_time_cv) for first, last, demand in blocks)
+
+    if workers <= 1 or len(materials) <= SIMULATION_BLOCK_MATERIALS: results = [_simulate_block(task) for task in tasks]
+    else:
+        results = []; pending = deque()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for task in tasks: # At most two blocks per worker in flight, so memory stays bounded
+                pending.append(pool.submit(_simulate_block, task))
+                if len(pending) >= 2 * workers: results.append(pending.popleft().result())
+            results.extend(future.result() for future in pending)
+    return pd.DataFrame(np.concatenate(results), columns=SIMULATION_COLUMNS, index=pd.Index(materials, name='RawMaterial'))
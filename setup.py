@@ -2,7 +2,7 @@ import os
 
 # Define the necessary libraries
 import os
-requirements = ["pandas", "numpy", "matplotlib", "seaborn", "PyQt6"] # Added PyQt6
+requirements = ["pandas", "numpy", "matplotlib", "seaborn", "PyQt6", "pyarrow"] # Added PyQt6; pyarrow for the purchase cache
 requirements_file = "requirements.txt"
 try:
     with open(requirements_file, "w") as f:
@@ -0,0 +1,158 @@
+import os
+import pandas as pd
+from datetime import datetime
+from storage import get_storage
+from write_coordinator import append_records
+
+# stock_movements is the source of truth for stock levels. It is append-only; current
+# stock is the latest checkpoint snapshot plus the movements appended after it.
+SNAPSHOT_DIR = "stock_snapshots"
+SNAPSHOT_INDEX_FILE = os.path.join(SNAPSHOT_DIR, "index.csv")
+SNAPSHOT_INDEX_HEADERS = ['SnapshotID', 'Timestamp', 'Backend', 'LedgerPosition', 'File']
+SNAPSHOT_INTERVAL = int(os.environ.get('PROCUREMENT_SNAPSHOT_INTERVAL', 500)) # Movements between checkpoints
+LEDGER_TABLE = 'stock_movements'
+
+def generate_movement_id(): return f"SM-{datetime.now().strftime('%Y%m%d-%H%M%S%f')[:-3]}"
+
+# --- Snapshots ---
+def _load_snapshot_index():
+    if not os.path.exists(SNAPSHOT_INDEX_FILE): return pd.DataFrame(columns=SNAPSHOT_INDEX_HEADERS)
+    index = pd.read_csv(SNAPSHOT_INDEX_FILE, dtype=str).fillna('')
+    index = index[index['Backend'] == get_storage().name].copy()
+    index['LedgerPosition'] = index['LedgerPosition'].astype(int)
+    index['_ts'] = pd.to_datetime(index['Timestamp'], errors='coerce')
+    return index.reset_index(drop=True)
+
+def _find_snapshots(as_of=None):
+    """Returns (latest snapshot at or before as_of, the next snapshot after it) as index rows or None."""
+    index = _load_snapshot_index()
+    if index.empty: return None, None
+    if as_of is None: return index.iloc[-1], None
+    before = index[index['_ts'] <= as_of]; after = index[index['_ts'] > as_of]
+    return (before.iloc[-1] if not before.empty else None), (after.iloc[0] if not after.empty else None)
+
+def _load_snapshot_levels(snapshot):
+    levels = pd.read_csv(os.path.join(SNAPSHOT_DIR, snapshot['File']), dtype={'MaterialID': str})
+    return levels.set_index('MaterialID')['StockLevel'].astype(float)
+
+def _write_snapshot(levels, position, timestamp):
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    snapshot_id = f"SNAP-{datetime.now().strftime('%Y%m%d-%H%M%S%f')}"
+    file_name = f"{snapshot_id}.csv"
+    levels.rename('StockLevel').rename_axis('MaterialID').reset_index().to_csv(os.path.join(SNAPSHOT_DIR, file_name), index=False)
+    entry = pd.DataFrame([{'SnapshotID': snapshot_id, 'Timestamp': timestamp, 'Backend': get_storage().name,
+                           'LedgerPosition': position, 'File': file_name}], columns=SNAPSHOT_INDEX_HEADERS)
+    append_records(SNAPSHOT_INDEX_FILE, entry.to_csv(index=False, header=False, lineterminator="\n").encode(),
+                   header=(",".join(SNAPSHOT_INDEX_HEADERS) + "\n").encode())
+
+# --- Replay ---
+def levels_from_movements(movements):
+    """Bootstrap for ledgers without a snapshot: each material's last recorded NewStockLevel
+    (falling back to the sum of its changes for rows that never recorded one)."""
+    if movements.empty: return pd.Series(dtype=float)
+    material_ids = movements['MaterialID'].astype(str)
+    last_level = movements['NewStockLevel'].groupby(material_ids).last()
+    summed = movements['ChangeInQuantity'].fillna(0).groupby(material_ids).sum()
+    return last_level.combine_first(summed).astype(float)
+
+def _apply_tail(levels, tail):
+    if tail.empty: return levels
+    changes = tail['ChangeInQuantity'].fillna(0).groupby(tail['MaterialID'].astype(str)).sum()
+    return levels.add(changes, fill_value=0)
+
+def _timestamp_str(ts): return ts.strftime("%Y-%m-%d %H:%M:%S") if pd.notna(ts) else ''
+
+def _replay(as_of=None):
+    """Returns (levels, tail_length, ledger_end_position, last_timestamp) as of a time (None = now)."""
+    storage = get_storage()
+    snapshot, next_snapshot = _find_snapshots(as_of)
+    end = int(next_snapshot['LedgerPosition']) if next_snapshot is not None else None
+    if snapshot is None:
+        movements, end_pos = storage.read_range(LEDGER_TABLE, 0, end)
+        if as_of is not None: movements = movements[movements['Timestamp'] <= as_of]
+        levels = levels_from_movements(movements)
+        last_ts = _timestamp_str(movements['Timestamp'].iloc[-1]) if not movements.empty else ''
+        if as_of is None and not movements.empty: # Checkpoint once so later reads only touch the tail
+            _write_snapshot(levels, end_pos, last_ts)
+        return levels, 0, end_pos, last_ts
+    levels = _load_snapshot_levels(snapshot)
+    tail, end_pos = storage.read_range(LEDGER_TABLE, int(snapshot['LedgerPosition']), end)
+    if as_of is not None: tail = tail[tail['Timestamp'] <= as_of]
+    last_ts = _timestamp_str(tail['Timestamp'].iloc[-1]) if not tail.empty else snapshot['Timestamp']
+    return _apply_tail(levels, tail), len(tail), end_pos, last_ts
+
+def current_stock_levels():
+    """Stock level per MaterialID (float Series): latest snapshot plus the ledger tail."""
+    return _replay()[0]
+
+def stock_as_of(timestamp):
+    """Stock level per MaterialID at a point in time. Reads at most one snapshot interval of the ledger."""
+    return _replay(pd.Timestamp(timestamp))[0]
+
+def checkpoint():
+    """Writes a snapshot of the current levels at the current end of the ledger."""
+    levels, tail_len, end_pos, last_ts = _replay()
+    if tail_len: _write_snapshot(levels, end_pos, last_ts)
+    return levels
+
+# --- Recording movements ---
+def record_movements(movements, tail_length=None):
+    """Appends movements (list of dicts) to the ledger and checkpoints when the tail gets long."""
+    get_storage().append(LEDGER_TABLE, movements)
+    if tail_length is None: tail_length = _replay()[1]
+    else: tail_length += len(movements)
+    if tail_length >= SNAPSHOT_INTERVAL: checkpoint()
+
+def _movement(material_id, material_name, change, new_level, reason, related_order_id='', timestamp=None):
+    return {'MovementID': generate_movement_id(), 'Timestamp': timestamp or datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'MaterialID': material_id, 'MaterialName': material_name, 'ChangeInQuantity': float(change),
+            'NewStockLevel': float(new_level), 'Reason': reason, 'RelatedOrderID': related_order_id}
+
+def _opening_movements(levels, material_id, material_name, opening_stock, timestamp):
+    """Materials without ledger history get an opening-balance movement from the master file value."""
+    if material_id in levels.index: return float(levels[material_id]), []
+    opening = float(opening_stock or 0)
+    movement = _movement(material_id, material_name, opening, opening, "Opening Balance", timestamp=timestamp)
+    movement['MovementID'] += "-OB" # Keeps it distinct from the movement recorded in the same millisecond
+    return opening, [movement]
+
+def record_change(material_id, material_name, change, reason, related_order_id='', opening_stock=0):
+    """Records a stock change as a single ledger append. Returns the new stock level."""
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    levels, tail_length, _, _ = _replay()
+    level, movements = _opening_movements(levels, material_id, material_name, opening_stock, timestamp)
+    new_level = level + float(change)
+    movements.append(_movement(material_id, material_name, change, new_level, reason, related_order_id, timestamp))
+    record_movements(movements, tail_length)
+    return new_level
+
+def record_receipt(material_id, material_name, quantity, order_id, opening_stock=0):
+    return record_change(material_id, material_name, quantity, f"Order Received PO: {order_id}", order_id, opening_stock)
+
+def set_stock_level(material_id, material_name, new_level, reason="Manual Adjustment", opening_stock=0):
+    """Records the adjustment needed to bring a material to new_level (e.g. after a stock count)."""
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    levels, tail_length, _, _ = _replay()
+    if material_id not in levels.index and float(opening_stock or 0) == float(new_level):
+        return float(new_level) # No history and no change: the master file value still stands
+    level, movements = _opening_movements(levels, material_id, material_name, opening_stock, timestamp)
+    change = float(new_level) - level
+    if change: movements.append(_movement(material_id, material_name, change, new_level, reason, timestamp=timestamp))
+    if movements: record_movements(movements, tail_length)
+    return float(new_level)
+
+def apply_ledger_stock(materials_df, levels=None):
+    """Overlays ledger-derived CurrentStock onto a materials frame (materials without history keep their value)."""
+    if materials_df.empty: return materials_df
+    levels = current_stock_levels() if levels is None else levels
+    if levels.empty: return materials_df
+    derived = materials_df['MaterialID'].map(levels)
+    has_level = derived.notna()
+    if has_level.any():
+        materials_df = materials_df.copy()
+        materials_df.loc[has_level, 'CurrentStock'] = derived[has_level]
+    return materials_df
+
+if __name__ == "__main__":
+    levels = checkpoint()
+    print(f"Checkpointed stock levels for {len(levels)} material(s).")
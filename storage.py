@@ -0,0 +1,458 @@
+import io
+import os
+import time
+import random
+import sys
+import sqlite3
+import threading
+import numpy as np
+import pandas as pd
+from write_coordinator import (file_signature, file_lock, append_records, replace_file,
+                               ConcurrentModificationError)
+
+# --- Storage Configuration ---
+# 'csv' keeps the original flat files; 'sqlite' stores every table in one WAL-mode database.
+STORAGE_BACKEND = os.environ.get('PROCUREMENT_STORAGE_BACKEND', 'csv').lower().strip()
+SQLITE_DB_FILE = os.environ.get('PROCUREMENT_DB_FILE', 'procurement.db')
+OPTIMISTIC_RETRIES = 5 # Re-applies of an upsert/delete that lost a race with another writer
+
+MATERIALS_FILE = "materials_master.csv"
+SUPPLIERS_FILE = "suppliers.csv"
+ORDER_HISTORY_FILE = "order_history.csv"
+STOCK_MOVEMENTS_FILE = "stock_movements.csv"
+EMAIL_OUTBOX_FILE = "email_outbox.csv"
+ORDER_RUNS_FILE = "order_runs.csv"
+PRICE_TIERS_FILE = "price_tiers.csv"
+
+MATERIALS_HEADERS = ['MaterialID', 'MaterialName', 'Category', 'UnitOfMeasure', 'CurrentStock',
+                     'ReorderPoint', 'StandardOrderQuantity', 'PreferredSupplierID',
+                     'ProductPageURL', 'LeadTimeDays', 'SafetyStockQuantity', 'Notes', 'CurrentPrice']
+SUPPLIERS_HEADERS = ['SupplierID', 'SupplierName', 'ContactPerson', 'Email', 'Phone', 'Website', 'OrderMethod']
+ORDER_HISTORY_HEADERS = ['OrderID', 'Timestamp', 'MaterialID', 'MaterialName', 'QuantityOrdered',
+                         'UnitPricePaid', 'TotalPricePaid', 'SupplierID', 'SupplierName',
+                         'OrderMethod', 'Status', 'Notes']
+STOCK_MOVEMENTS_HEADERS = ['MovementID', 'Timestamp', 'MaterialID', 'MaterialName',
+                           'ChangeInQuantity', 'NewStockLevel', 'Reason', 'RelatedOrderID']
+EMAIL_OUTBOX_HEADERS = ['MessageID', 'Created', 'OrderID', 'SupplierID', 'Recipient', 'Subject', 'Body',
+                        'Status', 'Attempts', 'NextAttemptAt', 'LastAttemptAt', 'LastError']
+ORDER_RUNS_HEADERS = ['RunID', 'Timestamp', 'IdempotencyKey', 'OrderID', 'SupplierID', 'Stage', 'Lines', 'Detail']
+PRICE_TIERS_HEADERS = ['MaterialID', 'SupplierID', 'MinQuantity', 'UnitPrice'] # Quantity breaks; blank SupplierID = any supplier
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Logical tables. 'key' columns identify a row for upserts/deletes (None = append-only),
+# 'indexes' are the extra lookup columns indexed in the SQLite backend and 'types' is the
+# in-memory schema (columns not listed are 'text').
+#   text     -> str, '' when missing
+#   id       -> category, '' when missing (repeated IDs/labels in the bulk history tables)
+#   float    -> float64, NaN when missing
+#   int      -> Int64, <NA> when missing
+#   datetime -> datetime64, NaT when missing
+# IDs in materials/suppliers stay 'text': those frames are edited row by row in the GUIs and
+# their keys are unique, so categories would save nothing.
+TABLES = {
+    'materials': {'file': MATERIALS_FILE, 'headers': MATERIALS_HEADERS,
+                  'key': ['MaterialID'], 'indexes': ['PreferredSupplierID'],
+                  'types': {'CurrentStock': 'float', 'ReorderPoint': 'float', 'StandardOrderQuantity': 'float',
+                            'LeadTimeDays': 'int', 'SafetyStockQuantity': 'float', 'CurrentPrice': 'float'}},
+    'suppliers': {'file': SUPPLIERS_FILE, 'headers': SUPPLIERS_HEADERS,
+                  'key': ['SupplierID'], 'indexes': [], 'types': {}},
+    'order_history': {'file': ORDER_HISTORY_FILE, 'headers': ORDER_HISTORY_HEADERS,
+                      'key': ['OrderID', 'MaterialID'], 'indexes': ['OrderID', 'MaterialID', 'SupplierID', 'Status'],
+                      'types': {'OrderID': 'id', 'Timestamp': 'datetime', 'MaterialID': 'id', 'QuantityOrdered': 'float',
+                                'UnitPricePaid': 'float', 'TotalPricePaid': 'float', 'SupplierID': 'id',
+                                'SupplierName': 'id', 'OrderMethod': 'id', 'Status': 'id'}},
+    'stock_movements': {'file': STOCK_MOVEMENTS_FILE, 'headers': STOCK_MOVEMENTS_HEADERS,
+                        'key': None, 'indexes': ['MovementID', 'MaterialID', 'RelatedOrderID'],
+                        'types': {'Timestamp': 'datetime', 'MaterialID': 'id', 'ChangeInQuantity': 'float',
+                                  'NewStockLevel': 'float', 'Reason': 'id', 'RelatedOrderID': 'id'}},
+    'email_outbox': {'file': EMAIL_OUTBOX_FILE, 'headers': EMAIL_OUTBOX_HEADERS,
+                     'key': ['MessageID'], 'indexes': ['Status', 'OrderID'],
+                     'types': {'Created': 'datetime', 'Attempts': 'int', 'NextAttemptAt': 'datetime', 'LastAttemptAt': 'datetime'}},
+    'order_runs': {'file': ORDER_RUNS_FILE, 'headers': ORDER_RUNS_HEADERS,
+                   'key': None, 'indexes': ['IdempotencyKey', 'RunID'],
+                   'types': {'Timestamp': 'datetime', 'SupplierID': 'id', 'Stage': 'id'}},
+    'price_tiers': {'file': PRICE_TIERS_FILE, 'headers': PRICE_TIERS_HEADERS,
+                    'key': ['MaterialID', 'SupplierID', 'MinQuantity'], 'indexes': [],
+                    'types': {'MinQuantity': 'float', 'UnitPrice': 'float'}},
+}
+_READ_DTYPES = {'text': str, 'id': 'category', 'float': 'float64', 'int': 'float64', 'datetime': str}
+
+def column_type(table, column): return TABLES[table]['types'].get(column, 'text')
+
+# --- Schema ---
+def _typed_column(values, kind):
+    """Converts one column (as read: str, float or category) to its schema dtype."""
+    if kind == 'float': return pd.to_numeric(values, errors='coerce').astype('float64')
+    if kind == 'int': return np.trunc(pd.to_numeric(values, errors='coerce').astype('float64')).astype('Int64')
+    if kind == 'datetime':
+        if pd.api.types.is_datetime64_any_dtype(values): return values
+        parsed = pd.to_datetime(values, format=TIMESTAMP_FORMAT, errors='coerce')
+        unparsed = parsed.isna() & values.notna() & (values.astype(str).str.strip() != '')
+        if unparsed.any(): parsed[unparsed] = pd.to_datetime(values[unparsed], errors='coerce', format='mixed')
+        return parsed
+    if kind == 'id':
+        values = values if isinstance(values.dtype, pd.CategoricalDtype) else values.astype('category')
+        if values.isna().any():
+            if '' not in values.cat.categories: values = values.cat.add_categories([''])
+            values = values.fillna('')
+        return values
+    return values.where(values.notna(), '').astype(str)
+
+def apply_schema(table, df):
+    """Returns df with every column of the table converted to its schema dtype (vectorised)."""
+    df = df.copy()
+    for col in TABLES[table]['headers']:
+        if col not in df.columns: df[col] = ''
+        df[col] = _typed_column(df[col], column_type(table, col))
+    return df[TABLES[table]['headers']]
+
+def format_number(value):
+    """Formats a number the way the files store it ('12', not '12.0')."""
+    value = float(value)
+    return str(int(value)) if value.is_integer() else str(round(value, 4))
+
+def _format_column(values, kind):
+    """Serialises one column to str for storage or display. Text that is not a valid
+    number/timestamp is passed through unchanged rather than dropped."""
+    if kind in ('float', 'int'):
+        numbers = pd.to_numeric(values, errors='coerce').astype('float64')
+        out = values.where(values.notna(), '').astype(str)
+        valid = numbers.notna()
+        out[valid] = numbers[valid].map(format_number)
+        return out
+    if kind == 'datetime' and pd.api.types.is_datetime64_any_dtype(values):
+        return values.dt.strftime(TIMESTAMP_FORMAT).fillna('')
+    if isinstance(values.dtype, pd.CategoricalDtype): values = values.astype(object)
+    return values.where(values.notna(), '').astype(str)
+
+def format_records(table, rows):
+    """Normalises a list of dicts (or a typed DataFrame) into a str frame with the table's headers."""
+    headers = TABLES[table]['headers']
+    df = rows if isinstance(rows, pd.DataFrame) else pd.DataFrame(list(rows))
+    df_ready = pd.DataFrame(index=df.index)
+    for col in headers:
+        df_ready[col] = _format_column(df[col], column_type(table, col)) if col in df.columns else ''
+    return df_ready.reset_index(drop=True)
+
+def typed_records(table, rows):
+    """List of dicts (e.g. a form's values) -> typed frame that can be merged into a loaded table."""
+    return apply_schema(table, format_records(table, rows))
+
+def empty_frame(table):
+    return apply_schema(table, pd.DataFrame(columns=TABLES[table]['headers']))
+
+def _read_csv(source, table, **kwargs):
+    """Typed CSV read: the C parser converts numeric/category columns directly. Falls back to
+    str + vectorised coercion when a numeric column holds text."""
+    spec = TABLES[table]
+    dtypes = {col: _READ_DTYPES[column_type(table, col)] for col in spec['headers']}
+    try: df = pd.read_csv(source, dtype=dtypes, **kwargs)
+    except (ValueError, TypeError):
+        if hasattr(source, 'seek'): source.seek(0)
+        df = pd.read_csv(source, dtype=str, **kwargs)
+    return df
+
+def _key_tuples(table, keys):
+    """Accepts bare values for single-column keys, or tuples for compound keys."""
+    key_cols = TABLES[table]['key']
+    return [tuple(str(v) for v in (k if isinstance(k, (tuple, list)) else (k,))) for k in keys], key_cols
+
+def _update_rows(rows, on):
+    """Rows for update(): all values as text, one row per `on` combination (last wins), and the columns to set."""
+    rows = pd.DataFrame(rows).fillna('').astype(str).drop_duplicates(list(on), keep='last')
+    return rows, [c for c in rows.columns if c not in on]
+
+
+class CsvStorage:
+    """Original flat-file layout: one CSV per table, fully rewritten on every change."""
+    name = 'csv'
+
+    def describe(self, table): return TABLES[table]['file']
+
+    def exists(self, table):
+        file_path = TABLES[table]['file']
+        return os.path.exists(file_path) and os.path.getsize(file_path) > 0
+
+    def signature(self, table):
+        """(path, mtime_ns, size) of the table's file; changes whenever the file is written."""
+        return file_signature(TABLES[table]['file'])
+
+    def _read_bytes(self, table):
+        """Returns (file contents, signature they were read at)."""
+        file_path = TABLES[table]['file']
+        while True:
+            before = file_signature(file_path)
+            with open(file_path, 'rb') as f: data = f.read()
+            if file_signature(file_path) == before: break # Otherwise a writer got in between: read again
+        return data, before
+
+    def _read(self, table, typed):
+        """Returns (frame, signature). Typed frames follow the schema; untyped ones are all str."""
+        file_path = TABLES[table]['file']; headers = TABLES[table]['headers']
+        data, signature = self._read_bytes(table)
+        if not data.strip(): return (empty_frame(table) if typed else format_records(table, [])), signature
+        df = _read_csv(io.BytesIO(data), table) if typed else pd.read_csv(io.BytesIO(data), dtype=str).fillna('')
+        missing = [h for h in headers if h not in df.columns]
+        for header in missing: df[header] = ''
+        if missing: print(f"Notice: '{file_path}' was missing columns {missing}; aligned to expected headers.")
+        return (apply_schema(table, df) if typed else df[headers]), signature
+
+    def load(self, table, create_if_missing=False):
+        if self.exists(table): return self._read(table, typed=True)[0]
+        if create_if_missing: append_records(TABLES[table]['file'], b'', header=self._header(table))
+        return empty_frame(table)
+
+    def _header(self, table): return (",".join(TABLES[table]['headers']) + "\n").encode()
+
+    def _csv_bytes(self, df, header):
+        return df.to_csv(index=False, header=header, lineterminator="\n").encode()
+
+    # Writes return (signature before, signature after) so callers caching the table know whether
+    # the file changed only by this write (before is None when that cannot be guaranteed).
+    def save(self, table, df, expected_version=None):
+        """Atomic full rewrite. With expected_version (a signature from load time), raises
+        ConcurrentModificationError if another writer changed the file in the meantime."""
+        return replace_file(TABLES[table]['file'], self._csv_bytes(format_records(table, df), True), expected_version)
+
+    def append(self, table, rows):
+        df_ready = format_records(table, rows)
+        if df_ready.empty: return None, self.signature(table)
+        return append_records(TABLES[table]['file'], self._csv_bytes(df_ready, False), header=self._header(table))
+
+    def _rewrite(self, table, change):
+        """Optimistic read-modify-write: the new file is built without holding a lock and only
+        swapped in if nobody wrote in the meantime; otherwise the change is re-applied. Under
+        heavy contention the last attempt holds the exclusive lock throughout, so it always lands."""
+        file_path = TABLES[table]['file']
+        def attempt(lock):
+            if self.exists(table): current, signature = self._read(table, typed=False)
+            else: current, signature = format_records(table, []), self.signature(table)
+            updated = change(current)
+            if updated is None: return None, signature
+            return replace_file(file_path, self._csv_bytes(updated, True), signature, lock=lock)
+        for retry in range(OPTIMISTIC_RETRIES):
+            try: return attempt(lock=True)
+            except ConcurrentModificationError: time.sleep(random.uniform(0, 0.02 * (retry + 1)))
+        with file_lock(file_path): return attempt(lock=False)
+
+    def upsert(self, table, rows):
+        new_rows = format_records(table, rows)
+        if new_rows.empty: return None, self.signature(table)
+        key_cols = TABLES[table]['key']
+        new_rows = new_rows.drop_duplicates(key_cols, keep='last')
+        def change(current):
+            if current.empty: positions = np.full(len(new_rows), -1)
+            else: # Hand-edited files may repeat a key: the last occurrence is the row that gets updated
+                current_keys = pd.MultiIndex.from_frame(current[key_cols]); last = ~current_keys.duplicated(keep='last')
+                matched = current_keys[last].get_indexer(pd.MultiIndex.from_frame(new_rows[key_cols]))
+                positions = np.where(matched != -1, np.flatnonzero(last)[matched], -1)
+            existing = positions != -1
+            current = current.copy()
+            current.iloc[positions[existing]] = new_rows[existing].to_numpy()
+            return pd.concat([current, new_rows[~existing]], ignore_index=True)
+        return self._rewrite(table, change)
+
+    def update(self, table, rows, on):
+        """Sets the other columns of `rows` on every existing row whose `on` columns match (no inserts),
+        on the file as it is when the write lands, so columns not in `rows` are never overwritten."""
+        rows, columns = _update_rows(rows, on)
+        if rows.empty: return None, self.signature(table)
+        def change(current):
+            if current.empty: return None
+            positions = pd.MultiIndex.from_frame(rows[on]).get_indexer(pd.MultiIndex.from_frame(current[on]))
+            matched = positions != -1
+            if not matched.any(): return None
+            current = current.copy()
+            for col in columns: current.loc[matched, col] = rows[col].to_numpy()[positions[matched]]
+            return current
+        return self._rewrite(table, change)
+
+    def delete(self, table, keys):
+        key_tuples, key_cols = _key_tuples(table, keys)
+        def change(current):
+            if current.empty: return None
+            mask = pd.MultiIndex.from_frame(current[key_cols]).isin(key_tuples)
+            return current[~mask] if mask.any() else None
+        return self._rewrite(table, change)
+
+    def lookup(self, table, column, value):
+        df = self.load(table)
+        return df[df[column].astype(str) == str(value)].reset_index(drop=True)
+
+    # Ledger-style reads: positions are byte offsets into the CSV, so append-only
+    # tables can be read from a known point without re-parsing the whole file.
+    def end_position(self, table):
+        file_path = TABLES[table]['file']
+        return os.path.getsize(file_path) if os.path.exists(file_path) else 0
+
+    def read_range(self, table, start=0, end=None):
+        """Returns (rows, end_position) for the records between two positions."""
+        file_path = TABLES[table]['file']; headers = TABLES[table]['headers']
+        if not os.path.exists(file_path): return empty_frame(table), 0
+        with open(file_path, 'rb') as f:
+            f.seek(start)
+            data = f.read() if end is None else f.read(max(end - start, 0))
+        data = data[:data.rfind(b'\n') + 1] # Ignore a trailing record that is still being written
+        if not data.strip(): return empty_frame(table), start + len(data)
+        if start == 0: df = _read_csv(io.BytesIO(data), table)
+        else: df = _read_csv(io.BytesIO(data), table, header=None, names=headers)
+        return apply_schema(table, df), start + len(data)
+
+
+class SqliteStorage:
+    """Single SQLite database in WAL mode. Saves touch only the affected rows."""
+    name = 'sqlite'
+
+    def __init__(self, db_file=SQLITE_DB_FILE):
+        self.db_file = db_file
+        self._local = threading.local() # sqlite3 connections are bound to the thread that opened them
+        self._ensure_schema()
+
+    def describe(self, table): return f"{self.db_file}:{table}"
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_file, timeout=30, isolation_level=None) # Transactions are explicit
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _ensure_schema(self):
+        self._transaction(self._create_tables)
+
+    def _create_tables(self, conn):
+        for table, spec in TABLES.items():
+            cols = ", ".join(f'"{h}" TEXT NOT NULL DEFAULT \'\'' for h in spec['headers'])
+            conn.execute(f'CREATE TABLE IF NOT EXISTS "{table}" ({cols})')
+            if spec['key']:
+                key_cols = ", ".join(f'"{c}"' for c in spec['key'])
+                conn.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS "ux_{table}_key" ON "{table}" ({key_cols})')
+            for col in spec['indexes']:
+                conn.execute(f'CREATE INDEX IF NOT EXISTS "ix_{table}_{col}" ON "{table}" ("{col}")')
+
+    def exists(self, table):
+        return self._connect().execute(f'SELECT 1 FROM "{table}" LIMIT 1').fetchone() is not None
+
+    def signature(self, table=None):
+        """Database plus WAL file stats: any commit (from any process) changes one of them."""
+        return file_signature(self.db_file) + file_signature(self.db_file + "-wal")
+
+    def _transaction(self, work, expected_version=None):
+        """Runs work(conn) in a BEGIN IMMEDIATE transaction, which takes SQLite's write lock up
+        front, so the 'before' signature is the version the write is applied on top of."""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            before = self.signature()
+            if expected_version is not None and tuple(expected_version) != before:
+                raise ConcurrentModificationError(f"'{self.db_file}' was changed by another user or window since it was loaded.")
+            work(conn)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK"); raise
+        return before, self.signature()
+
+    def load(self, table, create_if_missing=False): # Tables always exist once the schema is created
+        headers = TABLES[table]['headers']
+        cols = ", ".join(f'"{h}"' for h in headers)
+        df = pd.read_sql_query(f'SELECT {cols} FROM "{table}" ORDER BY rowid', self._connect(), dtype=str)
+        return apply_schema(table, df)
+
+    def _insert_sql(self, table, on_conflict=''):
+        headers = TABLES[table]['headers']
+        cols = ", ".join(f'"{h}"' for h in headers); marks = ", ".join("?" for _ in headers)
+        return f'INSERT INTO "{table}" ({cols}) VALUES ({marks}){on_conflict}'
+
+    def save(self, table, df, expected_version=None):
+        df_ready = format_records(table, df)
+        def work(conn):
+            conn.execute(f'DELETE FROM "{table}"')
+            conn.executemany(self._insert_sql(table), df_ready.itertuples(index=False, name=None))
+        return self._transaction(work, expected_version)
+
+    def append(self, table, rows):
+        df_ready = format_records(table, rows)
+        if df_ready.empty: return None, self.signature()
+        return self._transaction(lambda conn: conn.executemany(self._insert_sql(table), df_ready.itertuples(index=False, name=None)))
+
+    def upsert(self, table, rows):
+        df_ready = format_records(table, rows)
+        if df_ready.empty: return None, self.signature()
+        key_cols = TABLES[table]['key']
+        conflict_cols = ", ".join(f'"{c}"' for c in key_cols)
+        updates = ", ".join(f'"{h}"=excluded."{h}"' for h in TABLES[table]['headers'] if h not in key_cols)
+        conflict = f' ON CONFLICT ({conflict_cols}) DO UPDATE SET {updates}'
+        return self._transaction(lambda conn: conn.executemany(self._insert_sql(table, conflict), df_ready.itertuples(index=False, name=None)))
+
+    def update(self, table, rows, on):
+        rows, columns = _update_rows(rows, on)
+        if rows.empty: return None, self.signature()
+        sets = ", ".join(f'"{c}"=?' for c in columns); where = " AND ".join(f'"{c}"=?' for c in on)
+        return self._transaction(lambda conn: conn.executemany(f'UPDATE "{table}" SET {sets} WHERE {where}',
+                                                               rows[columns + list(on)].itertuples(index=False, name=None)))
+
+    def delete(self, table, keys):
+        key_tuples, key_cols = _key_tuples(table, keys)
+        where = " AND ".join(f'"{c}"=?' for c in key_cols)
+        return self._transaction(lambda conn: conn.executemany(f'DELETE FROM "{table}" WHERE {where}', key_tuples))
+
+    def lookup(self, table, column, value):
+        headers = TABLES[table]['headers']
+        cols = ", ".join(f'"{h}"' for h in headers)
+        sql = f'SELECT {cols} FROM "{table}" WHERE "{column}"=? ORDER BY rowid'
+        return apply_schema(table, pd.read_sql_query(sql, self._connect(), params=(str(value),), dtype=str))
+
+    # Ledger-style reads: positions are rowids, which only grow for append-only tables.
+    def end_position(self, table):
+        row = self._connect().execute(f'SELECT MAX(rowid) FROM "{table}"').fetchone()
+        return row[0] or 0
+
+    def read_range(self, table, start=0, end=None):
+        """Returns (rows, end_position) for the records between two positions."""
+        headers = TABLES[table]['headers']
+        cols = ", ".join(f'"{h}"' for h in headers)
+        sql = f'SELECT rowid AS "_pos", {cols} FROM "{table}" WHERE rowid > ?'
+        params = [start]
+        if end is not None: sql += ' AND rowid <= ?'; params.append(end)
+        df = pd.read_sql_query(sql + ' ORDER BY rowid', self._connect(), params=params, dtype=str)
+        end_pos = int(df['_pos'].iloc[-1]) if not df.empty else (start if end is None else max(start, end))
+        return apply_schema(table, df), end_pos
+
+
+_storage_instance = None
+
+def get_storage():
+    """Returns the process-wide storage backend selected by PROCUREMENT_STORAGE_BACKEND."""
+    global _storage_instance
+    if _storage_instance is None:
+        if STORAGE_BACKEND == 'sqlite': _storage_instance = SqliteStorage(SQLITE_DB_FILE)
+        else:
+            if STORAGE_BACKEND != 'csv': print(f"Warning: Unknown storage backend '{STORAGE_BACKEND}'. Falling back to CSV.")
+            _storage_instance = CsvStorage()
+    return _storage_instance
+
+def migrate_csv_to_sqlite(db_file=SQLITE_DB_FILE, overwrite=False):
+    """One-shot copy of every CSV table into the SQLite database."""
+    csv_storage = CsvStorage(); sqlite_storage = SqliteStorage(db_file)
+    for table, spec in TABLES.items():
+        if sqlite_storage.exists(table) and not overwrite:
+            print(f"Skipping '{table}': {db_file} already has rows (use --overwrite to replace them).")
+            continue
+        df = csv_storage._read(table, typed=False)[0] if csv_storage.exists(table) else format_records(table, [])
+        if spec['key']:
+            dupes = df.duplicated(subset=spec['key'], keep='last')
+            if dupes.any():
+                print(f"Warning: {int(dupes.sum())} duplicate {'/'.join(spec['key'])} row(s) in '{spec['file']}'; keeping the last of each.")
+                df = df[~dupes]
+        sqlite_storage.save(table, df)
+        print(f"Migrated {len(df)} row(s) from '{spec['file']}' into {db_file}:{table}.")
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == 'migrate':
+        migrate_csv_to_sqlite(overwrite='--overwrite' in sys.argv[2:])
+        print("Set PROCUREMENT_STORAGE_BACKEND=sqlite to use the migrated database.")
+    else:
+        print("Usage: python storage.py migrate [--overwrite]")
@@ -0,0 +1,117 @@
+import numpy as np
+import pandas as pd
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex, QSortFilterProxyModel
+from PyQt6.QtWidgets import QTableView, QLineEdit, QAbstractItemView, QHeaderView
+
+from storage import format_number, TIMESTAMP_FORMAT
+
+# Model/view tables shared by the GUIs. The model reads cells straight from the DataFrame's
+# column arrays when the view asks for them, so only visible rows are ever formatted and
+# (re)setting a frame costs the same for 10 rows or 500k. Sorting and filtering go through a
+# QSortFilterProxyModel; map proxy indexes back with source_rows().
+SORT_ROLE = Qt.ItemDataRole.UserRole # Raw value, so numbers sort as numbers rather than text
+
+def display_text(value):
+    """One cell as the files store it ('12', not '12.0'; '' when missing)."""
+    if isinstance(value, str): return value
+    if value is None or pd.isna(value): return ''
+    if isinstance(value, pd.Timestamp): return value.strftime(TIMESTAMP_FORMAT)
+    if isinstance(value, (int, float, np.integer, np.floating)) and not isinstance(value, (bool, np.bool_)): return format_number(value)
+    return str(value)
+
+def money_text(value):
+    return '' if value is None or pd.isna(value) else f"{value:.2f}"
+
+def _sort_key(value):
+    if isinstance(value, str): return value
+    if value is None or pd.isna(value): return None # Invalid variants sort first
+    if isinstance(value, pd.Timestamp): return value.strftime(TIMESTAMP_FORMAT)
+    if isinstance(value, (int, float, np.integer, np.floating)): return float(value)
+    return str(value)
+
+class DataFrameTableModel(QAbstractTableModel):
+    """
+    Read-only table model over a DataFrame.
+
+    Args:
+        columns (list): Columns to show, in order. Columns missing from the frame show as ''.
+        formatters (dict): Optional column -> callable(value) -> str (default: display_text).
+        checkable (str): Optional column shown as a checkbox (e.g. "Select"); its state is kept
+            by the model, see checked_rows().
+    """
+    def __init__(self, columns, frame=None, formatters=None, checkable=None, parent=None):
+        super().__init__(parent)
+        self.columns = list(columns); self.formatters = formatters or {}; self.checkable = checkable
+        self.set_frame(frame)
+
+    def set_frame(self, frame):
+        """Swaps in a new frame (no per-row work; the view re-reads what it shows)."""
+        self.beginResetModel()
+        self.frame = frame.reset_index(drop=True) if frame is not None else pd.DataFrame(columns=self.columns)
+        self._arrays = [self.frame[c].array if c in self.frame.columns else None for c in self.columns]
+        self._checked = np.zeros(len(self.frame), dtype=bool)
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()): return 0 if parent.isValid() else len(self.frame)
+
+    def columnCount(self, parent=QModelIndex()): return 0 if parent.isValid() else len(self.columns)
+
+    def value(self, row, column):
+        """Raw value of any frame column (shown or not) at a model row."""
+        return self.frame[column].iat[row] if column in self.frame.columns else ''
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid(): return None
+        row = index.row(); column = self.columns[index.column()]
+        if column == self.checkable:
+            if role == Qt.ItemDataRole.CheckStateRole: return Qt.CheckState.Checked if self._checked[row] else Qt.CheckState.Unchecked
+            return int(self._checked[row]) if role == SORT_ROLE else None
+        if role not in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.ToolTipRole, SORT_ROLE): return None
+        values = self._arrays[index.column()]; value = values[row] if values is not None else ''
+        if role == SORT_ROLE: return _sort_key(value)
+        return self.formatters.get(column, display_text)(value)
+
+    def flags(self, index):
+        flags = Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable
+        if index.isValid() and self.columns[index.column()] == self.checkable: flags |= Qt.ItemFlag.ItemIsUserCheckable
+        return flags
+
+    def setData(self, index, value, role=Qt.ItemDataRole.EditRole):
+        if not index.isValid() or role != Qt.ItemDataRole.CheckStateRole or self.columns[index.column()] != self.checkable: return False
+        self._checked[index.row()] = Qt.CheckState(value) == Qt.CheckState.Checked
+        self.dataChanged.emit(index, index, [role]); return True
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole: return None
+        return self.columns[section] if orientation == Qt.Orientation.Horizontal else str(section + 1)
+
+    def checked_rows(self): return np.flatnonzero(self._checked)
+
+    def remove_row(self, row):
+        """Drops a single row without resetting the model (the view keeps its scroll position)."""
+        self.beginRemoveRows(QModelIndex(), row, row)
+        self.frame = self.frame.drop(index=row).reset_index(drop=True)
+        self._arrays = [self.frame[c].array if c in self.frame.columns else None for c in self.columns]
+        self._checked = np.delete(self._checked, row)
+        self.endRemoveRows()
+
+def create_table_view(model, layout, filter_placeholder="Filter..."):
+    """Adds a filter box and a sortable QTableView over model (through a proxy) to layout. Returns the view."""
+    view = QTableView()
+    proxy = QSortFilterProxyModel(view); proxy.setSourceModel(model); proxy.setSortRole(SORT_ROLE)
+    proxy.setFilterCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive); proxy.setFilterKeyColumn(-1) # Match any column
+    filter_edit = QLineEdit(); filter_edit.setPlaceholderText(filter_placeholder); filter_edit.setClearButtonEnabled(True)
+    filter_edit.textChanged.connect(proxy.setFilterFixedString)
+    view.setModel(proxy); view.setSortingEnabled(True); view.sortByColumn(-1, Qt.SortOrder.AscendingOrder) # Source order until a header is clicked
+    view.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+    view.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+    view.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Interactive)
+    layout.addWidget(filter_edit); layout.addWidget(view)
+    return view
+
+def source_row(view, index):
+    """Row in the model's frame for an index of the (sorted/filtered) view."""
+    return view.model().mapToSource(index).row()
+
+def selected_source_rows(view):
+    return [source_row(view, index) for index in view.selectionModel().selectedRows()]
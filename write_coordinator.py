@@ -0,0 +1,117 @@
+import os
+import time
+import tempfile
+from contextlib import contextmanager, nullcontext
+
+# Coordinates writes to the shared data files when several windows/processes (e.g. the
+# procurement GUI and the check-in GUI on the same share) write at the same time.
+#   - Advisory locks live in a '<file>.lock' sidecar, so they survive the data file being replaced.
+#   - Appends are whole-record O_APPEND writes under a shared lock: appenders run in parallel.
+#   - Full rewrites go to a temp file first and are swapped in with os.replace under a short
+#     exclusive lock, after checking the file is still the version the rewrite was based on.
+LOCK_TIMEOUT = float(os.environ.get('PROCUREMENT_LOCK_TIMEOUT', 30)) # Seconds
+LOCK_RETRY_INTERVAL = 0.05
+REPLACE_RETRIES = 20 # Windows refuses os.replace while another process has the file open
+
+try:
+    import fcntl
+    msvcrt = None
+except ImportError: # Windows
+    fcntl = None
+    import msvcrt
+
+class ConcurrentModificationError(Exception):
+    """The file was changed by another writer since the caller read it."""
+
+def file_signature(file_path):
+    """(path, mtime_ns, size); changes whenever the file is written or replaced."""
+    try: stat = os.stat(file_path)
+    except FileNotFoundError: return (file_path, None, None)
+    return (file_path, stat.st_mtime_ns, stat.st_size)
+
+def _try_lock(fd, shared):
+    try:
+        if fcntl: fcntl.flock(fd, (fcntl.LOCK_SH if shared else fcntl.LOCK_EX) | fcntl.LOCK_NB)
+        else: # msvcrt has no shared locks: readers of the lock serialise, which only costs a few ms
+            os.lseek(fd, 0, os.SEEK_SET); msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError: return False
+
+def _unlock(fd):
+    if fcntl: fcntl.flock(fd, fcntl.LOCK_UN)
+    else: os.lseek(fd, 0, os.SEEK_SET); msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+@contextmanager
+def file_lock(file_path, shared=False, timeout=LOCK_TIMEOUT):
+    """Advisory lock on file_path (shared for appends, exclusive for replacing the file)."""
+    fd = os.open(file_path + ".lock", os.O_RDWR | os.O_CREAT, 0o666)
+    try:
+        deadline = time.monotonic() + timeout
+        while not _try_lock(fd, shared):
+            if time.monotonic() > deadline: raise TimeoutError(f"Timed out waiting for the lock on '{file_path}'.")
+            time.sleep(LOCK_RETRY_INTERVAL)
+        try: yield
+        finally: _unlock(fd)
+    finally: os.close(fd)
+
+def _write_all(fd, data):
+    view = memoryview(data)
+    while view: view = view[os.write(fd, view):]
+
+def _ends_with_newline(file_path):
+    with open(file_path, 'rb') as f:
+        f.seek(-1, os.SEEK_END); return f.read(1) in (b'\n', b'\r')
+
+def append_records(file_path, data, header=b''):
+    """
+    Appends whole records with a single O_APPEND write. The header is written first if the
+    file is missing or empty (data may be empty to just create the file).
+
+    Returns:
+        tuple: (signature before, signature after), or (None, after) if another appender
+        interleaved, so callers know whether 'after' reflects only this write.
+    """
+    needs_header = bool(header) and (not os.path.exists(file_path) or os.path.getsize(file_path) == 0)
+    if not data and not needs_header: return None, file_signature(file_path)
+    with file_lock(file_path, shared=not needs_header):
+        fd = os.open(file_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT | getattr(os, 'O_BINARY', 0), 0o666)
+        try:
+            before = file_signature(file_path)
+            if needs_header and not before[2]: data = header + data
+            elif data and before[2] and not _ends_with_newline(file_path): data = b'\n' + data # e.g. a hand-edited file
+            if data: _write_all(fd, data)
+            after = file_signature(file_path)
+        finally: os.close(fd)
+    if before[2] is None or after[2] != before[2] + len(data): return None, after
+    return before, after
+
+def replace_file(file_path, data, expected_signature=None, lock=True):
+    """
+    Atomically replaces file_path with data (temp file in the same directory + os.replace).
+
+    Args:
+        expected_signature (tuple): If given, the replace only happens if the file still has this
+            signature, i.e. nobody changed it since the caller read it.
+        lock (bool): False when the caller already holds the exclusive lock.
+    Returns:
+        tuple: (signature before, signature after).
+    Raises:
+        ConcurrentModificationError: If the file no longer matches expected_signature.
+    """
+    directory = os.path.dirname(os.path.abspath(file_path))
+    fd, temp_path = tempfile.mkstemp(prefix=os.path.basename(file_path) + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data); f.flush(); os.fsync(f.fileno())
+        with (file_lock(file_path) if lock else nullcontext()):
+            before = file_signature(file_path)
+            if expected_signature is not None and tuple(expected_signature) != before:
+                raise ConcurrentModificationError(f"'{file_path}' was changed by another user or window since it was loaded.")
+            for attempt in range(REPLACE_RETRIES):
+                try: os.replace(temp_path, file_path); break
+                except PermissionError:
+                    if attempt == REPLACE_RETRIES - 1: raise
+                    time.sleep(LOCK_RETRY_INTERVAL)
+            return before, file_signature(file_path)
+    finally:
+        if os.path.exists(temp_path): os.remove(temp_path)